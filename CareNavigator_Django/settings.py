@@ -42,12 +42,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -144,3 +146,116 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Gemini response cache (see core/utils/response_cache.py)
+# BACKEND: 'memory' (per-process LRU), 'django' (settings.CACHES), 'file' or 'none'
+
+GEMINI_CACHE = {
+    'BACKEND': 'memory',
+    'TTL': 6 * 60 * 60,
+    'MAX_ENTRIES': 2048,
+    'PATH': BASE_DIR / '.gemini_cache',
+}
+
+# Async Gemini calls (see core/utils/llm_executor.py)
+GEMINI_MAX_CONCURRENCY = 32   # upstream calls in flight per process
+GEMINI_TIMEOUT = 30           # seconds per Gemini call
+# Per-operation deadlines; multimodal lab calls with large output budgets take longer
+GEMINI_TIMEOUTS = {
+    'lab_report': 90,
+    'lab_report_localized': 120,
+}
+
+# Seconds the /hospitals/ city and pincode dropdowns are cached
+HOSPITAL_FACETS_TTL = 300
+
+# Keyset pagination for /hospitals/ and /api/hospitals (see core/utils/pagination.py)
+HOSPITALS_PAGE_SIZE = 24
+HOSPITALS_MAX_PAGE_SIZE = 100
+
+# Nearest-hospital grid index (see core/utils/geo.py)
+SPATIAL_INDEX_CELL_DEG = 0.25   # ~28 km grid cells
+SPATIAL_INDEX_TTL = 600         # seconds before a periodic rebuild
+
+# Analyse + translate lab reports in one Gemini call; False forces the two-step path
+LAB_REPORT_SINGLE_CALL = True
+
+# Lab report uploads (see core/utils/lab_upload.py). Images are shrunk with Pillow
+# and PDFs with pypdf when installed; otherwise files are sent as uploaded.
+LAB_UPLOAD_MAX_BYTES = 15 * 1024 * 1024
+LAB_IMAGE_MAX_SIDE = 1536     # px; Gemini bills images in 768 px tiles
+LAB_IMAGE_QUALITY = 80        # JPEG quality of the grayscale re-encode
+LAB_PDF_MAX_PAGES = 20        # after blank and duplicate pages are dropped
+
+# Read values from a PDF's text layer and classify them locally (see
+# core/utils/lab_values.py); Gemini then only writes the explanations.
+# Reports with fewer recognised values go to Gemini Vision.
+LAB_LOCAL_EXTRACTION = True
+LAB_LOCAL_MIN_PARAMETERS = 3
+
+# Lab report history sidebar and retention (purge with `manage.py purge_lab_history`)
+LAB_HISTORY_DAYS = 90              # shown in the sidebar
+LAB_HISTORY_PAGE_SIZE = 20
+LAB_HISTORY_RETENTION_DAYS = 365   # older rows are deleted by the purge command
+
+# Shared Gemini client (see core/utils/gemini_client.py)
+GEMINI_MODEL = 'gemini-2.5-flash'
+GEMINI_TRANSPORT = None     # 'grpc' | 'rest' | None for the SDK default
+GEMINI_WARM_UP = False      # open the connection in the background at startup
+GEMINI_STUB = None          # e.g. {'LATENCY': 0.8, 'JITTER': 0.2, 'FAILURE_RATE': 0.02} for load tests
+GEMINI_RETRIES = 2              # extra attempts after the first
+GEMINI_RETRY_BASE_DELAY = 0.25  # seconds; full-jitter exponential backoff
+# /api/health/gemini is for staff unless public (e.g. for an external uptime check);
+# the upstream probe is repeated at most every GEMINI_HEALTH_TTL seconds
+GEMINI_HEALTH_PUBLIC = False
+GEMINI_HEALTH_TTL = 10
+
+# Structured output (see core/utils/gemini_schemas.py): JSON mode plus a response
+# schema per call. False sends the same prompts as free text, for comparison with
+# `manage.py gemini_output_check`.
+GEMINI_RESPONSE_SCHEMAS = True
+# Output token budget per operation. Gemini 2.5 thinking tokens count against it,
+# so these sit well above the visible reply sizes.
+GEMINI_MAX_OUTPUT_TOKENS = {
+    'triage': 2048,
+    'lab_report': 8192,
+    'lab_report_localized': 12288,
+    'translate': 4096,
+    'lab_explain': 4096,
+}
+
+# Circuit breaker for Gemini (see core/utils/resilience.py)
+GEMINI_BREAKER = {
+    'WINDOW': 20,               # recent calls considered
+    'MIN_CALLS': 5,
+    'ERROR_RATE': 0.5,          # trip when half the window failed...
+    'SLOW_CALL_SECONDS': 10.0,
+    'SLOW_CALL_RATE': 0.5,      # ...or half of it was slower than SLOW_CALL_SECONDS
+    'COOLDOWN': 30.0,           # seconds open before a half-open probe
+}
+# Each Gemini operation has its own breaker; these override GEMINI_BREAKER.
+# Multimodal lab calls with large output budgets are slow even when healthy;
+# keep SLOW_CALL_SECONDS below the operation's GEMINI_TIMEOUTS deadline.
+GEMINI_BREAKER_OPERATIONS = {
+    'lab_report': {'SLOW_CALL_SECONDS': 45.0},
+    'lab_report_localized': {'SLOW_CALL_SECONDS': 60.0},
+}
+
+# Local triage tier for /api/analyze: answers scoring at least the threshold
+# skip Gemini. Local answers are English, so only these response languages use it.
+LOCAL_TRIAGE_ENABLED = True
+LOCAL_TRIAGE_THRESHOLD = 0.8
+LOCAL_TRIAGE_LANGUAGES = ['English']
+
+# Prometheus text endpoint at /metrics (core/utils/metrics.py)
+METRICS_ENABLED = True
+
+# On-demand request profiler (core/utils/profiler.py): staff add ?_profile=1 or an
+# X-Profile header; profiles are listed under Request profiles in the admin.
+PROFILER_ENABLED = True
+PROFILER_QUERY_PARAM = '_profile'
+PROFILER_HEADER = 'X-Profile'
+PROFILER_SAMPLE_RATE = 0.0     # e.g. 0.001 to profile one request in a thousand
+PROFILER_KEEP = 50
+PROFILER_TOP_N = 40
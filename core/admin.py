@@ -1,4 +1,15 @@
 from django.contrib import admin
-from .models import LabReportHistory
+from .models import LabReportHistory, RequestProfile
 
 admin.site.register(LabReportHistory)
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'sql_count', 'sql_ms', 'trigger')
+    list_filter = ('view_name', 'trigger')
+    search_fields = ('path',)
+    readonly_fields = [f.name for f in RequestProfile._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core.utils import metrics, profiler
+        metrics.install()
+        profiler.install()
+
+        if getattr(settings, 'GEMINI_WARM_UP', False):
+            from core.utils.gemini_client import warm_up_in_background
+            warm_up_in_background()
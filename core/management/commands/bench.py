@@ -0,0 +1,221 @@
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from concurrent.futures import ThreadPoolExecutor
+from core.utils import gemini_client
+from core.utils.response_cache import get_cache
+from core.utils.synthetic import CITIES, SPECIALITIES, load_catalogue
+import json
+import os
+import random
+import time
+
+
+SYMPTOMS = [
+    'fever', 'fever and cough', 'headache', 'cold', 'skin rash and itching',       # local triage tier
+    'high fever with joint pain and rash for three days',
+    'chest pain and sweating since morning',
+    'my child has loose motions and is not eating since yesterday',
+    'burning urination and lower back pain',
+    'dizziness when standing up, blurred vision and tiredness',
+    'मुझे बुखार और खांसी है',
+]
+DISEASES = ['fever', 'cough', 'headache', 'stomach pain', 'injury', '']
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Command(BaseCommand):
+    help = ('Load-test the main endpoints against a synthetic catalogue and a local Gemini stub; '
+            'compare with a stored baseline')
+
+    SCENARIOS = ('analyze', 'triage', 'hospitals', 'listing', 'lab')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hospitals', type=int, default=100000)
+        parser.add_argument('--doctors', type=int, default=500000)
+        parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--scenarios', default=','.join(self.SCENARIOS))
+        parser.add_argument('--latency', type=float, default=0.8, help='stub Gemini mean latency (s)')
+        parser.add_argument('--jitter', type=float, default=0.2)
+        parser.add_argument('--failure-rate', type=float, default=0.02)
+        parser.add_argument('--lab-repeat', type=float, default=0.3,
+                            help='share of lab uploads re-sending an earlier file')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'bench_baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='allowed p95/throughput regression vs the baseline (0.25 = 25%%)')
+
+    # ─── Scenarios ────────────────────────────────────────────────────────────
+
+    def request_analyze(self, client, rng):
+        body = {'symptoms_text': rng.choice(SYMPTOMS), 'location': rng.choice(CITIES)[0]}
+        return client.post('/api/analyze', json.dumps(body), content_type='application/json')
+
+    def request_triage(self, client, rng):
+        body = {'symptoms_text': rng.choice(SYMPTOMS), 'location': rng.choice(CITIES)[0]}
+        return client.post('/api/triage', json.dumps(body), content_type='application/json')
+
+    def request_hospitals(self, client, rng):
+        params = {'speciality': rng.choice(SPECIALITIES), 'city': rng.choice(CITIES)[0]}
+        disease = rng.choice(DISEASES)
+        if disease:
+            params['disease'] = disease
+            if rng.random() < 0.5:
+                params['budget'] = rng.choice([5000, 20000, 100000])
+        return client.get('/api/hospitals', params)
+
+    def request_listing(self, client, rng):
+        params = {'city': rng.choice(CITIES)[0]}
+        if rng.random() < 0.4:
+            params['type'] = rng.choice(['government', 'private', 'trust', 'premium'])
+        if rng.random() < 0.3:
+            params['rating'] = rng.choice(['3', '4'])
+        return client.get('/hospitals/', params)
+
+    def request_lab(self, client, rng):
+        if self.lab_files and rng.random() < self.lab_repeat:
+            content = rng.choice(self.lab_files)
+        else:
+            content = b'\x89PNG\r\n\x1a\n' + rng.randbytes(2048)
+            self.lab_files.append(content)
+        upload = SimpleUploadedFile('report.png', content, content_type='image/png')
+        return client.post('/api/analyze-lab-report', {'report': upload})
+
+    # ─── Runner ───────────────────────────────────────────────────────────────
+
+    def run_worker(self, scenario, count, seed):
+        request = getattr(self, f'request_{scenario}')
+        rng = random.Random(seed)
+        client = Client()
+        samples = []
+        try:
+            for _ in range(count):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    try:
+                        response = request(client, rng)
+                        ok = response.status_code < 500
+                        if getattr(response, 'streaming', False):
+                            b''.join(response.streaming_content)
+                    except Exception as e:
+                        print(f"Bench request error: {e}")
+                        ok = False
+                    took = time.perf_counter() - start
+                samples.append((took, len(queries), ok))
+        finally:
+            connection.close()
+        return samples
+
+    def run_scenario(self, scenario, total, concurrency, seed):
+        per_worker = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(self.run_worker, scenario, n, seed * 1000 + i)
+                       for i, n in enumerate(per_worker) if n]
+            samples = [s for f in futures for s in f.result()]
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(took for took, _, _ in samples)
+        queries = [q for _, q, _ in samples]
+        return {
+            'requests': len(samples),
+            'errors': sum(1 for *_, ok in samples if not ok),
+            'throughput_rps': round(len(samples) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+            'queries_mean': round(sum(queries) / len(queries), 2) if queries else 0.0,
+            'queries_max': max(queries) if queries else 0,
+        }
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for scenario, result in results.items():
+            base = baseline.get('results', {}).get(scenario)
+            if not base:
+                continue
+            if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{scenario}: p95 {result['p95_ms']} ms > baseline {base['p95_ms']} ms")
+            if result['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+                regressions.append(
+                    f"{scenario}: throughput {result['throughput_rps']} rps < baseline {base['throughput_rps']} rps")
+            # Queries per code path are deterministic; the mean only moves with the request mix
+            if result['queries_max'] > base['queries_max']:
+                regressions.append(
+                    f"{scenario}: up to {result['queries_max']} queries/request > baseline {base['queries_max']}")
+            if result['queries_mean'] > base['queries_mean'] * 1.1 + 0.01:
+                regressions.append(
+                    f"{scenario}: {result['queries_mean']} queries/request > baseline {base['queries_mean']}")
+        return regressions
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in options['scenarios'].split(',') if s]
+        unknown = set(scenarios) - set(self.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        self.lab_files = []
+        self.lab_repeat = options['lab_repeat']
+        config = {key: options[key] for key in
+                  ('hospitals', 'doctors', 'requests', 'concurrency', 'latency', 'jitter', 'failure_rate', 'seed')}
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        stub = {'LATENCY': options['latency'], 'JITTER': options['jitter'],
+                'FAILURE_RATE': options['failure_rate'], 'SEED': options['seed']}
+        try:
+            with override_settings(GEMINI_STUB=stub, ALLOWED_HOSTS=['*']):
+                gemini_client.reset_client()
+                get_cache().clear()
+
+                self.stdout.write(f"Generating {options['hospitals']} hospitals / {options['doctors']} doctors...")
+                start = time.perf_counter()
+                created = load_catalogue(options['hospitals'], options['doctors'], seed=options['seed'])
+                took = time.perf_counter() - start
+                self.stdout.write(f'  {created[0]} hospitals, {created[1]} doctors in {took:.1f}s '
+                                  f'({(created[0] + created[1]) / took:.0f} rows/s)')
+
+                results = {}
+                for scenario in scenarios:
+                    results[scenario] = self.run_scenario(
+                        scenario, options['requests'], options['concurrency'], options['seed'])
+                    r = results[scenario]
+                    self.stdout.write(
+                        f"{scenario:<10} {r['requests']:>5} req  {r['errors']:>3} err  "
+                        f"{r['throughput_rps']:>7.1f} rps  p50 {r['p50_ms']:>7.1f}  p95 {r['p95_ms']:>7.1f}  "
+                        f"p99 {r['p99_ms']:>7.1f} ms  queries {r['queries_mean']:.2f} (max {r['queries_max']})")
+        finally:
+            gemini_client.reset_client()
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = {'config': config, 'results': results}
+        if options['save_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+            return
+
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(self.style.WARNING('No baseline found; run with --save-baseline to record one.'))
+            return
+        with open(options['baseline'], encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            self.stdout.write(self.style.WARNING('Baseline was recorded with different options; comparing anyway.'))
+        regressions = self.compare(results, baseline, options['tolerance'])
+        if regressions:
+            raise CommandError('Performance regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
@@ -0,0 +1,119 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from core.utils import lab_upload
+from core.utils.lab_upload import LabUpload, UploadRejected
+import io
+import math
+import mimetypes
+import os
+import random
+import time
+
+# Gemini bills an image in 768 px tiles of 258 tokens (one tile up to 384 px), a PDF page as 258 tokens
+TILE_PX = 768
+TOKENS_PER_TILE = 258
+
+
+def image_tokens(width, height):
+    if width <= 384 and height <= 384:
+        return TOKENS_PER_TILE
+    return math.ceil(width / TILE_PX) * math.ceil(height / TILE_PX) * TOKENS_PER_TILE
+
+
+def estimate_tokens(data, mime_type):
+    """Approximate input tokens Gemini charges for an image or PDF, or None when it cannot be read here."""
+    try:
+        if mime_type == 'application/pdf':
+            return len(lab_upload.PdfReader(io.BytesIO(data)).pages) * TOKENS_PER_TILE
+        return image_tokens(*lab_upload.Image.open(io.BytesIO(data)).size)
+    except Exception:
+        return None
+
+
+def synthetic_page(rng, width, height, lines=28, tint=(250, 248, 240)):
+    """A photographed report page: tinted paper, rows of dark 'text' blocks and sensor noise."""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    page = Image.new('RGB', (width, height), tint)
+    draw = ImageDraw.Draw(page)
+    row = height // (lines + 4)
+    for line in range(lines):
+        y = row * (line + 2)
+        x = width // 12
+        while x < width * 11 // 12:
+            word = rng.randint(width // 40, width // 10)
+            draw.rectangle((x, y, x + word, y + row // 3), fill=(rng.randint(20, 60),) * 3)
+            x += word + width // 50
+    noise = Image.effect_noise((width, height), 18).convert('RGB')
+    return Image.blend(page, noise, 0.08).filter(ImageFilter.GaussianBlur(0.6))
+
+
+def sample_reports(seed):
+    """(name, bytes, mime_type) for a phone photo, a flat scan and a scanned PDF with blank/duplicate pages."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    samples = []
+
+    photo = io.BytesIO()
+    synthetic_page(rng, 4032, 3024).save(photo, 'JPEG', quality=92)
+    samples.append(('phone-photo.jpg', photo.getvalue(), 'image/jpeg'))
+
+    scan = io.BytesIO()
+    synthetic_page(rng, 2480, 3508, lines=40, tint=(255, 255, 255)).save(scan, 'PNG')
+    samples.append(('a4-scan-300dpi.png', scan.getvalue(), 'image/png'))
+
+    pages = [synthetic_page(rng, 1240, 1754, lines=30, tint=(255, 255, 255)) for _ in range(3)]
+    blank = Image.new('RGB', (1240, 1754), (255, 255, 255))
+    pdf = io.BytesIO()
+    ordered = [pages[0], blank, pages[1], pages[1], pages[2], blank]
+    ordered[0].save(pdf, 'PDF', resolution=150, save_all=True, append_images=ordered[1:])
+    samples.append(('scanned-6-pages.pdf', pdf.getvalue(), 'application/pdf'))
+    return samples
+
+
+class Command(BaseCommand):
+    help = 'Benchmark lab upload preprocessing on sample reports: bytes and approximate tokens saved, time taken'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', nargs='*', default=[], help='real reports to measure (JPG, PNG or PDF)')
+        parser.add_argument('--iterations', type=int, default=3, help='timed runs per file')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        if lab_upload.Image is None or lab_upload.PdfReader is None:
+            self.stderr.write('Pillow and/or pypdf are not installed: those files are sent unchanged.')
+        samples = []
+        for path in options['files']:
+            with open(path, 'rb') as f:
+                samples.append((os.path.basename(path), f.read(), mimetypes.guess_type(path)[0] or ''))
+        if not samples:
+            if lab_upload.Image is None:
+                raise CommandError('Generating sample reports needs Pillow; pass --files instead')
+            samples = sample_reports(options['seed'])
+
+        self.stdout.write(f"{'file':<24}{'uploaded':>12}{'sent':>12}{'saved':>8}{'tokens':>16}{'ms':>9}")
+        total_in = total_out = 0
+        for name, data, mime_type in samples:
+            timings = []
+            for _ in range(max(1, options['iterations'])):
+                upload = LabUpload(SimpleUploadedFile(name, data, content_type=mime_type), mime_type)
+                start = time.perf_counter()
+                try:
+                    sent, sent_mime = upload.prepare()
+                except UploadRejected as e:
+                    self.stdout.write(f'{name:<24} rejected: {e}')
+                    break
+                timings.append((time.perf_counter() - start) * 1000)
+            if not timings:
+                continue
+            before, after = estimate_tokens(data, mime_type), estimate_tokens(sent, sent_mime)
+            tokens = f'{before} -> {after}' if before and after else '-'
+            total_in += len(data)
+            total_out += len(sent)
+            self.stdout.write(f'{name:<24}{len(data):>12,}{len(sent):>12,}{1 - len(sent) / len(data):>8.0%}'
+                              f'{tokens:>16}{sorted(timings)[len(timings) // 2]:>9.1f}')
+
+        if total_in:
+            self.stdout.write(self.style.SUCCESS(
+                f'{total_in:,} -> {total_out:,} bytes ({1 - total_out / total_in:.0%} smaller)'))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from core.utils.speciality_mapper import ALIAS_TABLE, SPECIALITY_MAP, normalize_speciality
+import time
+
+
+def linear_scan(speciality):
+    """The previous normalize_speciality: dict-ordered substring scan, kept for comparison."""
+    if not speciality:
+        return 'General Medicine'
+    normalized = speciality.lower().strip()
+    if normalized in SPECIALITY_MAP:
+        return SPECIALITY_MAP[normalized]
+    for key, val in SPECIALITY_MAP.items():
+        if key in normalized:
+            return val
+    return 'General Medicine'
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark normalize_speciality against the old linear alias scan'
+
+    SAMPLES = [
+        'Cardiology',
+        'Heart Specialist',
+        'high fever with severe chest pain and sweating',
+        'General Physician / Internal Medicine',
+        'Dermatologist for itching and rashes',
+        'pediatrician',
+        'हृदय रोग विशेषज्ञ',
+        'સાંધાનો દુખાવો',
+        'something the table does not know about at all',
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+
+    def time_it(self, func, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for sample in self.SAMPLES:
+                func(sample)
+        elapsed = time.perf_counter() - start
+        return elapsed / (iterations * len(self.SAMPLES)) * 1e6
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        self.stdout.write(f'{len(ALIAS_TABLE)} aliases, {len(self.SAMPLES)} samples x {iterations} iterations')
+
+        legacy = self.time_it(linear_scan, iterations)
+        compiled = self.time_it(normalize_speciality, iterations)
+        self.stdout.write(f'linear scan:      {legacy:.2f} us/call')
+        self.stdout.write(f'compiled matcher: {compiled:.2f} us/call')
+
+        for sample in self.SAMPLES:
+            self.stdout.write(f'  {sample!r}: {linear_scan(sample)} -> {normalize_speciality(sample)}')
+
+        self.stdout.write(self.style.SUCCESS(f'Speed-up: {legacy / compiled:.1f}x'))
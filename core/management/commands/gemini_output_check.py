@@ -0,0 +1,158 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from core.utils import gemini, gemini_client, metrics
+from core.utils.gemini_schemas import LAB_DISCLAIMER
+import json
+import mimetypes
+import time
+
+
+SAMPLE_SYMPTOMS = [
+    'fever with body ache and headache for three days',
+    'chest pain and sweating since morning',
+    'burning urination and lower back pain',
+    'itchy red rash on both arms after a new soap',
+    'cough with yellow phlegm and mild fever for a week',
+]
+
+SAMPLE_LAB_RESULT = {
+    'report_type': 'Complete Blood Count',
+    'parameters': [
+        {'name': 'Hemoglobin', 'value': '10.8 g/dL', 'normal_range': '12-16 g/dL', 'status': 'low',
+         'simple_explanation': 'Your blood carries a little less oxygen than usual.'},
+        {'name': 'Platelets', 'value': '2.1 lakh/uL', 'normal_range': '1.5-4.5 lakh/uL', 'status': 'normal',
+         'simple_explanation': 'Your blood clots normally.'},
+    ],
+    'overall_summary': 'Mild anemia; the other counts are within range.',
+    'possible_conditions': [
+        {'name': 'Iron deficiency anemia', 'likelihood': 'possible',
+         'explanation': 'Low hemoglobin is often caused by too little iron.', 'cause': 'Diet or blood loss'},
+    ],
+    'recommendation': 'Ask your doctor about iron studies.',
+    'disclaimer': LAB_DISCLAIMER,
+}
+
+# What lab_values.read_lab_values() hands to explain_lab_values for the same report
+SAMPLE_LAB_VALUES = {
+    'report_type': SAMPLE_LAB_RESULT['report_type'],
+    'parameters': [dict(p, simple_explanation='') for p in SAMPLE_LAB_RESULT['parameters']],
+}
+
+MODES = (('text', False), ('schema', True))
+FAILURE_REASONS = ('truncated', 'json', 'schema')
+
+
+class _NoCache:
+    """Stands in for the response cache so every check call reaches Gemini."""
+
+    def set(self, key, value):
+        pass
+
+
+class Command(BaseCommand):
+    help = ('Send the same Gemini calls as free text and with response schemas, and compare output tokens, '
+            'parse failures and latency per operation')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=2, help='repetitions of every sample call per mode')
+        parser.add_argument('--lab-file', help='lab report image or PDF; lab report calls are skipped without one')
+        parser.add_argument('--language', default='Hindi', help='target language for the translation calls')
+        parser.add_argument('--stub', action='store_true', help='use the local Gemini stub instead of the API')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1')
+        lab = None
+        if options['lab_file']:
+            with open(options['lab_file'], 'rb') as f:
+                lab = (f.read(), mimetypes.guess_type(options['lab_file'])[0] or 'application/octet-stream')
+        elif options['stub']:
+            lab = (b'stub-report', 'image/png')
+
+        stub = override_settings(GEMINI_STUB={'LATENCY': 0.0, 'JITTER': 0.0}) if options['stub'] else None
+        if stub:
+            stub.enable()
+        gemini_client.reset_client()
+        try:
+            client = gemini_client.get_client()
+            if client is None:
+                raise CommandError('GEMINI_API_KEY is not set; use --stub to check against the local stub')
+            rows = []
+            for mode, schemas in MODES:
+                with override_settings(GEMINI_RESPONSE_SCHEMAS=schemas):
+                    rows.extend(self.run_mode(client, mode, lab, options))
+        finally:
+            if stub:
+                stub.disable()
+            gemini_client.reset_client()
+        self.report(rows)
+
+    def run_mode(self, client, mode, lab, options):
+        source = gemini.lab_translation_source(SAMPLE_LAB_RESULT)
+        source_json = json.dumps(list(source.values()), ensure_ascii=False)
+        calls = {
+            'triage': [
+                lambda text=text: gemini._generate_triage(_NoCache(), None, text, 'Ahmedabad', 'English')
+                for text in SAMPLE_SYMPTOMS
+            ],
+            'translate': [
+                lambda: gemini._translate_texts(client, source_json, len(source), options['language']),
+            ],
+            'lab_explain': [
+                lambda: gemini.explain_lab_values(SAMPLE_LAB_VALUES),
+                lambda: gemini.explain_lab_values(SAMPLE_LAB_VALUES, options['language']),
+            ],
+        }
+        if lab:
+            calls['lab_report'] = [
+                lambda: gemini._run_lab_report_prompt(gemini._lab_report_prompt(), *lab),
+            ]
+            calls['lab_report_localized'] = [
+                lambda: gemini.analyze_lab_report_localized(*lab, 'check', options['language']),
+            ]
+
+        fmt = 'schema' if mode == 'schema' else 'text'
+        rows = []
+        for operation, funcs in calls.items():
+            tokens = metrics.GEMINI_OUTPUT_TOKENS.total(operation=operation, format=fmt)
+            replies = metrics.GEMINI_OUTPUT_TOKENS.count(operation=operation, format=fmt)
+            failures = self.failures(operation)
+            elapsed = 0.0
+            for _ in range(options['runs']):
+                for func in funcs:
+                    start = time.perf_counter()
+                    try:
+                        func()
+                    except Exception as e:
+                        self.stderr.write(f'{operation} ({mode}): {e}')
+                    elapsed += time.perf_counter() - start
+            calls_made = options['runs'] * len(funcs)
+            replies = metrics.GEMINI_OUTPUT_TOKENS.count(operation=operation, format=fmt) - replies
+            rows.append({
+                'operation': operation,
+                'mode': mode,
+                'calls': calls_made,
+                'output_tokens': ((metrics.GEMINI_OUTPUT_TOKENS.total(operation=operation, format=fmt) - tokens)
+                                  / replies if replies else None),
+                'failure_rate': (self.failures(operation) - failures) / calls_made,
+                'seconds': elapsed / calls_made,
+            })
+        return rows
+
+    def failures(self, operation):
+        return sum(metrics.GEMINI_PARSE_FAILURES.value(operation=operation, reason=reason)
+                   for reason in FAILURE_REASONS)
+
+    def report(self, rows):
+        self.stdout.write(f"{'operation':<22}{'mode':<8}{'calls':>6}{'out tokens':>12}{'failures':>10}{'mean s':>9}")
+        baseline = {}
+        for row in sorted(rows, key=lambda r: (r['operation'], r['mode'] != 'text')):
+            tokens = row['output_tokens']
+            line = (f"{row['operation']:<22}{row['mode']:<8}{row['calls']:>6}"
+                    f"{'-' if tokens is None else f'{tokens:.1f}':>12}{row['failure_rate']:>10.1%}"
+                    f"{row['seconds']:>9.2f}")
+            if row['mode'] == 'text':
+                baseline[row['operation']] = tokens
+            elif tokens is not None and baseline.get(row['operation']):
+                line += f"   {tokens / baseline[row['operation']] - 1:+.1%} tokens"
+            self.stdout.write(line)
@@ -0,0 +1,332 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core.models import Hospital
+from core.utils.geo import invalidate_spatial_index
+from core.utils.hospital_facets import invalidate_filter_facets
+from core.utils.speciality_mapper import match_speciality
+from collections import Counter
+from itertools import islice
+import csv
+import json
+import os
+import re
+import time
+import uuid
+
+
+# Registry column spellings accepted for each Hospital field
+COLUMN_ALIASES = {
+    'external_id': ('external_id', 'registry_id', 'hospital_id', 'id'),
+    'name': ('name', 'hospital_name'),
+    'address': ('address',),
+    'city': ('city', 'district'),
+    'pincode': ('pincode', 'pin', 'postal_code'),
+    'lat': ('lat', 'latitude'),
+    'lng': ('lng', 'lon', 'long', 'longitude'),
+    'contact': ('contact', 'phone', 'telephone'),
+    'ambulance_contact': ('ambulance_contact', 'ambulance_phone'),
+    'specialities': ('specialities', 'specialties', 'departments'),
+    'hospital_type': ('hospital_type', 'type', 'ownership'),
+    'rating': ('rating',),
+    'base_cost_factor': ('base_cost_factor', 'cost_factor'),
+    'total_beds': ('total_beds', 'beds'),
+    'icu_beds': ('icu_beds',),
+    'emergency_beds': ('emergency_beds',),
+    'facilities': ('facilities',),
+    'acceptedSchemes': ('accepted_schemes', 'acceptedSchemes', 'schemes'),
+}
+
+HOSPITAL_TYPE_ALIASES = {
+    'government': 'government', 'govt': 'government', 'public': 'government', 'state': 'government',
+    'private': 'private',
+    'trust': 'trust', 'charitable': 'trust', 'ngo': 'trust',
+    'premium': 'premium', 'corporate': 'premium',
+}
+
+# Everything the importer owns; created_at and the primary key are left alone on update
+UPSERT_FIELDS = [
+    'name', 'address', 'city', 'pincode', 'lat', 'lng', 'contact', 'ambulance_contact', 'specialities',
+    'hospital_type', 'rating', 'base_cost_factor', 'total_beds', 'icu_beds', 'emergency_beds', 'facilities',
+    'acceptedSchemes', 'updated_at',
+]
+
+LIST_SPLIT_RE = re.compile(r'\s*[;|,]\s*')
+
+
+class RowError(ValueError):
+    """A registry row that cannot be imported; the message says why."""
+
+
+def read_rows(path, fmt):
+    """Yield (line_number, dict) pairs from a CSV or JSONL file without loading it into memory."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, RowError(f'invalid JSON: {e}')
+                    continue
+                yield line_number, row if isinstance(row, dict) else RowError(
+                    f'not a JSON object: {type(row).__name__}')
+
+
+def pick(row, field):
+    for key in COLUMN_ALIASES[field]:
+        value = row.get(key)
+        if value not in (None, ''):
+            return value.strip() if isinstance(value, str) else value
+    return None
+
+
+def as_float(value, field, low, high, default=None):
+    if value is None:
+        if default is None:
+            raise RowError(f'{field} is required')
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{field} is not a number: {value!r}')
+    if not low <= number <= high:
+        raise RowError(f'{field} out of range [{low}, {high}]: {number}')
+    return number
+
+
+def as_int(value, field):
+    if value is None:
+        return 0
+    try:
+        number = int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        raise RowError(f'{field} is not an integer: {value!r}')
+    if number < 0:
+        raise RowError(f'{field} is negative: {number}')
+    return number
+
+
+def as_text(value, field, max_length=None, allow_int=False):
+    if value is None:
+        return ''
+    # IDs, pincodes and phone numbers often come through JSON as plain integers
+    if allow_int and isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        raise RowError(f'{field} is not text: {value!r}')
+    return value[:max_length] if max_length else value
+
+
+def as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    text = str(value).strip()
+    if text.startswith('['):
+        try:
+            return as_list(json.loads(text))
+        except json.JSONDecodeError:
+            pass
+    return [part for part in LIST_SPLIT_RE.split(text) if part]
+
+
+def as_dict(value, field):
+    if value is None:
+        return {}
+    if isinstance(value, dict):
+        return value
+    try:
+        parsed = json.loads(value)
+    except (TypeError, json.JSONDecodeError):
+        raise RowError(f'{field} is not a JSON object')
+    if not isinstance(parsed, dict):
+        raise RowError(f'{field} is not a JSON object')
+    return parsed
+
+
+def normalize_row(row, unmapped=None):
+    """
+    Validate one registry row and return an unsaved Hospital; raises RowError.
+    Departments with no known speciality are left out and counted in the
+    `unmapped` Counter; a row listing only such departments is rejected.
+    """
+    if isinstance(row, RowError):
+        raise row
+    external_id = as_text(pick(row, 'external_id'), 'external_id', 100, allow_int=True)
+    name = as_text(pick(row, 'name'), 'name', 255)
+    city = as_text(pick(row, 'city'), 'city').title()[:100]
+    if not external_id:
+        raise RowError('external_id is required')
+    if not name:
+        raise RowError('name is required')
+    if not city:
+        raise RowError('city is required')
+
+    departments = as_list(pick(row, 'specialities'))
+    matched = [match_speciality(d) for d in departments]
+    specialities = list(dict.fromkeys(s for s in matched if s))
+    if unmapped is not None:
+        unmapped.update(d for d, s in zip(departments, matched) if s is None)
+    if departments and not specialities:
+        raise RowError(f'no known speciality in {departments}')
+    schemes = pick(row, 'acceptedSchemes')
+    if isinstance(schemes, str) and schemes.startswith('[{'):
+        try:
+            schemes = json.loads(schemes)
+        except json.JSONDecodeError:
+            raise RowError('accepted_schemes is not valid JSON')
+    if isinstance(schemes, list) and schemes and isinstance(schemes[0], dict):
+        accepted = schemes
+    else:
+        # Stable IDs so re-importing the same registry does not churn the JSON
+        accepted = [{'schemeName': s, 'schemeId': str(uuid.uuid5(uuid.NAMESPACE_URL, s))} for s in as_list(schemes)]
+
+    raw_type = as_text(pick(row, 'hospital_type'), 'hospital_type').lower()
+    return Hospital(
+        external_id=external_id,
+        name=name,
+        address=as_text(pick(row, 'address'), 'address'),
+        city=city,
+        pincode=as_text(pick(row, 'pincode'), 'pincode', 20, allow_int=True),
+        lat=as_float(pick(row, 'lat'), 'lat', -90, 90),
+        lng=as_float(pick(row, 'lng'), 'lng', -180, 180),
+        contact=as_text(pick(row, 'contact'), 'contact', 50, allow_int=True),
+        ambulance_contact=as_text(pick(row, 'ambulance_contact'), 'ambulance_contact', 50, allow_int=True) or None,
+        specialities=specialities or ['General Medicine'],
+        hospital_type=HOSPITAL_TYPE_ALIASES.get(raw_type, 'unknown'),
+        rating=as_float(pick(row, 'rating'), 'rating', 0, 5, default=0.0),
+        base_cost_factor=as_float(pick(row, 'base_cost_factor'), 'base_cost_factor', 0.1, 10, default=1.0),
+        total_beds=as_int(pick(row, 'total_beds'), 'total_beds'),
+        icu_beds=as_int(pick(row, 'icu_beds'), 'icu_beds'),
+        emergency_beds=as_int(pick(row, 'emergency_beds'), 'emergency_beds'),
+        facilities=as_dict(pick(row, 'facilities'), 'facilities'),
+        acceptedSchemes=accepted,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Stream hospitals from a registry CSV/JSONL file and upsert them on external_id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='default: from the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--checkpoint', help='default: <path>.checkpoint')
+        parser.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+        parser.add_argument('--rejects', help='write rejected rows (with the reason) to this JSONL file')
+
+    def load_checkpoint(self, checkpoint, path, restart):
+        if restart or not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint, encoding='utf-8') as f:
+            state = json.load(f)
+        stat = os.stat(path)
+        if state.get('size') != stat.st_size or state.get('mtime') != int(stat.st_mtime):
+            raise CommandError(f'{path} changed since checkpoint {checkpoint} was written; use --restart')
+        self.stdout.write(f"Resuming after row {state['rows_done']} (from {checkpoint})")
+        return state['rows_done']
+
+    def save_checkpoint(self, checkpoint, path, rows_done):
+        stat = os.stat(path)
+        tmp = checkpoint + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': int(stat.st_mtime),
+                       'rows_done': rows_done}, f)
+        os.replace(tmp, checkpoint)
+
+    def upsert(self, hospitals):
+        """Insert or update one batch on external_id; returns (created, updated)."""
+        # The last occurrence of an ID wins, and ON CONFLICT may touch each row only once
+        by_id = {h.external_id: h for h in hospitals}
+        hospitals = list(by_id.values())
+        existing = set(Hospital.objects.filter(external_id__in=by_id).values_list('external_id', flat=True))
+        Hospital.objects.bulk_create(
+            hospitals, update_conflicts=True, unique_fields=['external_id'], update_fields=UPSERT_FIELDS,
+        )
+        # bulk_create does not return primary keys for upserted rows on every backend
+        ids = dict(Hospital.objects.filter(external_id__in=by_id).values_list('external_id', 'id'))
+        for hospital in hospitals:
+            hospital.pk = ids[hospital.external_id]
+        Hospital.bulk_sync_speciality_index(hospitals)
+        return len(hospitals) - len(existing), len(existing)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        batch_size = options['batch_size']
+        checkpoint = options['checkpoint'] or path + '.checkpoint'
+
+        rows_done = self.load_checkpoint(checkpoint, path, options['restart'])
+        rows = islice(read_rows(path, fmt), rows_done, None)
+        rejects = open(options['rejects'], 'a', encoding='utf-8') if options['rejects'] else None
+        totals = {'created': 0, 'updated': 0, 'rejected': 0}
+        unmapped = Counter()
+        started = time.perf_counter()
+        batch_number = 0
+
+        try:
+            while True:
+                chunk = list(islice(rows, batch_size))
+                if not chunk:
+                    break
+                batch_number += 1
+                batch_start = time.perf_counter()
+
+                valid = []
+                for line_number, row in chunk:
+                    try:
+                        valid.append(normalize_row(row, unmapped))
+                    except RowError as e:
+                        totals['rejected'] += 1
+                        if rejects:
+                            rejects.write(json.dumps({'line': line_number, 'error': str(e),
+                                                      'row': row if isinstance(row, dict) else None},
+                                                     ensure_ascii=False) + '\n')
+                        elif options['verbosity'] > 1:
+                            self.stderr.write(f'line {line_number}: {e}')
+
+                try:
+                    with transaction.atomic():
+                        created, updated = self.upsert(valid) if valid else (0, 0)
+                except Exception as e:
+                    raise CommandError(
+                        f'Batch {batch_number} failed ({e}); {rows_done} rows are committed. '
+                        f'Re-run the same command to resume from {checkpoint}.'
+                    )
+                rows_done += len(chunk)
+                self.save_checkpoint(checkpoint, path, rows_done)
+
+                totals['created'] += created
+                totals['updated'] += updated
+                took = time.perf_counter() - batch_start
+                self.stdout.write(
+                    f'batch {batch_number}: {len(chunk)} rows, {created} created, {updated} updated, '
+                    f'{len(chunk) - len(valid)} rejected in {took:.2f}s ({len(chunk) / took:.0f} rows/s)'
+                )
+        finally:
+            if rejects:
+                rejects.close()
+            if batch_number:
+                invalidate_filter_facets()
+                invalidate_spatial_index()
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {rows_done} rows: {totals['created']} created, {totals['updated']} updated, "
+            f"{totals['rejected']} rejected in {elapsed:.1f}s"
+        ))
+        if unmapped:
+            self.stdout.write(self.style.WARNING(
+                'Departments with no known speciality (left out): '
+                + ', '.join(f'{name} ({count})' for name, count in unmapped.most_common())
+            ))
@@ -1,11 +1,23 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
 from core.models import Hospital, Doctor
+from itertools import islice
 import random
 
 
+# Written with bulk_update: every row gets its own random values, so one set-based UPDATE is not possible
+UPDATE_FIELDS = ['total_beds', 'icu_beds', 'emergency_beds', 'facilities', 'updated_at']
+
+
 class Command(BaseCommand):
     help = 'Populate hospitals with facility data and doctors'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--clear-doctors', action='store_true',
+                            help='delete existing doctors first instead of adding to them')
+
     def handle(self, *args, **kwargs):
         hospitals = Hospital.objects.all()
         
@@ -104,48 +116,59 @@ class Command(BaseCommand):
             'Mon, Tue, Thu, Fri'
         ]
         
+        batch_size = kwargs['batch_size']
         updated_count = 0
         doctors_created = 0
+        now = timezone.now()
         
-        for hospital in hospitals:
-            # Get facility template based on hospital type
-            template = facility_templates.get(hospital.hospital_type, facility_templates['private'])
-            
-            # Update hospital facilities
-            total_beds_range = template['total_beds']
-            icu_beds_range = template['icu_beds']
-            emergency_beds_range = template['emergency_beds']
-            
-            hospital.total_beds = random.randint(*total_beds_range)
-            hospital.icu_beds = random.randint(*icu_beds_range)
-            hospital.emergency_beds = random.randint(*emergency_beds_range)
-            
-            # Copy facilities and randomize operation theaters
-            facilities = template['facilities'].copy()
-            facilities['operation_theaters'] = random.randint(3, 15)
-            hospital.facilities = facilities
-            
-            hospital.save()
-            updated_count += 1
-            
-            # Create 3-5 doctors per hospital
-            num_doctors = random.randint(3, 5)
-            selected_doctors = random.sample(doctor_templates, min(num_doctors, len(doctor_templates)))
-            
-            for idx, doc_template in enumerate(selected_doctors):
-                experience = random.randint(*doc_template['experience'])
-                
-                Doctor.objects.create(
-                    hospital=hospital,
-                    name=doc_template['name'],
-                    qualification=doc_template['qualification'],
-                    specialization=doc_template['specialization'],
-                    experience_years=experience,
-                    is_head_doctor=(idx == 0),  # First doctor is head
-                    consultation_days=random.choice(consultation_days_options)
-                )
-                doctors_created += 1
-        
+        # One transaction, batched writes: bulk_update per batch of hospitals
+        # and multi-row INSERTs for their doctors instead of one commit per row
+        with transaction.atomic():
+            if kwargs['clear_doctors']:
+                Doctor.objects.all().delete()
+
+            rows = hospitals.only('id', 'hospital_type').order_by('id').iterator(chunk_size=batch_size)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                doctors = []
+                for hospital in batch:
+                    # Get facility template based on hospital type
+                    template = facility_templates.get(hospital.hospital_type, facility_templates['private'])
+                    
+                    # Update hospital facilities
+                    hospital.total_beds = random.randint(*template['total_beds'])
+                    hospital.icu_beds = random.randint(*template['icu_beds'])
+                    hospital.emergency_beds = random.randint(*template['emergency_beds'])
+                    
+                    # Copy facilities and randomize operation theaters
+                    facilities = template['facilities'].copy()
+                    facilities['operation_theaters'] = random.randint(3, 15)
+                    hospital.facilities = facilities
+                    hospital.updated_at = now
+                    
+                    # Create 3-5 doctors per hospital
+                    num_doctors = random.randint(3, 5)
+                    selected_doctors = random.sample(doctor_templates, min(num_doctors, len(doctor_templates)))
+                    
+                    for idx, doc_template in enumerate(selected_doctors):
+                        doctors.append(Doctor(
+                            hospital=hospital,
+                            name=doc_template['name'],
+                            qualification=doc_template['qualification'],
+                            specialization=doc_template['specialization'],
+                            experience_years=random.randint(*doc_template['experience']),
+                            is_head_doctor=(idx == 0),  # First doctor is head
+                            consultation_days=random.choice(consultation_days_options)
+                        ))
+
+                Hospital.objects.bulk_update(batch, UPDATE_FIELDS, batch_size=batch_size)
+                Doctor.objects.bulk_create(doctors, batch_size=batch_size)
+                updated_count += len(batch)
+                doctors_created += len(doctors)
+                self.stdout.write(f'  {updated_count} hospitals...')
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'Successfully updated {updated_count} hospitals with facility data and created {doctors_created} doctors'
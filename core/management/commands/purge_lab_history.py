@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.models import LabReportHistory
+from datetime import timedelta
+import time
+
+
+class Command(BaseCommand):
+    help = 'Delete lab report history older than the retention window, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'LAB_HISTORY_RETENTION_DAYS', 365),
+                            help='keep entries newer than this many days (default: LAB_HISTORY_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='seconds to sleep between batches, to leave room for other writers')
+        parser.add_argument('--dry-run', action='store_true', help='only count what would be deleted')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = LabReportHistory.objects.filter(created_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f'{expired.count()} entries older than {cutoff:%Y-%m-%d} would be deleted')
+            return
+
+        # Short transactions on the created_at index instead of one huge DELETE
+        deleted = 0
+        while True:
+            ids = list(expired.order_by('created_at').values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            count, _ = LabReportHistory.objects.filter(id__in=ids).delete()
+            deleted += count
+            if options['verbosity'] > 1:
+                self.stdout.write(f'deleted {deleted} so far')
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} lab report entries older than {cutoff:%Y-%m-%d}'))
@@ -1,15 +1,25 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from core.models import Hospital
+from core.utils.geo import invalidate_spatial_index
+from core.utils.hospital_facets import invalidate_filter_facets
+from core.utils.synthetic import load_catalogue
+import time
 import uuid
 
 class Command(BaseCommand):
     help = 'Seeds the database with initial hospital data'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=0,
+                            help='also generate N synthetic hospitals (core/utils/synthetic.py)')
+        parser.add_argument('--doctors', type=int, default=0, help='synthetic doctors spread over the --scale hospitals')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
     def handle(self, *args, **kwargs):
         self.stdout.write('Seeding data...')
-        
-        # Clear existing data
-        Hospital.objects.all().delete()
+        start = time.perf_counter()
 
         hospitals = [
           # ===== GOVERNMENT / TRUST (LOW COST, ALL-ROUND) =====
@@ -279,7 +289,23 @@ class Command(BaseCommand):
           }
         ]
 
-        for h_data in hospitals:
-            Hospital.objects.create(**h_data)
-        
-        self.stdout.write(self.style.SUCCESS(f'Successfully seeded {len(hospitals)} hospitals'))
+        # One transaction: the catalogue is replaced atomically and SQLite commits once
+        with transaction.atomic():
+            # Clear existing data
+            Hospital.objects.all().delete()
+
+            created = Hospital.objects.bulk_create([Hospital(**h_data) for h_data in hospitals])
+            Hospital.bulk_sync_speciality_index(created)
+
+            if kwargs['scale']:
+                synthetic = load_catalogue(
+                    kwargs['scale'], kwargs['doctors'], seed=kwargs['seed'], batch_size=kwargs['batch_size'],
+                    progress=lambda done: self.stdout.write(f'  {done}/{kwargs["scale"]} synthetic hospitals'),
+                )
+                self.stdout.write(f'Generated {synthetic[0]} synthetic hospitals and {synthetic[1]} doctors')
+
+        invalidate_filter_facets()
+        invalidate_spatial_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully seeded {len(hospitals) + kwargs["scale"]} hospitals in {time.perf_counter() - start:.1f}s'
+        ))
@@ -1,19 +1,21 @@
 from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.db.models.functions import Now
 from core.models import Hospital
 
 class Command(BaseCommand):
     help = 'Update ambulance contacts for hospitals with ambulance service'
 
     def handle(self, *args, **options):
-        hospitals_with_ambulance = Hospital.objects.filter(facilities__ambulance=True)
-        updated_count = 0
-        
-        for hospital in hospitals_with_ambulance:
-            if not hospital.ambulance_contact:
-                # Use the same contact number for ambulance service
-                hospital.ambulance_contact = hospital.contact
-                hospital.save()
-                updated_count += 1
-                self.stdout.write(f"Updated {hospital.name}")
+        missing_contact = Hospital.objects.filter(facilities__ambulance=True).filter(
+            Q(ambulance_contact__isnull=True) | Q(ambulance_contact='')
+        )
+
+        if options['verbosity'] > 1:
+            for name in missing_contact.values_list('name', flat=True):
+                self.stdout.write(f"Updating {name}")
+
+        # One set-based UPDATE: use the same contact number for ambulance service
+        updated_count = missing_contact.update(ambulance_contact=F('contact'), updated_at=Now())
         
         self.stdout.write(self.style.SUCCESS(f'Successfully updated {updated_count} hospitals with ambulance contacts'))
@@ -0,0 +1,105 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from core.utils import metrics, profiler
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status, SQL count/time and response size per URL name
+    (core/utils/metrics.py). Runs natively in both sync and async stacks so
+    async views do not pay an extra thread hop for it. Streaming responses are
+    timed to their first byte and have no size recorded.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        db_stats, token = metrics.start_request_db()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request_db(token)
+        self.record(request, response, time.perf_counter() - start, db_stats)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        db_stats, token = metrics.start_request_db()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request_db(token)
+        self.record(request, response, time.perf_counter() - start, db_stats)
+        return response
+
+    def record(self, request, response, seconds, db_stats):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        metrics.REQUEST_LATENCY.observe(seconds, view=view, method=request.method)
+        metrics.REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        metrics.REQUEST_DB_QUERIES.observe(db_stats[0], view=view)
+        metrics.REQUEST_DB_TIME.observe(db_stats[1], view=view)
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.observe(len(response.content), view=view)
+
+
+class ProfilerMiddleware:
+    """
+    Profile a request when a staff user asks for it (?_profile=1 or an
+    X-Profile header) or when it is sampled (core/utils/profiler.py). Must
+    follow AuthenticationMiddleware. For async views cProfile sees the event
+    loop thread, which may include other requests' coroutines.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        trigger = profiler.profile_trigger(request)
+        if trigger is None or (trigger == 'flag' and not profiler.is_staff(request)):
+            return self.get_response(request)
+        run = profiler.RequestProfiler(trigger)
+        run.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            run.stop()
+        self.save(run, request, response)
+        return response
+
+    async def __acall__(self, request):
+        trigger = profiler.profile_trigger(request)
+        if trigger is None or (trigger == 'flag' and not await sync_to_async(profiler.is_staff)(request)):
+            return await self.get_response(request)
+        run = profiler.RequestProfiler(trigger)
+        run.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            run.stop()
+        await sync_to_async(self.save)(run, request, response)
+        return response
+
+    def save(self, run, request, response):
+        try:
+            run.save(request, response)
+        except Exception as e:
+            print(f"Profiler save error: {e}")
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.text
+
+
+def backfill_speciality_index(apps, schema_editor):
+    Hospital = apps.get_model('core', 'Hospital')
+    HospitalSpeciality = apps.get_model('core', 'HospitalSpeciality')
+    rows = []
+    for hospital_id, specialities in Hospital.objects.values_list('id', 'specialities'):
+        for name in dict.fromkeys(s for s in (specialities or []) if s):
+            rows.append(HospitalSpeciality(hospital_id=hospital_id, name=name))
+    HospitalSpeciality.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_add_lab_report_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HospitalSpeciality',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='hospital',
+            index=models.Index(django.db.models.functions.text.Lower('city'), name='hospital_city_lower_idx'),
+        ),
+        migrations.AddField(
+            model_name='hospitalspeciality',
+            name='hospital',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='speciality_index', to='core.hospital'),
+        ),
+        migrations.AddIndex(
+            model_name='hospitalspeciality',
+            index=models.Index(fields=['name', 'hospital'], name='hospital_speciality_name_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='hospitalspeciality',
+            constraint=models.UniqueConstraint(fields=('hospital', 'name'), name='unique_hospital_speciality'),
+        ),
+        migrations.RunPython(backfill_speciality_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_hospital_speciality_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hospital',
+            index=models.Index(fields=['-rating', '-id'], name='hospital_rating_id_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_hospital_rating_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labreporthistory',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='labreporthistory',
+            name='language',
+            field=models.CharField(default='English', max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='labreporthistory',
+            index=models.Index(fields=['content_hash', 'language'], name='labreport_hash_lang_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_request_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hospital',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
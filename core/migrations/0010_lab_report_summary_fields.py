@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:04
+
+from django.db import migrations, models
+
+
+def backfill_summary_fields(apps, schema_editor):
+    LabReportHistory = apps.get_model('core', 'LabReportHistory')
+    batch = []
+    for entry in LabReportHistory.objects.only('id', 'analysis').iterator(chunk_size=500):
+        analysis = entry.analysis if isinstance(entry.analysis, dict) else {}
+        conditions = analysis.get('possible_conditions') or []
+        entry.report_type = str(analysis.get('report_type') or '')[:255]
+        entry.condition_names = [c['name'] for c in conditions if isinstance(c, dict) and c.get('name')]
+        batch.append(entry)
+        if len(batch) == 500:
+            LabReportHistory.objects.bulk_update(batch, ['report_type', 'condition_names'])
+            batch = []
+    LabReportHistory.objects.bulk_update(batch, ['report_type', 'condition_names'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_hospital_external_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labreporthistory',
+            name='condition_names',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='labreporthistory',
+            name='report_type',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='labreporthistory',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.RunPython(backfill_summary_fields, migrations.RunPython.noop),
+    ]
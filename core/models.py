@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models.functions import Lower
+from core.utils.hospital_facets import invalidate_filter_facets
+from core.utils.geo import invalidate_spatial_index
 
 class Hospital(models.Model):
     HOSPITAL_TYPES = [
@@ -9,6 +12,7 @@ class Hospital(models.Model):
         ('unknown', 'Unknown'),
     ]
 
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)  # Registry ID used by import_hospitals
     name = models.CharField(max_length=255)
     address = models.TextField()
     city = models.CharField(max_length=100)
@@ -36,9 +40,71 @@ class Hospital(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(Lower('city'), name='hospital_city_lower_idx'),
+            models.Index(fields=['-rating', '-id'], name='hospital_rating_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.sync_speciality_index()
+        invalidate_filter_facets()
+        invalidate_spatial_index()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_filter_facets()
+        invalidate_spatial_index()
+        return result
+
+    def sync_speciality_index(self):
+        """Rebuild the HospitalSpeciality rows mirroring `specialities`."""
+        names = list(dict.fromkeys(s for s in (self.specialities or []) if s))
+        self.speciality_index.exclude(name__in=names).delete()
+        existing = set(self.speciality_index.values_list('name', flat=True))
+        HospitalSpeciality.objects.bulk_create([
+            HospitalSpeciality(hospital=self, name=name)
+            for name in names if name not in existing
+        ])
+
+    @classmethod
+    def bulk_sync_speciality_index(cls, hospitals, batch_size=1000):
+        """
+        Set-based sync_speciality_index for hospitals written with bulk_create /
+        bulk_update (which skip save()): one DELETE and one multi-row INSERT per batch.
+        Callers invalidate the facet and spatial caches once they are done.
+        """
+        hospitals = list(hospitals)
+        for start in range(0, len(hospitals), batch_size):
+            batch = hospitals[start:start + batch_size]
+            HospitalSpeciality.objects.filter(hospital_id__in=[h.pk for h in batch]).delete()
+            HospitalSpeciality.objects.bulk_create([
+                HospitalSpeciality(hospital_id=h.pk, name=name)
+                for h in batch
+                for name in dict.fromkeys(s for s in (h.specialities or []) if s)
+            ], batch_size=batch_size * 10)
+
+
+class HospitalSpeciality(models.Model):
+    """Indexed lookup table mirroring Hospital.specialities for DB-side filtering."""
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='speciality_index')
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'hospital'], name='hospital_speciality_name_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['hospital', 'name'], name='unique_hospital_speciality'),
+        ]
+
+    def __str__(self):
+        return f"{self.hospital_id}: {self.name}"
+
 
 class Doctor(models.Model):
     hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='doctors')
@@ -62,12 +128,56 @@ class Doctor(models.Model):
 
 class LabReportHistory(models.Model):
     """Stores past lab report analyses for the history feature."""
+    # Columns the history sidebar needs; `analysis` is only loaded for one entry at a time
+    SUMMARY_FIELDS = ('id', 'filename', 'report_type', 'condition_names', 'created_at')
+
     filename   = models.CharField(max_length=255)
     analysis   = models.JSONField()            # full Gemini JSON response
-    created_at = models.DateTimeField(auto_now_add=True)
+    content_hash = models.CharField(max_length=64, blank=True, default='')  # SHA-256 of the uploaded file
+    language   = models.CharField(max_length=32, default='English')        # language of `analysis`
+    report_type = models.CharField(max_length=255, blank=True, default='')  # copied from `analysis` on save
+    condition_names = models.JSONField(default=list, blank=True)            # ditto, names only
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['content_hash', 'language'], name='labreport_hash_lang_idx'),
+        ]
 
     def __str__(self):
         return f"{self.filename} — {self.created_at.strftime('%d %b %Y')}"
+
+    def save(self, *args, **kwargs):
+        self.report_type, self.condition_names = self.summarize(self.analysis)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def summarize(analysis):
+        """(report_type, condition names) for the sidebar, from a Gemini analysis dict."""
+        if not isinstance(analysis, dict):
+            return '', []
+        conditions = analysis.get('possible_conditions') or []
+        names = [c.get('name', '') for c in conditions if isinstance(c, dict) and c.get('name')]
+        return str(analysis.get('report_type') or '')[:255], names
+
+
+class RequestProfile(models.Model):
+    """A profiled request captured by core.middleware.ProfilerMiddleware (newest PROFILER_KEEP kept)."""
+    path        = models.CharField(max_length=500)
+    view_name   = models.CharField(max_length=100, blank=True)
+    method      = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    trigger     = models.CharField(max_length=10)             # 'flag' (admin request) or 'sample'
+    duration_ms = models.FloatField()
+    sql_count   = models.PositiveIntegerField(default=0)
+    sql_ms      = models.FloatField(default=0)
+    sql_log     = models.JSONField(default=list)              # [{'sql', 'ms'}, ...] in execution order
+    profile     = models.TextField(blank=True)                # pstats report, sorted by cumulative time
+    created_at  = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} — {self.duration_ms:.0f} ms"
@@ -30,3 +30,32 @@ def scheme_url(scheme_name):
     if not scheme_name:
         return ''
     return SCHEME_URLS.get(scheme_name.strip().lower(), '')
+
+
+# Equipment shown as highlights on the hospital listing cards
+KEY_EQUIPMENT = (
+    ('xray', 'X-Ray'),
+    ('mri', 'MRI'),
+    ('ct_scan', 'CT Scan'),
+)
+
+@register.filter(name='key_equipment')
+def key_equipment(facilities):
+    """Return the display names of the highlighted equipment a hospital has."""
+    if not facilities:
+        return []
+    return [label for key, label in KEY_EQUIPMENT if facilities.get(key)]
+
+@register.filter(name='star_range')
+def star_range(rating):
+    """range() over the whole-star part of a rating, for the star loop."""
+    return range(int(rating)) if rating else []
+
+@register.filter(name='map_url')
+def map_url(hospital):
+    """Google Maps link for anything with lat/lng (model instance or values() dict)."""
+    if isinstance(hospital, dict):
+        lat, lng = hospital.get('lat'), hospital.get('lng')
+    else:
+        lat, lng = getattr(hospital, 'lat', None), getattr(hospital, 'lng', None)
+    return f"https://www.google.com/maps?q={lat},{lng}" if lat and lng else ''
@@ -1,3 +1,1152 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import views
+from core.models import Doctor, Hospital, LabReportHistory, RequestProfile
+from core.utils.cost import budget_filter_q, compute_cost_range, compute_cost_ranges
+from core.utils import lab_upload, metrics
+from core.utils.local_triage import answer_locally, triage
+from core.utils.resilience import CircuitBreaker, CircuitOpenError, call_with_retries
+from core.utils.singleflight import SingleFlight
+from core.utils.speciality_mapper import normalize_speciality
+
+
+def make_hospital(name, city='Ahmedabad', **extra):
+    fields = {
+        'name': name,
+        'address': 'Test Road',
+        'city': city,
+        'pincode': '380001',
+        'lat': 23.0,
+        'lng': 72.5,
+        'contact': '079-00000000',
+        'specialities': ['General Medicine', 'Cardiology'],
+        'hospital_type': 'private',
+        'rating': 4.2,
+        'facilities': {'xray': True, 'mri': True, 'ambulance': True},
+        'ambulance_contact': '108',
+    }
+    fields.update(extra)
+    return Hospital.objects.create(**fields)
+
+
+class AllHospitalsQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def add_hospitals(self, count):
+        for i in range(count):
+            hospital = make_hospital(f'Hospital {Hospital.objects.count()}')
+            for j in range(3):
+                Doctor.objects.create(hospital=hospital, name=f'Doc {j}', qualification='MBBS', specialization='GP')
+
+    def render_listing(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('all_hospitals'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_catalogue(self):
+        self.add_hospitals(2)
+        self.render_listing()  # warm the facet cache
+        _, small = self.render_listing()
+
+        self.add_hospitals(10)
+        self.render_listing()
+        response, large = self.render_listing()
+
+        self.assertEqual(small, large)
+        self.assertEqual(large, 1)
+        self.assertContains(response, 'Hospital 11')
+        self.assertContains(response, 'X-Ray')
+
+    def test_doctor_count_and_type_label_annotated(self):
+        self.add_hospitals(1)
+        response, _ = self.render_listing()
+        row = response.context['hospitals'][0]
+        self.assertEqual(row['doctor_count'], 3)
+        self.assertEqual(row['hospital_type_label'], 'Private')
+
+    def test_facets_invalidated_on_save(self):
+        make_hospital('A', city='Ahmedabad')
+        self.render_listing()
+        make_hospital('B', city='Mumbai')
+        response, _ = self.render_listing()
+        self.assertEqual(response.context['cities'], ['Ahmedabad', 'Mumbai'])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(5):
+            make_hospital(f'Hospital {i}', rating=4.0 if i % 2 else 3.5)
+
+    def test_api_pages_cover_every_match_once(self):
+        seen, cursor = [], None
+        while True:
+            params = {'speciality': 'cardiologist', 'city': 'ahmedabad', 'page_size': 2}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(reverse('hospitals'), params).json()
+            self.assertLessEqual(len(data['hospitals']), 2)
+            seen.extend(h['id'] for h in data['hospitals'])
+            cursor = data['next']
+            if not cursor:
+                break
+        self.assertEqual(sorted(seen), sorted(Hospital.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_listing_links_next_page(self):
+        response = self.client.get(reverse('all_hospitals'), {'page_size': 3, 'city': 'Ahmedabad'})
+        self.assertEqual(len(response.context['hospitals']), 3)
+        next_query = response.context['next_page_query']
+        self.assertIn('city=Ahmedabad', next_query)
+        response = self.client.get(reverse('all_hospitals') + '?' + next_query)
+        self.assertEqual(len(response.context['hospitals']), 2)
+        self.assertIsNone(response.context['next_page_query'])
+        self.assertEqual(response.context['first_page_query'], 'page_size=3&city=Ahmedabad')
+
+
+class NearbyHospitalsTests(TestCase):
+    def setUp(self):
+        make_hospital('Near', lat=23.03, lng=72.58)
+        make_hospital('Far', lat=23.50, lng=72.58)
+        make_hospital('Near Skin', lat=23.031, lng=72.581, specialities=['Dermatology'])
+
+    def test_orders_by_distance_within_radius(self):
+        data = self.client.get(reverse('nearby_hospitals'), {'lat': 23.0, 'lng': 72.58, 'radius': 20}).json()
+        self.assertEqual([h['name'] for h in data['hospitals']], ['Near', 'Near Skin'])
+        self.assertLess(data['hospitals'][0]['distance_km'], data['hospitals'][1]['distance_km'])
+
+    def test_speciality_filter_and_index_refresh(self):
+        params = {'lat': 23.0, 'lng': 72.58, 'radius': 100, 'speciality': 'heart specialist'}
+        data = self.client.get(reverse('nearby_hospitals'), params).json()
+        self.assertEqual([h['name'] for h in data['hospitals']], ['Near', 'Far'])
+
+        make_hospital('Newest', lat=23.001, lng=72.58)
+        data = self.client.get(reverse('nearby_hospitals'), params).json()
+        self.assertEqual(data['hospitals'][0]['name'], 'Newest')
+
+    def test_requires_coordinates(self):
+        self.assertEqual(self.client.get(reverse('nearby_hospitals')).status_code, 400)
+
+
+class CostEstimateTests(TestCase):
+    def setUp(self):
+        make_hospital('Gov', hospital_type='government', base_cost_factor=0.85)
+        make_hospital('Priv', hospital_type='private', base_cost_factor=1.2)
+        make_hospital('Prem', hospital_type='premium', base_cost_factor=1.4)
+
+    def test_batch_matches_single_estimate(self):
+        hospitals = list(Hospital.objects.all())
+        batch = compute_cost_ranges('Dengue', 'Ahmedabad', hospitals)
+        for h, low, high in zip(hospitals, batch['low'], batch['high']):
+            single = compute_cost_range('Dengue', 'Ahmedabad', h)
+            self.assertEqual((single['low'], single['high']), (low, high))
+
+    def test_budget_filter_in_sql_matches_estimate(self):
+        hospitals = list(Hospital.objects.all())
+        lows = compute_cost_ranges('Dengue', 'Ahmedabad', hospitals)['low']
+        for budget in (1000, 4000, 9000, 15000, 20000):
+            expected = {h.id for h, low in zip(hospitals, lows) if low <= budget}
+            matched = set(Hospital.objects.filter(budget_filter_q('Dengue', 'Ahmedabad', budget)).values_list('id', flat=True))
+            self.assertEqual(matched, expected)
+
+    def test_budget_must_be_finite(self):
+        params = {'speciality': 'General Medicine', 'city': 'Ahmedabad'}
+        for budget in ('inf', 'nan', '-1', 'cheap'):
+            response = self.client.get(reverse('hospitals'), {**params, 'budget': budget})
+            self.assertEqual(response.status_code, 400, budget)
+        response = self.client.get(reverse('hospitals'), {**params, 'budget': '9000'})
+        self.assertEqual(response.status_code, 200)
+
+
+class NormalizeSpecialityTests(SimpleTestCase):
+    def test_canonical_names_and_aliases(self):
+        self.assertEqual(normalize_speciality('Cardiology'), 'Cardiology')
+        self.assertEqual(normalize_speciality('  Heart Specialist '), 'Cardiology')
+        self.assertEqual(normalize_speciality(''), 'General Medicine')
+        self.assertEqual(normalize_speciality('unknown words'), 'General Medicine')
+
+    def test_longest_alias_wins(self):
+        self.assertEqual(normalize_speciality('high fever and chest pain'), 'Cardiology')
+        self.assertEqual(normalize_speciality('child fever'), 'Pediatrics')
+
+    def test_alias_must_start_a_word(self):
+        self.assertEqual(normalize_speciality('emergency treatment'), 'Emergency Care')
+
+    def test_alias_must_end_a_word(self):
+        self.assertEqual(normalize_speciality('entire body ache'), 'General Medicine')
+        self.assertEqual(normalize_speciality('pain that started earlier'), 'General Medicine')
+        self.assertEqual(normalize_speciality('ear pain since earlier today'), 'ENT')
+
+    def test_multilingual_aliases(self):
+        self.assertEqual(normalize_speciality('हृदय रोग विशेषज्ञ'), 'Cardiology')
+        self.assertEqual(normalize_speciality('காய்ச்சல்'), 'General Medicine')
+
+
+class LocalTriageTests(TestCase):
+    def test_simple_symptoms_are_confident(self):
+        result = triage('fever and cough')
+        self.assertEqual(result['speciality'], 'General Medicine')
+        self.assertEqual(result['possible_diseases'][0]['name'], 'Viral Fever')
+        self.assertGreaterEqual(result['confidence'], 0.8)
+
+    def test_multilingual_input(self):
+        self.assertEqual(triage('मुझे बुखार और खांसी है')['possible_diseases'][0]['name'], 'Viral Fever')
+        self.assertEqual(triage('தலைவலி')['speciality'], 'Neurology')
+
+    def test_red_flags_are_urgent_but_not_confident(self):
+        result = triage('chest pain and sweating')
+        self.assertEqual(result['speciality'], 'Cardiology')
+        self.assertEqual(result['urgency'], 'high')
+        self.assertLess(result['confidence'], 0.8)
+
+    def test_unknown_words_lower_the_confidence(self):
+        self.assertGreaterEqual(triage('fever for 3 days')['confidence'], 0.8)
+        self.assertLess(triage('my daughter has fever')['confidence'], 0.8)
+
+    def test_risky_descriptions_are_not_answered_locally(self):
+        self.assertIsNone(answer_locally('I do not have fever, just cough'))
+        for text in ('fever and stiff neck', 'high fever in 2 month old baby', 'headache worst of my life'):
+            with self.subTest(text=text):
+                self.assertEqual(triage(text)['urgency'], 'high')
+                self.assertIsNone(answer_locally(text))
+
+    def test_matched_rule_keeps_its_speciality(self):
+        # get_default_response() relies on this when Gemini is unavailable
+        result = triage('cold sweat and chest pain')
+        self.assertEqual(result['possible_diseases'][0]['name'], 'Angina')
+        self.assertEqual(result['speciality'], 'Cardiology')
+        self.assertEqual(result['urgency'], 'high')
+
+    @mock.patch('core.views.gemini_analyze')
+    def test_confident_match_skips_gemini(self, gemini):
+        response = self.client.post(reverse('analyze'), json.dumps({'symptoms_text': 'fever'}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['analysis']['source'], 'local')
+        gemini.assert_not_called()
+
+    @mock.patch('core.views.gemini_analyze', return_value={'speciality': 'Cardiology'})
+    def test_unclear_text_goes_to_gemini(self, gemini):
+        response = self.client.post(reverse('analyze'),
+                                    json.dumps({'symptoms_text': 'chest pain and sweating'}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['analysis'], {'speciality': 'Cardiology'})
+        gemini.assert_called_once()
+
+
+SAMPLE_LAB_RESULT = {
+    'report_type': 'Complete Blood Count',
+    'parameters': [{'name': 'Hemoglobin', 'value': '10 g/dL', 'normal_range': '12-16 g/dL',
+                    'status': 'low', 'simple_explanation': 'Slightly low.'}],
+    'overall_summary': 'Mild anemia.',
+    'possible_conditions': [],
+    'recommendation': 'See a doctor.',
+    'disclaimer': 'AI-generated.',
+}
+
+
+class LabReportAnalysisTests(TransactionTestCase):
+    def upload(self, path, **params):
+        report = SimpleUploadedFile('cbc.png', b'png-bytes', content_type='image/png')
+        return self.client.post(path + ('?' + '&'.join(f'{k}={v}' for k, v in params.items()) if params else ''),
+                                {'report': report})
+
+    def test_non_english_uses_one_call(self):
+        localized = dict(SAMPLE_LAB_RESULT, overall_summary='हल्का एनीमिया।')
+        with mock.patch('core.views.gemini_analyze_lab_localized', return_value=(localized, True)) as single, \
+             mock.patch('core.views.translate_lab_result') as translate:
+            response = self.upload('/hi/api/analyze-lab-report')
+        self.assertEqual(response.json()['analysis']['overall_summary'], 'हल्का एनीमिया।')
+        single.assert_called_once()
+        translate.assert_not_called()
+        self.assertEqual(LabReportHistory.objects.count(), 1)
+
+    def test_falls_back_to_translation_and_streams_partial(self):
+        translated = dict(SAMPLE_LAB_RESULT, overall_summary='हल्का एनीमिया।')
+        with mock.patch('core.views.gemini_analyze_lab_localized', return_value=(dict(SAMPLE_LAB_RESULT), False)), \
+             mock.patch('core.views.translate_lab_result', return_value=translated) as translate:
+            response = self.upload('/hi/api/analyze-lab-report', stream=1)
+            events = [json.loads(line) for line in b''.join(response).splitlines()]
+        translate.assert_called_once()
+        self.assertEqual([e['event'] for e in events], ['status', 'partial', 'status', 'result'])
+        self.assertEqual(events[1]['analysis']['overall_summary'], 'Mild anemia.')
+        self.assertEqual(events[-1]['analysis']['overall_summary'], 'हल्का एनीमिया।')
+
+    def test_partial_result_arrives_before_the_translation(self):
+        def slow_translation(result, lang_name):
+            time.sleep(0.4)
+            return dict(result, overall_summary='हल्का एनीमिया।')
+
+        with mock.patch('core.views.gemini_analyze_lab_localized', return_value=(dict(SAMPLE_LAB_RESULT), False)), \
+             mock.patch('core.views.translate_lab_result', side_effect=slow_translation):
+            lines = iter(self.upload('/hi/api/analyze-lab-report', stream=1))
+            received = [(json.loads(next(lines))['event'], time.monotonic())]
+            received += [(json.loads(line)['event'], time.monotonic()) for line in lines]
+        self.assertEqual([event for event, _ in received], ['status', 'partial', 'status', 'result'])
+        self.assertGreater(received[-1][1] - received[1][1], 0.3)
+
+    def test_reupload_is_served_from_history(self):
+        with mock.patch('core.views.gemini_analyze_lab', return_value=dict(SAMPLE_LAB_RESULT)) as analyze:
+            first = self.upload('/api/analyze-lab-report')
+            second = self.upload('/api/analyze-lab-report')
+        analyze.assert_called_once()
+        self.assertEqual(first.json()['analysis'], second.json()['analysis'])
+        self.assertEqual(LabReportHistory.objects.count(), 1)
+
+    def test_failed_translation_of_stored_analysis_adds_no_entry(self):
+        with mock.patch('core.views.gemini_analyze_lab', return_value=dict(SAMPLE_LAB_RESULT)):
+            self.upload('/api/analyze-lab-report')
+        # translate_lab_result hands back its input when the translation fails
+        with mock.patch('core.views.translate_lab_result', side_effect=lambda result, lang: result):
+            for _ in range(2):
+                response = self.upload('/hi/api/analyze-lab-report')
+        self.assertEqual(response.json()['analysis']['overall_summary'], 'Mild anemia.')
+        self.assertEqual(LabReportHistory.objects.count(), 1)
+
+    def test_english_analysis_reused_for_other_languages(self):
+        translated = dict(SAMPLE_LAB_RESULT, overall_summary='हल्का एनीमिया।')
+        with mock.patch('core.views.gemini_analyze_lab', return_value=dict(SAMPLE_LAB_RESULT)), \
+             mock.patch('core.views.gemini_analyze_lab_localized') as single, \
+             mock.patch('core.views.translate_lab_result', return_value=translated) as translate:
+            self.upload('/api/analyze-lab-report')
+            response = self.upload('/hi/api/analyze-lab-report')
+        single.assert_not_called()
+        translate.assert_called_once()
+        self.assertEqual(response.json()['analysis']['overall_summary'], 'हल्का एनीमिया।')
+        self.assertEqual(LabReportHistory.objects.get(language='Hindi').content_hash,
+                         LabReportHistory.objects.get(language='English').content_hash)
+
+
+class LabUploadTests(TestCase):
+    def prepare(self, name, data, mime_type):
+        upload = lab_upload.LabUpload(SimpleUploadedFile(name, data, content_type=mime_type), mime_type)
+        return upload, upload.prepare()
+
+    def test_oversized_upload_is_refused_before_analysis(self):
+        report = SimpleUploadedFile('cbc.png', b'png-bytes-but-too-many', content_type='image/png')
+        with self.settings(LAB_UPLOAD_MAX_BYTES=8), mock.patch('core.views.gemini_analyze_lab') as analyze:
+            response = self.client.post('/api/analyze-lab-report', {'report': report})
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('too large', response.json()['error'])
+        analyze.assert_not_called()
+        self.assertFalse(LabReportHistory.objects.exists())
+
+    def test_unreadable_file_is_sent_as_uploaded(self):
+        upload, (data, mime_type) = self.prepare('cbc.png', b'png-bytes', 'image/png')
+        self.assertEqual((data, mime_type), (b'png-bytes', 'image/png'))
+        self.assertEqual(len(upload.content_hash), 64)
+
+    @skipUnless(lab_upload.Image, 'Pillow is not installed')
+    def test_photo_is_downscaled_to_grayscale_jpeg(self):
+        from PIL import Image
+
+        photo = io.BytesIO()
+        Image.effect_noise((2000, 1200), 40).convert('RGB').save(photo, 'PNG')
+        upload, (data, mime_type) = self.prepare('photo.png', photo.getvalue(), 'image/png')
+        sent = Image.open(io.BytesIO(data))
+        self.assertEqual((mime_type, sent.format, sent.mode), ('image/jpeg', 'JPEG', 'L'))
+        self.assertEqual(max(sent.size), 1536)
+        self.assertLess(len(data), upload.size)
+
+    @skipUnless(lab_upload.Image and lab_upload.PdfReader, 'Pillow and pypdf are not installed')
+    def test_blank_and_duplicate_pdf_pages_are_dropped(self):
+        from PIL import Image
+        from pypdf import PdfReader
+
+        pages = [Image.effect_noise((400, 560), 60).convert('RGB') for _ in range(2)]
+        blank = Image.new('RGB', (400, 560), 'white')
+        pdf = io.BytesIO()
+        pages[0].save(pdf, 'PDF', save_all=True, append_images=[blank, pages[1], pages[1]])
+        _, (data, mime_type) = self.prepare('scan.pdf', pdf.getvalue(), 'application/pdf')
+        self.assertEqual(mime_type, 'application/pdf')
+        self.assertEqual(len(PdfReader(io.BytesIO(data)).pages), 2)
+
+    @skipUnless(lab_upload.PdfReader, 'pypdf is not installed')
+    def test_vector_only_page_is_not_blank(self):
+        from pypdf import PdfReader, PdfWriter
+        from pypdf.generic import DecodedStreamObject, NameObject
+
+        writer = PdfWriter()
+        chart = writer.add_blank_page(200, 200)
+        writer.add_blank_page(200, 200)
+        drawing = DecodedStreamObject()
+        drawing.set_data(b'0 0 m 100 150 l 200 50 l S')
+        chart[NameObject('/Contents')] = writer._add_object(drawing)
+        pdf = io.BytesIO()
+        writer.write(pdf)
+        _, (data, _) = self.prepare('trend.pdf', pdf.getvalue(), 'application/pdf')
+        pages = PdfReader(io.BytesIO(data)).pages
+        self.assertEqual(len(pages), 1)
+        self.assertIsNotNone(pages[0].get_contents())
+
+
+class LabValueExtractionTests(SimpleTestCase):
+    REPORT_TEXT = """
+        COMPLETE BLOOD COUNT
+        1. Haemoglobin (Hb)        10.9    g/dL       12.0 - 15.0
+        2. Total WBC Count         7400    /cumm      4000 - 11000
+        3. Platelet Count          2.1     lakh/cumm  1.5 - 4.5
+        Collected on: 12-05-2024 10:30
+        LIPID PROFILE
+        Total Cholesterol          212     mg/dL      < 200
+        Total Cholesterol / HDL Ratio  4.1
+        SGPT (ALT)                 52      U/L
+        Serum Creatinine           90      umol/L
+    """
+
+    def stub(self):
+        from core.utils import gemini_client
+
+        gemini_client.reset_client()
+        self.addCleanup(gemini_client.reset_client)
+        return self.settings(GEMINI_STUB={'LATENCY': 0, 'JITTER': 0})
+
+    def test_rows_are_parsed_and_classified(self):
+        from core.utils.lab_values import parse_lab_text, parse_row
+
+        result = parse_lab_text(self.REPORT_TEXT)
+        rows = {p['name']: p for p in result['parameters']}
+        self.assertEqual(result['report_type'], 'Complete Blood Count, Lipid Profile, Liver Function Test, '
+                                                'Kidney Function Test')
+        self.assertEqual(rows['Hemoglobin']['status'], 'low')
+        self.assertEqual(rows['Hemoglobin']['normal_range'], '12.0-15.0 g/dL')
+        self.assertEqual(result['unread'], [])
+        # Ranges per sex: which one applies is unknown, so the row is not read
+        self.assertIsNone(parse_row('Hemoglobin 12.5 g/dL Male: 13.0-17.0 Female: 12.0-15.5'))
+        self.assertIsNone(parse_row('RBC Count 4.1 mill/cumm M: 4.5 - 5.5'))
+        # The lab's own flag must agree with the computed status
+        self.assertEqual(parse_row('Hemoglobin 10.9 L g/dL 12-15')['status'], 'low')
+        self.assertIsNone(parse_row('Hemoglobin 10.9 H g/dL 12-15'))
+        self.assertIsNone(parse_row('WBC 7400 /cumm 4000-11000 *'))
+        self.assertEqual(rows['Total Cholesterol']['status'], 'high')
+        self.assertEqual(rows['Total Cholesterol']['value'], '212 mg/dL')
+        # No printed range: the built-in table, shown in the report's unit
+        self.assertEqual(rows['SGPT (ALT)']['status'], 'high')
+        self.assertEqual(rows['Creatinine']['status'], 'normal')
+        self.assertIn('umol/L', rows['Creatinine']['normal_range'])
+        self.assertEqual(rows['Cholesterol/HDL Ratio']['value'], '4.1')
+        self.assertNotIn('panel', rows['Hemoglobin'])
+
+    def test_text_pdf_is_explained_without_vision(self):
+        from core.utils import gemini
+
+        with self.stub(), mock.patch('core.utils.lab_values.extract_pdf_text', return_value=self.REPORT_TEXT):
+            before = metrics.LAB_LOCAL_READS.value(outcome='used')
+            result = gemini.analyze_lab_report(b'%PDF-text', 'application/pdf')
+        self.assertEqual(metrics.LAB_LOCAL_READS.value(outcome='used'), before + 1)
+        self.assertEqual(result['parameters'][0]['simple_explanation'], 'Explanation of Hemoglobin.')
+        self.assertEqual(result['parameters'][0]['status'], 'low')
+        self.assertEqual(result['possible_conditions'][0]['likelihood'], 'possible')
+
+    def test_failed_explanation_keeps_local_values(self):
+        from core.utils import gemini
+        from core.utils.gemini_schemas import LAB_DISCLAIMER
+
+        client = mock.Mock(**{'generate_content.side_effect': RuntimeError('upstream down')})
+        with mock.patch('core.utils.lab_values.extract_pdf_text', return_value=self.REPORT_TEXT), \
+                mock.patch('core.utils.gemini.get_client', return_value=client):
+            result, explained = gemini.analyze_lab_report_localized(b'%PDF-text', 'application/pdf', 'r.pdf', 'Hindi')
+        self.assertFalse(explained)
+        self.assertEqual(result['possible_conditions'], [])
+        self.assertIn('Hemoglobin (low)', result['overall_summary'])
+        self.assertEqual(result['disclaimer'], LAB_DISCLAIMER)
+
+    def test_unrecognised_results_send_the_report_to_vision(self):
+        from core.utils import gemini
+
+        text = self.REPORT_TEXT + '''
+        Fasting Blood Sugar        250     mg/dL      70-100
+        HbA1c                      9.2     %          4.0-5.6
+        Vitamin D                  8       ng/mL      30-100
+        4. Hematocrit (PCV)        38.2    %          Male: 40 - 50  Female: 36 - 46
+        '''
+        with self.stub(), mock.patch('core.utils.lab_values.extract_pdf_text', return_value=text):
+            before = metrics.LAB_LOCAL_READS.value(outcome='unrecognised')
+            result = gemini.analyze_lab_report(b'%PDF-text', 'application/pdf')
+        self.assertEqual(metrics.LAB_LOCAL_READS.value(outcome='unrecognised'), before + 1)
+        # The stub's vision reply, not the locally read rows
+        self.assertEqual(result['parameters'][0]['simple_explanation'], 'Slightly low oxygen-carrying protein.')
+
+    def test_scans_and_sparse_reports_go_to_vision(self):
+        from core.utils import lab_values
+
+        with mock.patch('core.utils.lab_values.extract_pdf_text', return_value=''):
+            self.assertIsNone(lab_values.read_lab_values(b'%PDF-scan', 'application/pdf'))
+        with mock.patch('core.utils.lab_values.extract_pdf_text', return_value='Hemoglobin 13.1 g/dL 12-16'):
+            self.assertIsNone(lab_values.read_lab_values(b'%PDF-short', 'application/pdf'))
+        self.assertIsNone(lab_values.read_lab_values(b'png-bytes', 'image/png'))
+
+
+class LabReportHistoryTests(TestCase):
+    def add_entries(self, count, days_ago=0):
+        analysis = dict(SAMPLE_LAB_RESULT, possible_conditions=[{'name': 'Anemia'}, {'name': 'B12 deficiency'}])
+        entries = [LabReportHistory.objects.create(filename=f'report-{i}.pdf', analysis=analysis)
+                   for i in range(count)]
+        if days_ago:
+            LabReportHistory.objects.filter(id__in=[e.id for e in entries]).update(
+                created_at=timezone.now() - timedelta(days=days_ago))
+        return entries
+
+    def test_summary_columns_copied_on_save(self):
+        entry = self.add_entries(1)[0]
+        self.assertEqual(entry.report_type, 'Complete Blood Count')
+        self.assertEqual(entry.condition_names, ['Anemia', 'B12 deficiency'])
+
+    @override_settings(LAB_HISTORY_PAGE_SIZE=3)
+    def test_page_reads_summaries_and_paginates(self):
+        self.add_entries(1, days_ago=120)       # outside the sidebar window
+        entries = self.add_entries(5)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('lab_report'))
+        self.assertNotIn('"analysis"', ' '.join(q['sql'] for q in ctx.captured_queries))
+        self.assertEqual([h['id'] for h in response.context['history']], [e.id for e in entries[:1:-1]])
+        self.assertContains(response, 'Anemia, B12 deficiency')
+
+        data = self.client.get(reverse('lab_history'), {'before': response.context['history_next']}).json()
+        self.assertEqual([e['id'] for e in data['entries']], [entries[1].id, entries[0].id])
+        self.assertIsNone(data['next'])
+        self.assertNotIn('analysis', data['entries'][0])
+
+    def test_entry_endpoint_returns_full_analysis(self):
+        entry = self.add_entries(1)[0]
+        data = self.client.get(reverse('lab_history_entry', args=[entry.id])).json()
+        self.assertEqual(data['analysis']['overall_summary'], 'Mild anemia.')
+        self.assertEqual(self.client.get(reverse('lab_history_entry', args=[entry.id + 1])).status_code, 404)
+
+    def test_purge_deletes_only_expired_entries_in_batches(self):
+        self.add_entries(5, days_ago=400)
+        kept = self.add_entries(2, days_ago=100)
+        out = io.StringIO()
+        call_command('purge_lab_history', days=365, batch_size=2, stdout=out)
+        self.assertIn('Deleted 5', out.getvalue())
+        self.assertEqual(sorted(LabReportHistory.objects.values_list('id', flat=True)), [e.id for e in kept])
+
+
+class TriageEndpointTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.cardiac = make_hospital('Heart Institute', specialities=['General Medicine', 'Cardiology'])
+        self.ortho = make_hospital('Bone Clinic', specialities=['Orthopedics'])
+
+    def post(self, body, **params):
+        path = reverse('triage') + ('?' + '&'.join(f'{k}={v}' for k, v in params.items()) if params else '')
+        return self.client.post(path, json.dumps(body), content_type='application/json')
+
+    def gemini_reply(self, speciality):
+        def analyze(*args, **kwargs):
+            return {'possible_diseases': [{'name': 'Angina', 'probability': 0.6}], 'speciality': speciality,
+                    'urgency': 'high', 'confidence': 0.8}
+        return analyze
+
+    def test_local_answer_skips_gemini(self):
+        with mock.patch('core.views.gemini_analyze') as analyze:
+            data = self.post({'symptoms_text': 'fever', 'location': 'Ahmedabad'}).json()
+        analyze.assert_not_called()
+        self.assertEqual(data['analysis']['speciality'], 'General Medicine')
+        self.assertEqual([h['name'] for h in data['hospitals']], ['Heart Institute'])
+
+    def test_speculative_search_reused_when_speciality_matches(self):
+        before = metrics.TRIAGE_SPECULATION.value(outcome='hit')
+        with mock.patch('core.views.gemini_analyze', side_effect=self.gemini_reply('Cardiology')), \
+             mock.patch('core.views.find_hospitals', wraps=views.find_hospitals) as find:
+            data = self.post({'symptoms_text': 'chest pain and sweating since morning', 'location': 'Ahmedabad'}).json()
+        find.assert_called_once()
+        self.assertEqual([h['name'] for h in data['hospitals']], ['Heart Institute'])
+        self.assertEqual(metrics.TRIAGE_SPECULATION.value(outcome='hit'), before + 1)
+
+    def test_requery_when_gemini_disagrees(self):
+        before = metrics.TRIAGE_SPECULATION.value(outcome='miss')
+        with mock.patch('core.views.gemini_analyze', side_effect=self.gemini_reply('Orthopedics')):
+            data = self.post({'symptoms_text': 'chest pain and sweating since morning', 'location': 'Ahmedabad'}).json()
+        self.assertEqual(metrics.TRIAGE_SPECULATION.value(outcome='miss'), before + 1)
+        self.assertEqual([h['name'] for h in data['hospitals']], ['Bone Clinic'])
+
+    def test_invalid_budget_is_rejected_before_triage(self):
+        with mock.patch('core.views.triage_events') as events:
+            response = self.post({'symptoms_text': 'chest pain', 'location': 'Ahmedabad', 'budget': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        events.assert_not_called()
+
+    def test_disconnect_closes_pending_work(self):
+        closed = []
+
+        async def slow_gemini(*args):
+            try:
+                yield {'event': 'field', 'name': 'urgency', 'value': 'high'}
+                await asyncio.sleep(30)
+            finally:
+                closed.append('gemini')
+
+        async def client_leaves():
+            events = views.triage_events('chest pain and sweating since morning', 'Ahmedabad', 'English')
+            async for event in events:
+                if event['event'] == 'field':
+                    break
+            await events.aclose()
+            # Before asyncio.run() would finalize leftover generators itself
+            self.assertEqual(closed, ['gemini'])
+
+        with mock.patch('core.views.triage_analysis_events', slow_gemini), \
+             mock.patch('core.views.answer_locally', return_value=None):
+            asyncio.run(client_leaves())
+
+    def read_events(self, response):
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response).decode()
+        return [(block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+                for block in body.strip().split('\n\n')]
+
+    def test_stream_sends_fields_while_gemini_writes(self):
+        from core.utils import gemini_client
+        from core.utils.response_cache import get_cache
+
+        get_cache().clear()
+        first_chunks = metrics.GEMINI_FIRST_CHUNK.count(operation='triage')
+        with self.settings(GEMINI_STUB={'LATENCY': 0.4, 'JITTER': 0, 'FAILURE_RATE': 0}):
+            gemini_client.reset_client()
+            try:
+                events = self.read_events(self.post(
+                    {'symptoms_text': 'chest pain and sweating since morning', 'location': 'Ahmedabad'}, stream=1))
+            finally:
+                gemini_client.reset_client()
+
+        names = [name for name, _ in events]
+        self.assertEqual(names, ['hospitals', 'field', 'field', 'disease', 'disease', 'field', 'analysis', 'hospitals'])
+        self.assertFalse(events[0][1]['final'])
+        self.assertEqual(events[1][1], {'name': 'urgency', 'value': 'medium'})
+        self.assertEqual(events[3][1]['value']['name'], 'Viral Infection')
+        # The stub answers General Medicine, not the locally guessed Cardiology: searched again
+        self.assertEqual(events[-1][1]['speciality'], 'General Medicine')
+        self.assertTrue(events[-1][1]['final'])
+        self.assertEqual(metrics.GEMINI_FIRST_CHUNK.count(operation='triage'), first_chunks + 1)
+
+    def test_stream_reaches_the_client_before_it_ends(self):
+        from core.utils import gemini_client
+        from core.utils.response_cache import get_cache
+
+        # Django collects an async iterator into a list under WSGI (the test client too)
+        get_cache().clear()
+        with self.settings(GEMINI_STUB={'LATENCY': 0.6, 'JITTER': 0, 'FAILURE_RATE': 0}):
+            gemini_client.reset_client()
+            try:
+                response = self.client.post(reverse('analyze') + '?stream=1', json.dumps(
+                    {'symptoms_text': 'chest pain and sweating since morning', 'location': 'Ahmedabad'}),
+                    content_type='application/json')
+                chunks = iter(response)
+                first = next(chunks)
+                first_at = time.monotonic()
+                rest = list(chunks)
+                finished_at = time.monotonic()
+            finally:
+                gemini_client.reset_client()
+        self.assertTrue(first.startswith(b'event: field'))
+        self.assertTrue(rest[-1].startswith(b'event: analysis'))
+        self.assertGreater(finished_at - first_at, 0.2)
+
+    def test_speculative_hospitals_are_painted_before_gemini_answers(self):
+        from core.utils import gemini_client
+        from core.utils.response_cache import get_cache
+
+        get_cache().clear()
+        with self.settings(GEMINI_STUB={'LATENCY': 0.6, 'JITTER': 0, 'FAILURE_RATE': 0}):
+            gemini_client.reset_client()
+            try:
+                chunks = iter(self.post(
+                    {'symptoms_text': 'chest pain and sweating since morning', 'location': 'Ahmedabad'}, stream=1))
+                first = next(chunks)
+                first_at = time.monotonic()
+                list(chunks)
+                finished_at = time.monotonic()
+            finally:
+                gemini_client.reset_client()
+        self.assertTrue(first.startswith(b'event: hospitals'))
+        self.assertIn(b'"final": false', first)
+        self.assertGreater(finished_at - first_at, 0.3)
+
+    def test_analyze_stream_falls_back_without_gemini(self):
+        with mock.patch('core.utils.gemini.get_client', return_value=None):
+            response = self.client.post(reverse('analyze') + '?stream=1', json.dumps(
+                {'symptoms_text': 'burning urination and lower back pain', 'location': 'Ahmedabad'}),
+                content_type='application/json')
+            events = self.read_events(response)
+        self.assertEqual([name for name, _ in events], ['analysis'])
+        self.assertEqual(events[0][1]['analysis']['speciality'], 'Urology')
+
+
+class JsonObjectStreamTests(SimpleTestCase):
+    def test_members_and_array_items_reported_as_they_complete(self):
+        from core.utils.json_stream import JsonObjectStream
+
+        text = '```json\n{"urgency": "high", "possible_diseases": [{"name": "MI, \\"acute\\""}, {"name": "Angina"}], ' \
+               '"speciality": "Cardiology"}\n```'
+        parser = JsonObjectStream()
+        events = []
+        for i in range(0, len(text), 5):
+            events.extend(parser.feed(text[i:i + 5]))
+        self.assertEqual(events[0], ('field', 'urgency', 'high'))
+        self.assertEqual([v['name'] for kind, _, v in events if kind == 'item'], ['MI, "acute"', 'Angina'])
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.fields, json.loads(text.strip('`json\n')))
+
+    def test_malformed_member_raises(self):
+        from core.utils.json_stream import JsonObjectStream
+
+        with self.assertRaises(ValueError):
+            JsonObjectStream().feed('{"urgency": hi, ')
+
+
+class StructuredOutputTests(SimpleTestCase):
+    def stub(self, **settings):
+        from core.utils import gemini_client
+
+        gemini_client.reset_client()
+        self.addCleanup(gemini_client.reset_client)
+        return self.settings(GEMINI_STUB={'LATENCY': 0, 'JITTER': 0}, **settings)
+
+    def test_validate_triage_normalizes_and_rejects(self):
+        from core.utils.gemini_schemas import ReplyError, validate_triage
+
+        result = validate_triage({'urgency': 'High', 'speciality': 'Cardiology', 'confidence': '1.4',
+                                  'possible_diseases': [{'name': 'Angina', 'probability': 0.7}] * 4})
+        self.assertEqual(result['urgency'], 'high')
+        self.assertEqual(result['confidence'], 1.0)
+        self.assertEqual(len(result['possible_diseases']), 3)
+        with self.assertRaises(ReplyError) as raised:
+            validate_triage({'urgency': 'urgent', 'speciality': 'Cardiology', 'possible_diseases': []})
+        self.assertEqual(raised.exception.reason, 'schema')
+
+    def test_schema_reply_is_compact_and_free_text_still_parses(self):
+        from core.utils import gemini
+
+        with self.stub():
+            schema_before = metrics.GEMINI_OUTPUT_TOKENS.count(operation='triage', format='schema')
+            self.assertEqual(gemini.analyze_symptoms('schema check: numb left hand', None)['urgency'], 'medium')
+            self.assertEqual(metrics.GEMINI_OUTPUT_TOKENS.count(operation='triage', format='schema'),
+                             schema_before + 1)
+            with self.settings(GEMINI_RESPONSE_SCHEMAS=False):
+                # The stub answers free text inside a ```json fence
+                result = gemini.analyze_symptoms('free text check: numb left hand', None)
+        self.assertEqual(result['speciality'], 'General Medicine')
+
+    def test_truncated_reply_falls_back(self):
+        from core.utils import gemini
+
+        before = metrics.GEMINI_PARSE_FAILURES.value(operation='triage', reason='truncated')
+        with self.stub(GEMINI_MAX_OUTPUT_TOKENS={'triage': 10}):
+            result = gemini.analyze_symptoms('budget check: burning urination and lower back pain', None)
+        self.assertEqual(result['speciality'], 'Urology')
+        self.assertEqual(metrics.GEMINI_PARSE_FAILURES.value(operation='triage', reason='truncated'), before + 1)
+
+    def test_localized_lab_report_merges_translation_list(self):
+        from core.utils import gemini
+        from core.utils.gemini_schemas import LAB_DISCLAIMER
+
+        with self.stub():
+            result, translated = gemini.analyze_lab_report_localized(b'png-bytes', 'image/png', 'cbc.png', 'Hindi')
+        self.assertTrue(translated)
+        self.assertEqual(result['disclaimer'], '[t] ' + LAB_DISCLAIMER)
+        self.assertEqual(result['possible_conditions'][0]['cause'], '[t] Diet or blood loss')
+        self.assertEqual(result['parameters'][0]['status'], 'low')
+
+    def test_short_translation_list_is_rejected(self):
+        from core.utils import gemini
+
+        reply = mock.Mock(text='["[t] Complete Blood Count"]', candidates=[])
+        client = mock.Mock(**{'generate_content.return_value': reply})
+        before = metrics.GEMINI_PARSE_FAILURES.value(operation='translate', reason='schema')
+        with mock.patch('core.utils.gemini.get_client', return_value=client):
+            self.assertIs(gemini.translate_lab_result(SAMPLE_LAB_RESULT, 'Tamil'), SAMPLE_LAB_RESULT)
+        self.assertEqual(metrics.GEMINI_PARSE_FAILURES.value(operation='translate', reason='schema'), before + 1)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def make_breaker(self, **config):
+        conf = {'WINDOW': 4, 'MIN_CALLS': 4, 'ERROR_RATE': 0.5, 'SLOW_CALL_SECONDS': 1.0,
+                'SLOW_CALL_RATE': 0.5, 'COOLDOWN': 60}
+        conf.update(config)
+        return CircuitBreaker('test', conf)
+
+    def test_trips_on_error_rate_and_rejects(self):
+        breaker = self.make_breaker()
+        for ok in (True, False, True, False):
+            breaker.before_call()
+            breaker.record(ok, 0.1)
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        self.assertEqual(breaker.snapshot()['rejections'], 1)
+
+    def test_trips_on_latency(self):
+        breaker = self.make_breaker()
+        for took in (0.1, 2.0, 0.1, 2.0):
+            breaker.record(True, took)
+        self.assertEqual(breaker.state, 'open')
+
+    def test_half_open_probe_closes_breaker(self):
+        breaker = self.make_breaker(COOLDOWN=0)
+        for _ in range(4):
+            breaker.record(False, 0.1)
+        breaker.before_call()  # the single half-open probe
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_slow_lab_calls_do_not_open_the_triage_breaker(self):
+        from core.utils import gemini_client
+
+        breaker = {'WINDOW': 2, 'MIN_CALLS': 2, 'SLOW_CALL_SECONDS': 0.05, 'SLOW_CALL_RATE': 0.5, 'COOLDOWN': 60}
+        gemini_client.reset_client()
+        self.addCleanup(gemini_client.reset_client)
+        with self.settings(GEMINI_STUB={'LATENCY': 0.08, 'JITTER': 0}, GEMINI_BREAKER=breaker,
+                           GEMINI_BREAKER_OPERATIONS={'lab_report_localized': {'SLOW_CALL_SECONDS': 1.0}}):
+            client = gemini_client.get_client()
+            for operation in ('lab_report', 'lab_report', 'lab_report_localized', 'lab_report_localized'):
+                client.generate_content(['lab prompt', b'png'], operation=operation)
+            self.assertEqual(client.breaker('lab_report').state, 'open')
+            self.assertEqual(client.breaker('lab_report_localized').state, 'closed')
+            with self.assertRaises(CircuitOpenError):
+                client.generate_content(['lab prompt', b'png'], operation='lab_report')
+            self.assertTrue(client.generate_content('fever and cough', operation='triage').text)
+            self.assertEqual(client.breaker('triage').state, 'closed')
+
+    def test_lab_breaker_trips_on_slow_calls_within_its_deadline(self):
+        from core.utils import gemini_client
+
+        breaker = {'WINDOW': 2, 'MIN_CALLS': 2, 'SLOW_CALL_RATE': 0.5, 'COOLDOWN': 60}
+        gemini_client.reset_client()
+        self.addCleanup(gemini_client.reset_client)
+        # Under the shared 0.05 s deadline every call would fail before it could count as slow
+        with self.settings(GEMINI_STUB={'LATENCY': 0.1, 'JITTER': 0}, GEMINI_BREAKER=breaker, GEMINI_RETRIES=0,
+                           GEMINI_BREAKER_OPERATIONS={'lab_report': {'SLOW_CALL_SECONDS': 0.08}},
+                           GEMINI_TIMEOUT=0.05, GEMINI_TIMEOUTS={'lab_report': 1.0}):
+            client = gemini_client.get_client()
+            for _ in range(2):
+                self.assertTrue(client.generate_content(['lab prompt', b'png'], operation='lab_report').text)
+            self.assertEqual(client.breaker('lab_report').state, 'open')
+            self.assertEqual(client.breaker('lab_report').snapshot()['window_error_rate'], 0.0)
+
+    def test_retries_transient_errors_within_deadline(self):
+        attempts = []
+
+        def flaky(timeout):
+            attempts.append(timeout)
+            if len(attempts) < 3:
+                raise TimeoutError
+            return 'ok'
+
+        self.assertEqual(call_with_retries(flaky, time.monotonic() + 5, retries=2, base_delay=0.001,
+                                           retry_on=(TimeoutError,)), 'ok')
+        self.assertEqual(len(attempts), 3)
+        self.assertTrue(all(0 < t <= 5 for t in attempts))
+
+    def test_gives_up_after_retries(self):
+        def failing(timeout):
+            raise TimeoutError
+
+        with self.assertRaises(TimeoutError):
+            call_with_retries(failing, time.monotonic() + 5, retries=1, base_delay=0.001,
+                              retry_on=(TimeoutError,))
+
+
+class SingleFlightTests(SimpleTestCase):
+    def slow_call(self, calls, result):
+        def call():
+            calls.append(1)
+            time.sleep(0.2)
+            return result
+        return call
+
+    def test_threads_share_one_call(self):
+        flight, calls, results = SingleFlight('test'), [], []
+        call = self.slow_call(calls, {'speciality': 'General Medicine'})
+        threads = [threading.Thread(target=lambda: results.append(flight.do('k', call))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'speciality': 'General Medicine'}] * 5)
+        self.assertEqual(flight.stats()['coalesced'], 4)
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+    def test_async_callers_share_one_call(self):
+        flight, calls = SingleFlight('test'), []
+        call = self.slow_call(calls, 'ok')
+
+        async def burst():
+            return await asyncio.gather(*(flight.do_async('k', call) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(burst()), ['ok'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_errors_reach_every_caller(self):
+        flight = SingleFlight('test')
+
+        def fail():
+            raise ValueError('upstream down')
+
+        with self.assertRaises(ValueError):
+            flight.do('k', fail)
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+    def test_triage_is_coalesced_once(self):
+        from core.utils import gemini
+
+        before = {group.name: group.stats()['upstream_calls'] for group in (gemini.inflight, views.analyze_flights)}
+        with mock.patch('core.views.answer_locally', return_value=None), \
+             mock.patch('core.utils.gemini._generate_triage', return_value={'speciality': 'Cardiology'}):
+            response = self.client.post(reverse('analyze'), json.dumps({'symptoms_text': 'coalesced once check'}),
+                                        content_type='application/json')
+        self.assertEqual(response.json()['analysis'], {'speciality': 'Cardiology'})
+        self.assertEqual(views.analyze_flights.stats()['upstream_calls'], before['analyze'] + 1)
+        self.assertEqual(gemini.inflight.stats()['upstream_calls'], before['gemini'])
+
+
+class MetricsTests(TestCase):
+    def test_requests_are_recorded_per_url_name(self):
+        make_hospital('City Care')
+        before = metrics.REQUEST_DB_QUERIES.count(view='all_hospitals')
+        self.client.get(reverse('all_hospitals'))
+        self.assertEqual(metrics.REQUEST_DB_QUERIES.count(view='all_hospitals'), before + 1)
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('# TYPE carenav_http_request_duration_seconds histogram', body)
+        self.assertIn('carenav_http_requests_total{view="all_hospitals",method="GET",status="200"}', body)
+        self.assertIn('carenav_http_request_db_queries_bucket{view="all_hospitals",le="+Inf"}', body)
+
+    @mock.patch('core.utils.gemini.get_client')
+    def test_gemini_parse_failures_fall_back(self, get_client):
+        from core.utils.gemini import analyze_symptoms
+        get_client.return_value.generate_content.return_value = mock.Mock(text='not json')
+        before = metrics.GEMINI_FALLBACKS.value(operation='triage', reason='parse_error')
+        result = analyze_symptoms('a very unusual complaint for metrics', None)
+        self.assertIn('possible_diseases', result)
+        self.assertEqual(metrics.GEMINI_FALLBACKS.value(operation='triage', reason='parse_error'), before + 1)
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        make_hospital('City Care')
+
+    def test_staff_flag_stores_profile_and_sql(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(reverse('all_hospitals'), {'_profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.view_name, 'all_hospitals')
+        self.assertGreaterEqual(profile.sql_count, 1)
+        self.assertIn('SELECT', profile.sql_log[0]['sql'])
+        self.assertIn('cumulative', profile.profile)
+
+    def test_flag_ignored_for_anonymous_users(self):
+        self.client.get(reverse('all_hospitals'), {'_profile': '1'}, HTTP_X_PROFILE='1')
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_only_newest_profiles_are_kept(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        with self.settings(PROFILER_KEEP=2):
+            for _ in range(3):
+                self.client.get(reverse('hospitals'), {'speciality': 'Cardiology', 'city': 'Ahmedabad'},
+                                HTTP_X_PROFILE='1')
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+
+class GeminiHealthTests(TestCase):
+    def test_staff_only_unless_public(self):
+        from core.utils import gemini_client
+
+        gemini_client.reset_client()
+        self.addCleanup(gemini_client.reset_client)
+        with self.settings(GEMINI_STUB={'LATENCY': 0, 'JITTER': 0}):
+            self.assertEqual(self.client.get(reverse('gemini_health')).status_code, 404)
+            with self.settings(GEMINI_HEALTH_PUBLIC=True):
+                self.assertEqual(self.client.get(reverse('gemini_health')).status_code, 200)
+            self.client.force_login(User.objects.create_user('admin', is_staff=True))
+            self.assertTrue(self.client.get(reverse('gemini_health')).json()['ok'])
+
+    @mock.patch('core.utils.gemini_client.genai.get_model', side_effect=RuntimeError('403 key AIza... revoked'))
+    def test_probe_is_cached_and_error_is_generic(self, get_model):
+        from core.utils.gemini_client import GeminiClient
+
+        client = GeminiClient('test-key')
+        first, second = client.health(), client.health()
+        get_model.assert_called_once()
+        self.assertFalse(second['ok'])
+        self.assertEqual(first['error'], 'model metadata request failed')
+        client._probe['expires'] = 0  # as if GEMINI_HEALTH_TTL had passed
+        client.health()
+        self.assertEqual(get_model.call_count, 2)
+
+
+class BenchmarkSupportTests(TestCase):
+    def test_synthetic_catalogue_is_indexed(self):
+        from core.models import HospitalSpeciality
+        from core.utils.synthetic import load_catalogue
+
+        self.assertEqual(load_catalogue(30, 90, batch_size=8), (30, 90))
+        self.assertEqual(Doctor.objects.count(), 90)
+        hospital = Hospital.objects.order_by('id').first()
+        self.assertEqual(set(HospitalSpeciality.objects.filter(hospital=hospital).values_list('name', flat=True)),
+                         set(hospital.specialities))
+
+    def test_stub_client_serves_gemini_calls(self):
+        from core.utils import gemini, gemini_client
+
+        with self.settings(GEMINI_STUB={'LATENCY': 0, 'JITTER': 0}):
+            gemini_client.reset_client()
+            try:
+                result = gemini.analyze_symptoms('stub check: tingling in both feet', None)
+                self.assertEqual(result['speciality'], 'General Medicine')
+                self.assertEqual(gemini.translate_lab_result(SAMPLE_LAB_RESULT, 'Hindi')['report_type'],
+                                 '[t] Complete Blood Count')
+            finally:
+                gemini_client.reset_client()
+
+
+class DataCommandTests(TestCase):
+    def call(self, *args, **kwargs):
+        call_command(*args, stdout=io.StringIO(), **kwargs)
+
+    def test_seed_with_scale_builds_speciality_index(self):
+        from core.models import HospitalSpeciality
+
+        self.call('seed_hospitals', scale=25)
+        self.assertEqual(Hospital.objects.count(), 36)
+        expected = sum(len(set(h.specialities)) for h in Hospital.objects.all())
+        self.assertEqual(HospitalSpeciality.objects.count(), expected)
+        response = self.client.get(reverse('hospitals'), {'speciality': 'Cardiology', 'city': 'Ahmedabad'})
+        self.assertTrue(response.json()['hospitals'])
+
+    def test_populate_and_ambulance_contacts(self):
+        hospital = make_hospital('City Care', contact='079-1234', ambulance_contact=None)
+        self.call('populate_facilities_doctors', batch_size=2)
+        hospital.refresh_from_db()
+        self.assertTrue(hospital.facilities['ambulance'])
+        self.assertGreater(hospital.total_beds, 0)
+        self.assertTrue(3 <= hospital.doctors.count() <= 5)
+
+        self.call('update_ambulance_contacts')
+        hospital.refresh_from_db()
+        self.assertEqual(hospital.ambulance_contact, '079-1234')
+
+
+class ImportHospitalsTests(TestCase):
+    CSV = (
+        'registry_id,hospital_name,district,latitude,longitude,departments,ownership,beds,schemes\n'
+        'GJ-1,Civil Hospital,ahmedabad,23.05,72.60,Cardiac; ENT,Govt,500,CGHS|ESIC\n'
+        'GJ-2,Bad Coordinates,Surat,123,72.8,General,private,50,\n'
+        'GJ-3,Sunrise Clinic,Surat,21.17,72.83,,trust,40,\n'
+    )
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def run_import(self, path, **options):
+        out = io.StringIO()
+        call_command('import_hospitals', path, stdout=out, **options)
+        return out.getvalue()
+
+    def test_csv_create_then_update(self):
+        from core.models import HospitalSpeciality
+
+        path = self.write('registry.csv', self.CSV)
+        rejects = self.write('rejects.jsonl', '')
+        output = self.run_import(path, rejects=rejects)
+        self.assertIn('2 created, 0 updated, 1 rejected', output)
+
+        civil = Hospital.objects.get(external_id='GJ-1')
+        self.assertEqual(civil.city, 'Ahmedabad')
+        self.assertEqual(civil.hospital_type, 'government')
+        self.assertEqual(civil.specialities, [normalize_speciality('Cardiac'), normalize_speciality('ENT')])
+        self.assertEqual(set(HospitalSpeciality.objects.filter(hospital=civil).values_list('name', flat=True)),
+                         set(civil.specialities))
+        self.assertEqual([s['schemeName'] for s in civil.acceptedSchemes], ['CGHS', 'ESIC'])
+        with open(rejects, encoding='utf-8') as f:
+            rejected = [json.loads(line) for line in f]
+        self.assertEqual(rejected[0]['row']['registry_id'], 'GJ-2')
+        self.assertIn('lat', rejected[0]['error'])
+
+        self.write('registry.csv', self.CSV.replace('Cardiac; ENT', 'Orthopedics'))
+        output = self.run_import(path)
+        self.assertIn('0 created, 2 updated', output)
+        self.assertEqual(Hospital.objects.count(), 2)
+        civil.refresh_from_db()
+        self.assertEqual(civil.specialities, [normalize_speciality('Orthopedics')])
+        self.assertEqual(list(HospitalSpeciality.objects.filter(hospital=civil).values_list('name', flat=True)),
+                         civil.specialities)
+
+    def test_jsonl_resumes_from_checkpoint(self):
+        rows = [{'id': f'MH-{i}', 'name': f'Hospital {i}', 'city': 'Pune', 'lat': 18.5, 'lng': 73.8,
+                 'specialities': ['General Medicine']} for i in range(5)]
+        path = self.write('registry.jsonl', '\n'.join(json.dumps(r) for r in rows) + '\n')
+        checkpoint = path + '.checkpoint'
+        stat = os.stat(path)
+        # As if an earlier run committed the first three rows and then died
+        with open(checkpoint, 'w', encoding='utf-8') as f:
+            json.dump({'size': stat.st_size, 'mtime': int(stat.st_mtime), 'rows_done': 3}, f)
+
+        output = self.run_import(path, batch_size=2)
+        self.assertIn('Resuming after row 3', output)
+        self.assertEqual(sorted(Hospital.objects.values_list('external_id', flat=True)), ['MH-3', 'MH-4'])
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_bad_rows_and_unknown_departments_are_reported(self):
+        base = {'name': 'Hospital', 'city': 'Pune', 'lat': 18.5, 'lng': 73.8}
+        lines = ['[1]', '"x"', 'null', json.dumps({**base, 'id': 'MH-1', 'beds': 'inf'}),
+                 json.dumps({**base, 'id': 'MH-2', 'departments': 'Oncology; Cardiology'}),
+                 json.dumps({**base, 'id': 'MH-3', 'departments': 'Oncology'})]
+        path = self.write('registry.jsonl', '\n'.join(lines) + '\n')
+        rejects = self.write('rejects.jsonl', '')
+        output = self.run_import(path, rejects=rejects)
+        self.assertIn('1 created, 0 updated, 5 rejected', output)
+        self.assertIn('Oncology (2)', output)
+        self.assertEqual(Hospital.objects.get(external_id='MH-2').specialities, ['Cardiology'])
+        with open(rejects, encoding='utf-8') as f:
+            errors = [json.loads(line)['error'] for line in f]
+        self.assertEqual(errors[:3], ['not a JSON object: list', 'not a JSON object: str',
+                                      'not a JSON object: NoneType'])
+        self.assertIn('total_beds', errors[3])
+        self.assertIn('no known speciality', errors[4])
+
+    def test_non_text_values_are_rejected(self):
+        base = {'name': 'Hospital', 'city': 'Pune', 'lat': 18.5, 'lng': 73.8}
+        lines = [json.dumps({**base, 'id': 'MH-1', 'name': 12345}), json.dumps({**base, 'id': 'MH-2', 'city': 411001}),
+                 json.dumps({**base, 'id': 'MH-3', 'address': {'line1': 'FC Road'}}),
+                 json.dumps({**base, 'id': 4, 'pincode': 411004, 'phone': 2025501234})]
+        path = self.write('registry.jsonl', '\n'.join(lines) + '\n')
+        rejects = self.write('rejects.jsonl', '')
+        output = self.run_import(path, rejects=rejects)
+        self.assertIn('1 created, 0 updated, 3 rejected', output)
+        with open(rejects, encoding='utf-8') as f:
+            errors = [json.loads(line)['error'] for line in f]
+        self.assertEqual(errors, ['name is not text: 12345', 'city is not text: 411001',
+                                  "address is not text: {'line1': 'FC Road'}"])
+        hospital = Hospital.objects.get(external_id='4')
+        self.assertEqual((hospital.pincode, hospital.contact), ('411004', '2025501234'))
@@ -4,9 +4,15 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('api/analyze', views.analyze_symptoms, name='analyze'),
+    path('api/triage', views.triage_view, name='triage'),
     path('api/hospitals', views.search_hospitals, name='hospitals'),
+    path('api/hospitals/nearby', views.nearby_hospitals, name='nearby_hospitals'),
     path('hospitals/', views.all_hospitals, name='all_hospitals'),
     path('hospitals/<int:pk>/', views.hospital_detail, name='hospital_detail'),
     path('lab-report/', views.lab_report_page, name='lab_report'),
     path('api/analyze-lab-report', views.analyze_lab_report_view, name='analyze_lab_report'),
+    path('api/lab-history', views.lab_history_view, name='lab_history'),
+    path('api/lab-history/<int:pk>', views.lab_history_entry, name='lab_history_entry'),
+    path('api/health/gemini', views.gemini_health, name='gemini_health'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
@@ -1,3 +1,4 @@
+import math
 
 # =====================
 # BASE COST DATA
@@ -109,7 +110,14 @@ CITY_FACTOR = {
 # =====================
 # MAIN FUNCTION
 # =====================
-def compute_cost_range(disease_input, city, hospital):
+LOW_SPREAD = 0.85
+HIGH_SPREAD = 1.15
+
+def resolve_cost_basis(disease_input, city):
+    """
+    Resolve the hospital-independent part of the estimate once:
+    returns (disease, unit) where unit = base cost * city factor.
+    """
     disease = disease_input
     
     # Check if input is likely a symptom list (list of strings)
@@ -129,6 +137,11 @@ def compute_cost_range(disease_input, city, hospital):
     if severity in ["moderate", "severe", "critical"]:
         city_factor = CITY_FACTOR.get(city, 1.0)
         
+    return disease, base * city_factor
+
+def compute_cost_range(disease_input, city, hospital):
+    disease, unit = resolve_cost_basis(disease_input, city)
+        
     # Hospital type multiplier
     h_type = hospital.hospital_type if hasattr(hospital, 'hospital_type') else "unknown"
     hospital_type_mult = HOSPITAL_MULT.get(h_type, 1.2)
@@ -136,10 +149,10 @@ def compute_cost_range(disease_input, city, hospital):
     # Hospital base factor
     hospital_base_factor = hospital.base_cost_factor if hasattr(hospital, 'base_cost_factor') else 1.0
     
-    total = base * city_factor * hospital_type_mult * hospital_base_factor
+    total = unit * hospital_type_mult * hospital_base_factor
     
-    low = int(round(total * 0.85))
-    high = int(round(total * 1.15))
+    low = int(round(total * LOW_SPREAD))
+    high = int(round(total * HIGH_SPREAD))
     
     return {
         "predictedDisease": disease,
@@ -147,6 +160,48 @@ def compute_cost_range(disease_input, city, hospital):
         "high": high
     }
 
+def compute_cost_ranges(disease_input, city, hospitals):
+    """
+    Batch form of compute_cost_range for a whole candidate set: the disease,
+    severity and city factor are resolved once, and each hospital only costs
+    two multiplications. Returns {"predictedDisease", "low": [...], "high": [...]}
+    in the same order as `hospitals`.
+    """
+    disease, unit = resolve_cost_basis(disease_input, city)
+    low_unit = unit * LOW_SPREAD
+    high_unit = unit * HIGH_SPREAD
+
+    lows, highs = [], []
+    for h in hospitals:
+        factor = HOSPITAL_MULT.get(getattr(h, 'hospital_type', 'unknown'), 1.2) * getattr(h, 'base_cost_factor', 1.0)
+        lows.append(int(round(low_unit * factor)))
+        highs.append(int(round(high_unit * factor)))
+
+    return {
+        "predictedDisease": disease,
+        "low": lows,
+        "high": highs
+    }
+
+def budget_filter_q(disease_input, city, budget):
+    """
+    Q object keeping only hospitals whose estimated low cost is within `budget`,
+    so the budget filter runs in SQL before pagination instead of on enriched dicts.
+    low = round(unit * 0.85 * type_mult * base_cost_factor) <= budget
+      <=> base_cost_factor < (floor(budget) + 0.5) / (unit * 0.85 * type_mult)
+    """
+    from django.db.models import Q
+
+    _, unit = resolve_cost_basis(disease_input, city)
+    limit = math.floor(budget) + 0.5
+    low_unit = unit * LOW_SPREAD
+
+    # Unlisted types fall back to the 1.2 multiplier, as in compute_cost_range
+    q = ~Q(hospital_type__in=list(HOSPITAL_MULT)) & Q(base_cost_factor__lt=limit / (low_unit * 1.2))
+    for h_type, mult in HOSPITAL_MULT.items():
+        q |= Q(hospital_type=h_type, base_cost_factor__lt=limit / (low_unit * mult))
+    return q
+
 def format_cost_text(low, high):
     def format_currency(num):
         # formatted currency similar to en-IN
@@ -1,23 +1,43 @@
-import os
 import json
 import base64
-import google.generativeai as genai
 from dotenv import load_dotenv
+from core.utils import metrics
+from core.utils.gemini_client import get_client
+from core.utils.gemini_schemas import (
+    LAB_DISCLAIMER, ReplyError, generation_config, parse_json_text, parse_reply, validate_lab_explanation,
+    validate_lab_report, validate_translations, validate_triage,
+)
+from core.utils.json_stream import JsonObjectStream
+from core.utils.lab_values import local_summary, read_lab_values
+from core.utils.local_triage import triage
+from core.utils.response_cache import get_cache, make_key
+from core.utils.singleflight import SingleFlight
 
 load_dotenv()
 
+# Concurrent identical calls share one upstream request (core/utils/singleflight.py)
+inflight = SingleFlight('gemini')
+
+# Scalar triage fields pushed to the browser as soon as they parse
+STREAMED_TRIAGE_FIELDS = ('urgency', 'speciality', 'confidence')
+
+# Introduces the source strings in a translation prompt
+TRANSLATION_SOURCE_MARKER = 'Source JSON array:'
+
+# Introduces the locally read results in a lab explanation prompt
+LAB_VALUES_MARKER = 'Results read from the report:'
+
 def analyze_symptoms(symptoms_text, city, response_language='English'):
-    api_key = os.getenv("GEMINI_API_KEY")
-    
-    if not api_key:
-        print("Missing GEMINI_API_KEY in environment variables")
-        return get_default_response(symptoms_text)
-        
-    genai.configure(api_key=api_key)
-    
-    # Use Flash model as requested
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    
+    cache = get_cache()
+    cache_key = make_key('triage', symptoms_text, city, response_language)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+    # Identical concurrent requests are already coalesced by the caller (views.analyze_flights)
+    return _generate_triage(cache, cache_key, symptoms_text, city, response_language)
+
+
+def _triage_prompt(symptoms_text, city, response_language):
     input_json = json.dumps({
         "symptoms_text": symptoms_text,
         "location": city or ""
@@ -29,174 +49,288 @@ def analyze_symptoms(symptoms_text, city, response_language='English'):
         if response_language != 'English' else ''
     )
     
-    prompt = f"""You are a concise, safety-first medical triage assistant. Output JSON only.
+    # The key order matters to stream_symptoms_analysis, which has no schema to pin it
+    prompt = f"""You are a concise, safety-first medical triage assistant.
 {lang_instruction}
+From symptoms_text give up to 3 possible diseases, one medical speciality, urgency and your confidence.
+Reply with one JSON object, keys in this order: urgency (low|medium|high), speciality,
+possible_diseases [{{name, probability 0-1, notes: at most 12 words}}], confidence (0-1).
+Use cautious phrasing; this is not a diagnosis. Emergency signs (severe chest pain with sweating or fainting,
+severe breathlessness, heavy bleeding) mean urgency "high".
 
-Task: Convert symptoms_text into up to 3 possible diseases, a single medical speciality, urgency (low|medium|high), and confidence.
+Input: {input_json}"""
+    return prompt
 
-Input:
-{input_json}
 
-Return EXACT JSON:
-{{
-  "possible_diseases":[
-    {{"name":"<string>","probability":<0.0-1.0>,"notes":"<<= 12 words justification>"}}
-  ],
-  "speciality":"<single string>",
-  "urgency":"low|medium|high",
-  "confidence":<0.0-1.0>
-}}
-
-Rules:
-- Use cautious phrasing; this is not a diagnosis.
-- If emergency signs (severe chest pain + sweating + fainting / severe breathlessness / heavy bleeding) then urgency="high".
-- Output valid JSON only."""
+def _generate_triage(cache, cache_key, symptoms_text, city, response_language):
+    metrics.GEMINI_REQUESTS.inc(operation='triage')
+    client = get_client()
+    
+    if client is None:
+        print("Missing GEMINI_API_KEY in environment variables")
+        metrics.GEMINI_FALLBACKS.inc(operation='triage', reason='no_api_key')
+        return get_default_response(symptoms_text)
 
+    prompt = _triage_prompt(symptoms_text, city, response_language)
     try:
-        response = model.generate_content(prompt)
-        text_content = response.text
-        
-        # Clean markdown code blocks if present
-        if "```json" in text_content:
-            text_content = text_content.replace("```json", "").replace("```", "")
-        elif "```" in text_content:
-            text_content = text_content.replace("```", "")
-            
-        return json.loads(text_content.strip())
+        response = client.generate_content(prompt, operation='triage', generation_config=generation_config('triage'))
+        result = parse_reply(response, validate_triage)
+        cache.set(cache_key, result)
+        return result
         
+    except ReplyError as e:
+        print(f"Gemini analysis parse error ({e.reason}): {e}")
+        metrics.GEMINI_PARSE_FAILURES.inc(operation='triage', reason=e.reason)
+        metrics.GEMINI_FALLBACKS.inc(operation='triage', reason='parse_error')
+        return get_default_response(symptoms_text)
     except Exception as e:
         print(f"Gemini analysis error: {e}")
+        metrics.GEMINI_FALLBACKS.inc(operation='triage', reason='upstream_error')
         return get_default_response(symptoms_text)
 
+def stream_symptoms_analysis(symptoms_text, city, response_language='English'):
+    """
+    Streaming form of analyze_symptoms: yields events (dicts) while Gemini is
+    still writing the reply.
+        {'event': 'field', 'name': 'urgency'|'speciality'|'confidence', 'value': ...}
+        {'event': 'disease', 'value': {...}}      each possible disease as it completes
+        {'event': 'result', 'analysis': {...}}    always last; what analyze_symptoms returns
+    The prompt puts urgency first, so it usually arrives with the first chunks.
+    The call runs in JSON mode without the response schema: this SDK cannot
+    set the schema's property ordering, and Gemini would otherwise write the
+    keys alphabetically, urgency last. validate_triage checks the result.
+    """
+    cache = get_cache()
+    cache_key = make_key('triage', symptoms_text, city, response_language)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        yield {'event': 'result', 'analysis': cached}
+        return
+
+    metrics.GEMINI_REQUESTS.inc(operation='triage')
+    client = get_client()
+    if client is None:
+        print("Missing GEMINI_API_KEY in environment variables")
+        metrics.GEMINI_FALLBACKS.inc(operation='triage', reason='no_api_key')
+        yield {'event': 'result', 'analysis': get_default_response(symptoms_text)}
+        return
+
+    parser = JsonObjectStream()
+    text_content = ''
+    prompt = _triage_prompt(symptoms_text, city, response_language)
+    try:
+        for chunk in client.stream_content(prompt, operation='triage',
+                                           generation_config=generation_config('triage', stream=True)):
+            text_content += chunk
+            if parser is None:
+                continue
+            try:
+                events = parser.feed(chunk)
+            except ValueError:
+                parser = None  # keep collecting; the whole reply is parsed at the end
+                continue
+            for kind, key, value in events:
+                if kind == 'item' and key == 'possible_diseases':
+                    yield {'event': 'disease', 'value': value}
+                elif kind == 'field' and key in STREAMED_TRIAGE_FIELDS:
+                    yield {'event': 'field', 'name': key, 'value': value}
+        result = validate_triage(
+            parser.fields if parser is not None and parser.done else parse_json_text(text_content)
+        )
+        cache.set(cache_key, result)
+    except ReplyError as e:
+        print(f"Gemini analysis parse error ({e.reason}): {e}")
+        metrics.GEMINI_PARSE_FAILURES.inc(operation='triage', reason=e.reason)
+        metrics.GEMINI_FALLBACKS.inc(operation='triage', reason='parse_error')
+        result = get_default_response(symptoms_text)
+    except Exception as e:
+        print(f"Gemini analysis error: {e}")
+        metrics.GEMINI_FALLBACKS.inc(operation='triage', reason='upstream_error')
+        result = get_default_response(symptoms_text)
+    yield {'event': 'result', 'analysis': result}
+
+
 def get_default_response(symptoms_text=''):
-    symptoms = symptoms_text.lower()
-    
-    diseases = []
-    speciality = "General Physician"
-    urgency = "low"
-    
-    # Fever-related
-    if 'fever' in symptoms:
-        if any(x in symptoms for x in ['joint', 'muscle', 'pain']):
-            diseases.append({"name": "Dengue Fever", "probability": 0.6, "notes": "Fever with joint/muscle pain"})
-            diseases.append({"name": "Viral Infection", "probability": 0.3, "notes": "Common viral symptoms"})
-            urgency = "medium"
-        else:
-            diseases.append({"name": "Viral Fever", "probability": 0.7, "notes": "Common fever symptoms"})
-            diseases.append({"name": "Flu", "probability": 0.2, "notes": "Influenza-like illness"})
-        speciality = "General Medicine"
-        
-    # Chest pain
-    elif 'chest' in symptoms and 'pain' in symptoms:
-        diseases.append({"name": "Angina", "probability": 0.5, "notes": "Chest pain, needs evaluation"})
-        diseases.append({"name": "Gastritis", "probability": 0.3, "notes": "Acid reflux related"})
-        speciality = "Cardiology"
-        urgency = "high"
-        
-    # Headache
-    elif 'headache' in symptoms or 'head' in symptoms:
-        diseases.append({"name": "Tension Headache", "probability": 0.6, "notes": "Common headache"})
-        diseases.append({"name": "Migraine", "probability": 0.3, "notes": "Severe headache"})
-        speciality = "Neurology"
-        
-    # Stomach
-    elif any(x in symptoms for x in ['stomach', 'abdominal', 'vomit']):
-        diseases.append({"name": "Gastroenteritis", "probability": 0.6, "notes": "Stomach infection"})
-        diseases.append({"name": "Food Poisoning", "probability": 0.3, "notes": "Food-related illness"})
-        speciality = "Gastroenterology"
-        
-    # Cough/cold
-    elif 'cough' in symptoms or 'cold' in symptoms:
-        diseases.append({"name": "Upper Respiratory Infection", "probability": 0.7, "notes": "Common cold"})
-        diseases.append({"name": "Bronchitis", "probability": 0.2, "notes": "Chest infection"})
-        speciality = "General Medicine"
-        
-    else:
-        diseases.append({"name": "General Checkup Recommended", "probability": 0.5, "notes": "Consult a doctor"})
-        
-    return {
-        "possible_diseases": diseases,
-        "speciality": speciality,
-        "urgency": urgency,
-        "confidence": 0.5
-    }
+    """Fallback analysis from the local triage index (core/utils/local_triage.py)."""
+    result = triage(symptoms_text)
+    result.pop('source', None)
+    return result
 
 
 # ─── Lab Report Analyser ──────────────────────────────────────────────────────
 
-def analyze_lab_report(file_bytes: bytes, mime_type: str, filename: str = "", response_language: str = 'English'):
-    """Send a lab report image/PDF to Gemini Vision and get a structured analysis."""
-    api_key = os.getenv("GEMINI_API_KEY")
-
-    if not api_key:
+def _lab_report_prompt(extra_instruction=''):
+    # The shape is enforced by LAB_REPORT_SCHEMA; the disclaimer is a constant filled in by validate_lab_report
+    return f"""You are a medical lab report interpreter helping a patient understand their report.
+{extra_instruction}
+Read the attached lab report and reply with one JSON object:
+report_type (e.g. Complete Blood Count, Lipid Profile, Thyroid Panel),
+parameters [{{name, value with unit, normal_range with unit, status (normal|high|low), simple_explanation}}],
+overall_summary (2-3 sentences), possible_conditions [{{name, likelihood (possible|likely|unlikely), explanation, cause}}],
+recommendation (brief next steps).
+Explanations are one or two short sentences in simple, non-technical language a patient can understand.
+If the file is not a readable lab report, reply {{"error": "Could not read a valid lab report from this file."}}."""
+
+
+def _run_lab_report_prompt(prompt, file_bytes, mime_type, operation='lab_report'):
+    """Make the multimodal call and parse its JSON; None when no API key is set."""
+    metrics.GEMINI_REQUESTS.inc(operation=operation)
+    client = get_client()
+
+    if client is None:
         print("Missing GEMINI_API_KEY")
-        return get_default_lab_response()
+        metrics.GEMINI_FALLBACKS.inc(operation=operation, reason='no_api_key')
+        return None
 
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.5-flash')
+    # Inline the file as base64 for the multimodal call
+    b64 = base64.b64encode(file_bytes).decode('utf-8')
+    image_part = {"inline_data": {"mime_type": mime_type, "data": b64}}
 
-    # Language instruction
+    try:
+        response = client.generate_content([prompt, image_part], operation=operation,
+                                           generation_config=generation_config(operation))
+    except Exception:
+        metrics.GEMINI_FALLBACKS.inc(operation=operation, reason='upstream_error')
+        raise
+
+    try:
+        return parse_reply(response, validate_lab_report, operation == 'lab_report_localized')
+    except ReplyError as e:
+        metrics.GEMINI_PARSE_FAILURES.inc(operation=operation, reason=e.reason)
+        metrics.GEMINI_FALLBACKS.inc(operation=operation, reason='parse_error')
+        raise
+
+
+def _lab_explanation_prompt(partial, response_language):
+    # Values and statuses were decided locally; the model only writes the text around them
+    rows = '\n'.join(
+        f"{i}. {p['name']}: {p['value']} (normal range {p['normal_range']}) - {p['status']}"
+        for i, p in enumerate(partial['parameters'], 1)
+    )
     lang_instruction = (
-        f"IMPORTANT: Respond in {response_language}. All explanatory text fields (simple_explanation, overall_summary, explanation, cause, recommendation, disclaimer) must be written in {response_language}."
+        f"IMPORTANT: Write every text in {response_language}. Also add report_type: \"{partial['report_type']}\" "
+        f'in {response_language}, and "disclaimer": this sentence in {response_language}: "{LAB_DISCLAIMER}"'
         if response_language != 'English' else ''
     )
-
-    prompt = f"""
-You are a medical lab report interpreter helping a patient understand their report.
+    return f"""You are a medical lab report interpreter helping a patient understand their report.
 {lang_instruction}
-Analyze the uploaded lab report image/document and return ONLY valid JSON in this exact format:
-
-{{
-  "report_type": "<e.g. Complete Blood Count, Lipid Profile, Thyroid Panel>",
-  "parameters": [
-    {{
-      "name": "<test name>",
-      "value": "<patient's value with unit>",
-      "normal_range": "<normal range with unit>",
-      "status": "normal|high|low",
-      "simple_explanation": "<1-2 sentences in simple language>"
-    }}
-  ],
-  "overall_summary": "<2-3 sentence plain-language summary of the overall report>",
-  "possible_conditions": [
-    {{
-      "name": "<condition name>",
-      "likelihood": "possible|likely|unlikely",
-      "explanation": "<plain language explanation in 1-2 sentences>",
-      "cause": "<what typically causes this condition>"
-    }}
-  ],
-  "recommendation": "<brief advice on next steps>",
-  "disclaimer": "This analysis is AI-generated for informational purposes only and is not a medical diagnosis. Please consult a qualified doctor."
-}}
-
-Rules:
-- Use simple, non-technical language a patient can understand.
-- status must be exactly: normal, high, or low.
-- If the image is not a lab report or is unreadable, return {{"error": "Could not read a valid lab report from this file."}}.
-- Output valid JSON only, no markdown fences.
-"""
+The values, normal ranges and statuses below are final; do not question or change them.
+{LAB_VALUES_MARKER}
+{rows}
+Reply with one JSON object: explanations (one entry per result above, in the same order),
+overall_summary (2-3 sentences), possible_conditions [{{name, likelihood (possible|likely|unlikely), explanation, cause}}],
+recommendation (brief next steps).
+Explanations are one or two short sentences in simple, non-technical language a patient can understand."""
 
+
+def explain_lab_values(partial, response_language='English'):
+    """
+    Complete a locally read analysis (core/utils/lab_values.py) with a
+    text-only Gemini call for the explanations, summary and conditions.
+
+    Returns (result, explained); when the call fails the result carries a
+    factual English summary from local_summary() and explained is False.
+    """
+    operation = 'lab_explain'
+    metrics.GEMINI_REQUESTS.inc(operation=operation)
+    client = get_client()
+    if client is None:
+        metrics.GEMINI_FALLBACKS.inc(operation=operation, reason='no_api_key')
+        return local_summary(partial), False
+
+    parameters = partial['parameters']
     try:
-        # Inline the file as base64 for the multimodal call
-        b64 = base64.b64encode(file_bytes).decode('utf-8')
-        image_part = {"inline_data": {"mime_type": mime_type, "data": b64}}
+        response = client.generate_content(_lab_explanation_prompt(partial, response_language),
+                                           operation=operation, generation_config=generation_config(operation))
+        text = parse_reply(response, validate_lab_explanation, len(parameters))
+    except ReplyError as e:
+        print(f"Lab explanation parse error ({e.reason}): {e}")
+        metrics.GEMINI_PARSE_FAILURES.inc(operation=operation, reason=e.reason)
+        metrics.GEMINI_FALLBACKS.inc(operation=operation, reason='parse_error')
+        return local_summary(partial), False
+    except Exception as e:
+        print(f"Lab explanation error: {e}")
+        metrics.GEMINI_FALLBACKS.inc(operation=operation, reason='upstream_error')
+        return local_summary(partial), False
+
+    localized = response_language != 'English'
+    return {
+        'report_type': (localized and text['report_type']) or partial['report_type'],
+        'parameters': [dict(p, simple_explanation=explanation)
+                       for p, explanation in zip(parameters, text['explanations'])],
+        'overall_summary': text['overall_summary'],
+        'possible_conditions': text['possible_conditions'],
+        'recommendation': text['recommendation'],
+        'disclaimer': (localized and text['disclaimer']) or LAB_DISCLAIMER,
+    }, True
+
 
-        response = model.generate_content([prompt, image_part])
-        text = response.text.strip()
+def analyze_lab_report(file_bytes: bytes, mime_type: str, filename: str = "", response_language: str = 'English'):
+    """Send a lab report image/PDF to Gemini Vision and get a structured analysis."""
+    # Text PDFs are read locally; only the explanations need the model
+    partial = read_lab_values(file_bytes, mime_type)
+    if partial is not None:
+        return explain_lab_values(partial, response_language)[0]
 
-        # Strip accidental markdown fences
-        if text.startswith("```"):
-            text = text.split("\n", 1)[-1]
-            text = text.rsplit("```", 1)[0]
+    # Language instruction
+    lang_instruction = (
+        f"IMPORTANT: Respond in {response_language}. All explanatory text fields (simple_explanation, overall_summary, explanation, cause, recommendation) must be written in {response_language}. "
+        f'Also add "disclaimer": this sentence in {response_language}: "{LAB_DISCLAIMER}"'
+        if response_language != 'English' else ''
+    )
 
-        return json.loads(text)
+    try:
+        result = _run_lab_report_prompt(_lab_report_prompt(lang_instruction), file_bytes, mime_type)
+        return result if result is not None else get_default_lab_response()
 
     except Exception as e:
         print(f"Lab report analysis error: {e}")
         return get_default_lab_response()
 
 
+def analyze_lab_report_localized(file_bytes: bytes, mime_type: str, filename: str, response_language: str):
+    """
+    Analyse a lab report and translate it in a single Gemini call.
+
+    The model returns the usual English JSON plus a "translations" array in
+    the order of lab_translation_source(), which is merged back in here.
+    Returns (result, translated); when translated is False the result is the
+    English analysis and the caller should fall back to translate_lab_result.
+    Text PDFs read locally are explained directly in response_language.
+    """
+    partial = read_lab_values(file_bytes, mime_type)
+    if partial is not None:
+        return explain_lab_values(partial, response_language)
+
+    translation_instruction = f"""IMPORTANT: Write the analysis in English. Then add "translations": an array of these texts
+translated into {response_language}, in this order: report_type, overall_summary, recommendation,
+the sentence "{LAB_DISCLAIMER}", the simple_explanation of each parameter,
+then the name, explanation and cause of each possible condition.
+Leave values, normal_range, status and likelihood untranslated."""
+
+    try:
+        result = _run_lab_report_prompt(
+            _lab_report_prompt(translation_instruction), file_bytes, mime_type, operation='lab_report_localized'
+        )
+    except Exception as e:
+        print(f"Lab report analysis error: {e}")
+        return get_default_lab_response(), False
+
+    if result is None:
+        return get_default_lab_response(), False
+
+    translations = result.pop('translations', None)
+    if 'error' in result:
+        return result, False
+    source = lab_translation_source(result)
+    try:
+        translations = validate_translations(translations, len(source))
+    except ReplyError as e:
+        metrics.GEMINI_PARSE_FAILURES.inc(operation='lab_report_localized', reason=e.reason)
+        return result, False
+    return merge_lab_translations(result, dict(zip(source, translations))), True
+
+
 def get_default_lab_response():
     return {
         "error": "Analysis temporarily unavailable. Please try again or check your API key."
@@ -213,10 +347,49 @@ def translate_lab_result(result: dict, target_language: str) -> dict:
     if not result or 'error' in result or target_language == 'English':
         return result
 
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
+    client = get_client()
+    if client is None:
         return result
 
+    # Only the texts go out and come back, in order; the keys are zipped back on here
+    source = lab_translation_source(result)
+    source_json = json.dumps(list(source.values()), ensure_ascii=False)
+    translated = inflight.do(
+        make_key('translate', source_json, target_language),
+        _translate_texts, client, source_json, len(source), target_language,
+    )
+    if translated is None:
+        return result  # graceful fallback — return English result
+
+    return merge_lab_translations(result, dict(zip(source, translated)))
+
+
+def _translate_texts(client, source_json, count, target_language):
+    """One translation call for a JSON array of `count` strings; the translated list, or None on failure."""
+    prompt = f"""You are a medical translator. Translate each English string in the JSON array below into {target_language}.
+Reply with a JSON array of the {count} translations, in the same order.
+
+{TRANSLATION_SOURCE_MARKER}
+{source_json}"""
+
+    metrics.GEMINI_REQUESTS.inc(operation='translate')
+    try:
+        response = client.generate_content(prompt, operation='translate',
+                                           generation_config=generation_config('translate'))
+        return parse_reply(response, validate_translations, count)
+    except ReplyError as e:
+        print(f"Translation parse error ({e.reason}): {e}")
+        metrics.GEMINI_PARSE_FAILURES.inc(operation='translate', reason=e.reason)
+        metrics.GEMINI_FALLBACKS.inc(operation='translate', reason='parse_error')
+        return None
+    except Exception as e:
+        print(f"Translation error: {e}")
+        metrics.GEMINI_FALLBACKS.inc(operation='translate', reason='upstream_error')
+        return None
+
+
+def lab_translation_source(result: dict) -> dict:
+    """Flat {key: text} dict of the translatable fields in a lab report result."""
     # Build a flat dict of translatable texts keyed by a unique identifier
     to_translate = {}
     to_translate['report_type'] = result.get('report_type', '')
@@ -232,28 +405,11 @@ def translate_lab_result(result: dict, target_language: str) -> dict:
         to_translate[f'condition_{i}_explanation'] = c.get('explanation', '')
         to_translate[f'condition_{i}_cause'] = c.get('cause', '')
 
-    source_json = json.dumps(to_translate, ensure_ascii=False)
-
-    prompt = f"""You are a medical translator. Translate the following JSON values from English to {target_language}.
-Return ONLY a JSON object with the EXACT same keys, with the values translated to {target_language}.
-Do NOT translate the keys. Do NOT add or remove any keys. Do NOT include markdown fences.
+    return to_translate
 
-Source JSON:
-{source_json}"""
-
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        if text.startswith("```"):
-            text = text.split("\n", 1)[-1]
-            text = text.rsplit("```", 1)[0]
-        translated = json.loads(text)
-    except Exception as e:
-        print(f"Translation error: {e}")
-        return result  # graceful fallback — return English result
 
+def merge_lab_translations(result: dict, translated: dict) -> dict:
+    """Merge a translated lab_translation_source() dict back into a copy of `result`."""
     # Merge translated values back into the result
     out = dict(result)
     out['report_type']     = translated.get('report_type', result.get('report_type', ''))
@@ -0,0 +1,327 @@
+"""
+Process-wide Gemini client.
+
+`genai.configure()` drops the SDK's cached service clients, so calling it per
+request (as every helper in gemini.py used to) paid client construction and a
+fresh TLS handshake on each call. GeminiClient configures the SDK once and
+keeps one GenerativeModel per model name, so the underlying connection pool is
+reused across requests and threads.
+
+Every call is guarded by its operation's circuit breaker and runs against a
+deadline (GEMINI_TIMEOUT) with up to GEMINI_RETRIES jittered retries of
+transient errors; see core/utils/resilience.py. Breakers are per operation so
+slow multimodal lab calls cannot put symptom triage on its fallback.
+
+Settings:
+    GEMINI_MODEL      default model name ('gemini-2.5-flash')
+    GEMINI_TRANSPORT  'grpc' | 'rest' | None (SDK default)
+    GEMINI_WARM_UP    warm the connection in the background at startup
+    GEMINI_STUB       dict: serve calls from the local stub (core/utils/gemini_stub.py)
+    GEMINI_TIMEOUT, GEMINI_RETRIES, GEMINI_RETRY_BASE_DELAY
+    GEMINI_TIMEOUTS            dict: per-operation overrides of GEMINI_TIMEOUT
+    GEMINI_BREAKER             breaker config shared by all operations
+    GEMINI_BREAKER_OPERATIONS  dict: per-operation overrides of GEMINI_BREAKER
+    GEMINI_HEALTH_TTL          seconds a health() probe result is reused
+"""
+import os
+import threading
+import time
+
+import google.generativeai as genai
+from django.conf import settings
+from google.api_core import exceptions as api_exceptions
+from dotenv import load_dotenv
+
+from core.utils import metrics
+from core.utils.resilience import OPEN, CircuitBreaker, CircuitOpenError, DeadlineExceeded, call_with_retries
+
+load_dotenv()
+
+DEFAULT_MODEL = 'gemini-2.5-flash'
+
+# Transient upstream failures worth another attempt within the deadline
+RETRYABLE_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.TooManyRequests,
+    api_exceptions.DeadlineExceeded,
+    TimeoutError,
+    ConnectionError,
+)
+
+
+class GeminiClient:
+    def __init__(self, api_key, model_name=None, transport=None):
+        self.model_name = model_name or DEFAULT_MODEL
+        configure_kwargs = {'api_key': api_key}
+        if transport:
+            configure_kwargs['transport'] = transport
+        genai.configure(**configure_kwargs)
+        self._models = {}
+        self._lock = threading.Lock()
+        self.warmed_up = False
+        self._breakers = {}
+        self._probe = None
+
+    def breaker(self, operation):
+        """
+        The circuit breaker for `operation`, created on first use from
+        GEMINI_BREAKER plus any GEMINI_BREAKER_OPERATIONS[operation] overrides.
+        """
+        breaker = self._breakers.get(operation)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(operation)
+                if breaker is None:
+                    config = dict(getattr(settings, 'GEMINI_BREAKER', None) or {})
+                    config.update(getattr(settings, 'GEMINI_BREAKER_OPERATIONS', {}).get(operation, {}))
+                    breaker = CircuitBreaker(f'gemini:{operation}', config)
+                    self._breakers[operation] = breaker
+        return breaker
+
+    def breaker_snapshots(self):
+        return [breaker.snapshot() for _, breaker in sorted(self._breakers.items())]
+
+    def model(self, name=None, **kwargs):
+        """
+        Cached GenerativeModel for `name` (default GEMINI_MODEL). Models built
+        with extra kwargs (generation_config, system_instruction, ...) are cached
+        per distinct configuration.
+        """
+        name = name or self.model_name
+        key = (name, repr(sorted(kwargs.items())))
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = genai.GenerativeModel(name, **kwargs)
+                    self._models[key] = model
+        return model
+
+    def generate_content(self, contents, model=None, timeout=None, operation='generate', **kwargs):
+        """
+        generate_content with a deadline of `timeout` seconds (the operation's
+        operation_timeout() by default) shared by all attempts. Raises CircuitOpenError immediately
+        while the breaker of `operation` is open. Latency and token usage are recorded in
+        core.utils.metrics under `operation`. Extra kwargs, such as a per-call
+        generation_config (core/utils/gemini_schemas.py), go to the model.
+        """
+        target = self.model(model)
+        if timeout is None:
+            timeout = operation_timeout(operation)
+        request_options = kwargs.pop('request_options', None) or {}
+        breaker = self.breaker(operation)
+
+        def attempt(remaining):
+            breaker.before_call()
+            start = time.monotonic()
+            try:
+                response = target.generate_content(
+                    contents, request_options={**request_options, 'timeout': remaining}, **kwargs
+                )
+            except Exception:
+                breaker.record(False, time.monotonic() - start)
+                raise
+            breaker.record(True, time.monotonic() - start)
+            return response
+
+        start = time.monotonic()
+        try:
+            response = call_with_retries(
+                attempt,
+                deadline=start + timeout,
+                retries=getattr(settings, 'GEMINI_RETRIES', 2),
+                base_delay=getattr(settings, 'GEMINI_RETRY_BASE_DELAY', 0.25),
+                retry_on=RETRYABLE_ERRORS,
+            )
+        except CircuitOpenError:
+            metrics.record_gemini_call(operation, 'circuit_open', time.monotonic() - start)
+            raise
+        except DeadlineExceeded:
+            metrics.record_gemini_call(operation, 'deadline', time.monotonic() - start)
+            raise
+        except Exception:
+            metrics.record_gemini_call(operation, 'error', time.monotonic() - start)
+            raise
+        metrics.record_gemini_call(operation, 'ok', time.monotonic() - start, response,
+                                   _output_format(kwargs.get('generation_config')))
+        return response
+
+    def stream_content(self, contents, model=None, timeout=None, operation='generate', **kwargs):
+        """
+        Streaming generate_content: yields the reply's text chunks as the model
+        produces them. The breaker and the deadline apply as in
+        generate_content, but only opening the stream is retried; a stream that
+        fails part-way raises, since the caller may already have used its start.
+        Time to the first chunk is recorded in metrics.GEMINI_FIRST_CHUNK.
+        """
+        target = self.model(model)
+        if timeout is None:
+            timeout = operation_timeout(operation)
+        request_options = kwargs.pop('request_options', None) or {}
+        breaker = self.breaker(operation)
+        start = time.monotonic()
+
+        def open_stream(remaining):
+            breaker.before_call()
+            try:
+                return target.generate_content(
+                    contents, stream=True, request_options={**request_options, 'timeout': remaining}, **kwargs
+                )
+            except Exception:
+                breaker.record(False, time.monotonic() - start)
+                raise
+
+        try:
+            stream = call_with_retries(
+                open_stream,
+                deadline=start + timeout,
+                retries=getattr(settings, 'GEMINI_RETRIES', 2),
+                base_delay=getattr(settings, 'GEMINI_RETRY_BASE_DELAY', 0.25),
+                retry_on=RETRYABLE_ERRORS,
+            )
+        except CircuitOpenError:
+            metrics.record_gemini_call(operation, 'circuit_open', time.monotonic() - start)
+            raise
+        except DeadlineExceeded:
+            metrics.record_gemini_call(operation, 'deadline', time.monotonic() - start)
+            raise
+        except Exception:
+            metrics.record_gemini_call(operation, 'error', time.monotonic() - start)
+            raise
+
+        first_chunk = True
+        try:
+            for chunk in stream:
+                if first_chunk:
+                    metrics.GEMINI_FIRST_CHUNK.observe(time.monotonic() - start, operation=operation)
+                    first_chunk = False
+                try:
+                    text = chunk.text
+                except ValueError:  # a chunk without text parts (finish reason only)
+                    text = ''
+                if text:
+                    yield text
+                if time.monotonic() > start + timeout:
+                    raise DeadlineExceeded('stream ran past its deadline')
+        except GeneratorExit:
+            # The consumer stopped reading; the upstream call itself was fine
+            breaker.record(True, time.monotonic() - start)
+            metrics.record_gemini_call(operation, 'cancelled', time.monotonic() - start)
+            raise
+        except Exception as e:
+            breaker.record(False, time.monotonic() - start)
+            outcome = 'deadline' if isinstance(e, (DeadlineExceeded, api_exceptions.DeadlineExceeded)) else 'error'
+            metrics.record_gemini_call(operation, outcome, time.monotonic() - start)
+            raise
+        breaker.record(True, time.monotonic() - start)
+        metrics.record_gemini_call(operation, 'ok', time.monotonic() - start, stream,
+                                   _output_format(kwargs.get('generation_config')))
+
+    def warm_up(self):
+        """Open the connection and resolve the model ahead of the first request."""
+        try:
+            genai.get_model(f"models/{self.model_name}")
+            self.warmed_up = True
+        except Exception as e:
+            print(f"Gemini warm-up failed: {e}")
+        return self.warmed_up
+
+    def health(self):
+        """
+        Cheap metadata round trip; returns a JSON-serialisable status dict. The
+        round trip is repeated at most every GEMINI_HEALTH_TTL seconds; breaker
+        states are always current.
+        """
+        probe = self._probe
+        if probe is None or time.monotonic() >= probe['expires']:
+            start = time.perf_counter()
+            try:
+                genai.get_model(f"models/{self.model_name}")
+                ok, error = True, None
+            except Exception as e:
+                print(f"Gemini health probe error: {e}")
+                ok, error = False, 'model metadata request failed'
+            probe = self._probe = {
+                'expires': time.monotonic() + getattr(settings, 'GEMINI_HEALTH_TTL', 10),
+                'ok': ok,
+                'error': error,
+                'latency_ms': round((time.perf_counter() - start) * 1000, 1),
+            }
+        breakers = self.breaker_snapshots()
+        return {
+            'ok': probe['ok'] and all(b['state'] != OPEN for b in breakers),
+            'model': self.model_name,
+            'latency_ms': probe['latency_ms'],
+            'error': probe['error'],
+            'breakers': breakers,
+        }
+
+
+def _output_format(generation_config):
+    """How a reply was constrained ('schema', 'json' or 'text'), for metrics.GEMINI_OUTPUT_TOKENS."""
+    if not isinstance(generation_config, dict):
+        return 'text'
+    if generation_config.get('response_schema') is not None:
+        return 'schema'
+    if generation_config.get('response_mime_type') == 'application/json':
+        return 'json'
+    return 'text'
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def operation_timeout(operation):
+    """Deadline in seconds for one Gemini `operation`: GEMINI_TIMEOUTS[operation] or GEMINI_TIMEOUT."""
+    return getattr(settings, 'GEMINI_TIMEOUTS', {}).get(operation, getattr(settings, 'GEMINI_TIMEOUT', 30))
+
+
+def get_client():
+    """The shared GeminiClient, or None when GEMINI_API_KEY is not configured."""
+    global _client
+    if _client is None:
+        stub = getattr(settings, 'GEMINI_STUB', None)
+        if stub:
+            from core.utils.gemini_stub import StubGeminiClient
+            with _client_lock:
+                if _client is None:
+                    _client = StubGeminiClient(stub, getattr(settings, 'GEMINI_MODEL', DEFAULT_MODEL))
+            return _client
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            return None
+        with _client_lock:
+            if _client is None:
+                _client = GeminiClient(
+                    api_key,
+                    model_name=getattr(settings, 'GEMINI_MODEL', DEFAULT_MODEL),
+                    transport=getattr(settings, 'GEMINI_TRANSPORT', None),
+                )
+    return _client
+
+
+def reset_client():
+    """Drop the shared client so the next get_client() reads settings again."""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def warm_up_in_background():
+    """Startup hook: build the client and warm its connection off the main thread."""
+    def _warm():
+        client = get_client()
+        if client is not None:
+            client.warm_up()
+    threading.Thread(target=_warm, name='gemini-warm-up', daemon=True).start()
+
+
+def health():
+    client = get_client()
+    if client is None:
+        return {'ok': False, 'model': getattr(settings, 'GEMINI_MODEL', DEFAULT_MODEL),
+                'latency_ms': None, 'error': 'GEMINI_API_KEY is not set'}
+    return client.health()
@@ -0,0 +1,310 @@
+"""
+Response schemas and reply validation for the Gemini calls in gemini.py.
+
+With GEMINI_RESPONSE_SCHEMAS on (the default) each call asks for
+application/json output constrained by the schema below, with a
+max_output_tokens budget from GEMINI_MAX_OUTPUT_TOKENS. Gemini then cannot
+wrap the reply in markdown fences or drift from the shape, and the prompts
+only name the fields instead of spelling out a JSON template. Streaming triage only sets the mime
+type: this SDK cannot pin the schema's key order, and the stream relies on
+urgency coming first (see gemini.stream_symptoms_analysis).
+
+Every reply, schema-constrained or not, goes through parse_reply(), which
+raises ReplyError(reason) for a truncated reply ('truncated'), text that is
+not JSON ('json') or JSON of the wrong shape ('schema'). Callers count these
+in metrics.GEMINI_PARSE_FAILURES by reason.
+"""
+import json
+
+from django.conf import settings
+
+URGENCY_LEVELS = ('low', 'medium', 'high')
+LAB_STATUSES = ('normal', 'high', 'low')
+LIKELIHOODS = ('possible', 'likely', 'unlikely')
+
+LAB_DISCLAIMER = ("This analysis is AI-generated for informational purposes only and is not a medical "
+                  "diagnosis. Please consult a qualified doctor.")
+
+DEFAULT_MAX_OUTPUT_TOKENS = {
+    'triage': 2048,
+    'lab_report': 8192,
+    'lab_report_localized': 12288,
+    'translate': 4096,
+    'lab_explain': 4096,
+}
+
+_STRING = {'type': 'string'}
+
+TRIAGE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'urgency': {'type': 'string', 'enum': list(URGENCY_LEVELS)},
+        'speciality': _STRING,
+        'possible_diseases': {
+            'type': 'array',
+            'max_items': 3,
+            'items': {
+                'type': 'object',
+                'properties': {'name': _STRING, 'probability': {'type': 'number'}, 'notes': _STRING},
+                'required': ['name', 'probability'],
+            },
+        },
+        'confidence': {'type': 'number'},
+    },
+    'required': ['urgency', 'speciality', 'possible_diseases', 'confidence'],
+}
+
+# Everything optional so an unreadable file can come back as {"error": ...};
+# validate_lab_report() enforces the fields of a real analysis
+LAB_REPORT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'error': _STRING,
+        'report_type': _STRING,
+        'parameters': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'name': _STRING,
+                    'value': _STRING,
+                    'normal_range': _STRING,
+                    'status': {'type': 'string', 'enum': list(LAB_STATUSES)},
+                    'simple_explanation': _STRING,
+                },
+                'required': ['name', 'value', 'status'],
+            },
+        },
+        'overall_summary': _STRING,
+        'possible_conditions': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'name': _STRING,
+                    'likelihood': {'type': 'string', 'enum': list(LIKELIHOODS)},
+                    'explanation': _STRING,
+                    'cause': _STRING,
+                },
+                'required': ['name', 'likelihood'],
+            },
+        },
+        'recommendation': _STRING,
+        # Only asked for when the analysis is written in another language
+        'disclaimer': _STRING,
+    },
+}
+
+LAB_REPORT_LOCALIZED_SCHEMA = {
+    **LAB_REPORT_SCHEMA,
+    'properties': {**LAB_REPORT_SCHEMA['properties'], 'translations': {'type': 'array', 'items': _STRING}},
+}
+
+# Text for lab values read locally (core/utils/lab_values.py): one explanation
+# per value, in order, plus the summary fields
+LAB_EXPLANATION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'report_type': _STRING,
+        'explanations': {'type': 'array', 'items': _STRING},
+        'overall_summary': _STRING,
+        'possible_conditions': LAB_REPORT_SCHEMA['properties']['possible_conditions'],
+        'recommendation': _STRING,
+        'disclaimer': _STRING,
+    },
+    'required': ['explanations', 'overall_summary', 'possible_conditions', 'recommendation'],
+}
+
+# Translations come back as a list in the order of the source values, so the
+# reply does not repeat every key
+TRANSLATION_SCHEMA = {'type': 'array', 'items': _STRING}
+
+SCHEMAS = {
+    'triage': TRIAGE_SCHEMA,
+    'lab_report': LAB_REPORT_SCHEMA,
+    'lab_report_localized': LAB_REPORT_LOCALIZED_SCHEMA,
+    'translate': TRANSLATION_SCHEMA,
+    'lab_explain': LAB_EXPLANATION_SCHEMA,
+}
+
+
+class ReplyError(ValueError):
+    """A Gemini reply that cannot be used; `reason` is 'truncated', 'json' or 'schema'."""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def schemas_enabled():
+    return getattr(settings, 'GEMINI_RESPONSE_SCHEMAS', True)
+
+
+def generation_config(operation, stream=False):
+    """generation_config for `operation`: output budget, plus JSON mode and schema when enabled."""
+    budgets = {**DEFAULT_MAX_OUTPUT_TOKENS, **getattr(settings, 'GEMINI_MAX_OUTPUT_TOKENS', {})}
+    config = {'max_output_tokens': budgets[operation]}
+    if schemas_enabled():
+        config['response_mime_type'] = 'application/json'
+        if not stream:
+            config['response_schema'] = SCHEMAS[operation]
+    return config
+
+
+def finish_reason(response):
+    """Name of the first candidate's finish reason ('STOP', 'MAX_TOKENS', ...), or None."""
+    try:
+        return response.candidates[0].finish_reason.name
+    except (AttributeError, IndexError, TypeError):
+        return None
+
+
+def parse_json_text(text):
+    """json.loads after dropping markdown fences, for replies generated without JSON mode."""
+    text = text.strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[-1]
+        text = text.rsplit('```', 1)[0]
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ReplyError('json', str(e))
+
+
+def parse_reply(response, validate, *args):
+    """Parse and validate a generate_content response; raises ReplyError."""
+    if finish_reason(response) == 'MAX_TOKENS':
+        raise ReplyError('truncated', 'reply hit max_output_tokens')
+    try:
+        text = response.text
+    except ValueError as e:  # no text parts (blocked)
+        raise ReplyError('json', str(e))
+    return validate(parse_json_text(text), *args)
+
+
+# ─── Validators: return a cleaned copy or raise ReplyError('schema', ...) ────
+
+def _fail(message):
+    raise ReplyError('schema', message)
+
+
+def _text(value, field, required=True):
+    if value is None or value == '':
+        if required:
+            _fail(f'{field} is missing')
+        return ''
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if not isinstance(value, str):
+        _fail(f'{field} is not a string')
+    return value.strip()
+
+
+def _unit(value, field):
+    try:
+        return min(1.0, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        _fail(f'{field} is not a number')
+
+
+def _choice(value, field, choices):
+    value = _text(value, field).lower()
+    if value not in choices:
+        _fail(f'{field} must be one of {", ".join(choices)}')
+    return value
+
+
+def _strings(value, field, count):
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        _fail(f'{field} are not a list of strings')
+    if len(value) != count:
+        _fail(f'expected {count} {field}, got {len(value)}')
+    return value
+
+
+def _conditions(value):
+    return [
+        {
+            'name': _text(c.get('name'), f'possible_conditions[{i}].name'),
+            'likelihood': _choice(c.get('likelihood'), f'possible_conditions[{i}].likelihood', LIKELIHOODS),
+            'explanation': _text(c.get('explanation'), f'possible_conditions[{i}].explanation', required=False),
+            'cause': _text(c.get('cause'), f'possible_conditions[{i}].cause', required=False),
+        }
+        for i, c in enumerate(_objects(value, 'possible_conditions'))
+    ]
+
+
+def _objects(value, field):
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+        _fail(f'{field} is not a list of objects')
+    return value
+
+
+def validate_triage(data):
+    if not isinstance(data, dict):
+        _fail('triage reply is not an object')
+    diseases = []
+    for i, d in enumerate(_objects(data.get('possible_diseases'), 'possible_diseases')[:3]):
+        disease = {'name': _text(d.get('name'), f'possible_diseases[{i}].name'),
+                   'probability': _unit(d.get('probability', 0), f'possible_diseases[{i}].probability')}
+        if d.get('notes'):
+            disease['notes'] = _text(d['notes'], f'possible_diseases[{i}].notes')
+        diseases.append(disease)
+    return {
+        'urgency': _choice(data.get('urgency'), 'urgency', URGENCY_LEVELS),
+        'speciality': _text(data.get('speciality'), 'speciality'),
+        'possible_diseases': diseases,
+        'confidence': _unit(data.get('confidence', 0.5), 'confidence'),
+    }
+
+
+def validate_lab_report(data, translations=False):
+    if not isinstance(data, dict):
+        _fail('lab report reply is not an object')
+    if data.get('error'):
+        return {'error': _text(data['error'], 'error')}
+    result = {
+        'report_type': _text(data.get('report_type'), 'report_type'),
+        'parameters': [
+            {
+                'name': _text(p.get('name'), f'parameters[{i}].name'),
+                'value': _text(p.get('value'), f'parameters[{i}].value'),
+                'normal_range': _text(p.get('normal_range'), f'parameters[{i}].normal_range', required=False),
+                'status': _choice(p.get('status'), f'parameters[{i}].status', LAB_STATUSES),
+                'simple_explanation': _text(p.get('simple_explanation'), f'parameters[{i}].simple_explanation',
+                                            required=False),
+            }
+            for i, p in enumerate(_objects(data.get('parameters'), 'parameters'))
+        ],
+        'overall_summary': _text(data.get('overall_summary'), 'overall_summary'),
+        'possible_conditions': _conditions(data.get('possible_conditions')),
+        'recommendation': _text(data.get('recommendation'), 'recommendation', required=False),
+        # A constant: not worth output tokens
+        'disclaimer': _text(data.get('disclaimer'), 'disclaimer', required=False) or LAB_DISCLAIMER,
+    }
+    if not result['parameters']:
+        _fail('parameters is empty')
+    if translations:
+        result['translations'] = data.get('translations')
+    return result
+
+
+def validate_translations(data, count):
+    """A list of `count` translated strings."""
+    return _strings(data, 'translations', count)
+
+
+def validate_lab_explanation(data, count):
+    """Text for `count` locally read lab values; see gemini.explain_lab_values."""
+    if not isinstance(data, dict):
+        _fail('lab explanation reply is not an object')
+    return {
+        'report_type': _text(data.get('report_type'), 'report_type', required=False),
+        'explanations': _strings(data.get('explanations'), 'explanations', count),
+        'overall_summary': _text(data.get('overall_summary'), 'overall_summary'),
+        'possible_conditions': _conditions(data.get('possible_conditions')),
+        'recommendation': _text(data.get('recommendation'), 'recommendation', required=False),
+        'disclaimer': _text(data.get('disclaimer'), 'disclaimer', required=False),
+    }
@@ -0,0 +1,164 @@
+"""
+Local stand-in for the Gemini API, for benchmarks and load tests.
+
+Set `settings.GEMINI_STUB` to a dict, and get_client() returns a
+StubGeminiClient instead of calling Google. Only the transport is replaced:
+GeminiClient's deadline, retries, circuit breaker and metrics still run, so
+a load test exercises the same code path as production.
+
+    GEMINI_STUB = {
+        'LATENCY': 0.8,         # mean seconds per call
+        'JITTER': 0.2,          # standard deviation of the latency
+        'FAILURE_RATE': 0.02,   # share of calls raising ServiceUnavailable
+    }
+
+Replies are canned, schema-valid JSON for triage, lab reports (optionally
+with translations), explanations of locally read lab values and translations. Each reply carries usage metadata.
+Like the real model, the stub honours a per-call generation_config: JSON mode
+gives compact JSON, free text comes back pretty-printed in a ```json fence,
+and a reply longer than max_output_tokens is cut off with finish reason
+MAX_TOKENS.
+
+With stream=True the reply is cut into small chunks: the first arrives after
+a quarter of the drawn latency and the rest are spread over the remainder.
+"""
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from google.api_core import exceptions as api_exceptions
+
+from core.utils.gemini import LAB_VALUES_MARKER, TRANSLATION_SOURCE_MARKER, lab_translation_source
+from core.utils.gemini_client import DEFAULT_MODEL, GeminiClient
+from core.utils.gemini_schemas import LAB_DISCLAIMER
+
+TRIAGE_REPLY = {
+    "urgency": "medium",
+    "speciality": "General Medicine",
+    "possible_diseases": [
+        {"name": "Viral Infection", "probability": 0.6, "notes": "Common viral pattern"},
+        {"name": "Dengue Fever", "probability": 0.25, "notes": "Seasonal, fever with body ache"},
+    ],
+    "confidence": 0.7,
+}
+
+LAB_REPLY = {
+    "report_type": "Complete Blood Count",
+    "parameters": [
+        {"name": "Hemoglobin", "value": "11.2 g/dL", "normal_range": "12-16 g/dL", "status": "low",
+         "simple_explanation": "Slightly low oxygen-carrying protein."},
+        {"name": "WBC", "value": "7,400 /uL", "normal_range": "4,000-11,000 /uL", "status": "normal",
+         "simple_explanation": "Infection-fighting cells are normal."},
+    ],
+    "overall_summary": "Mild anemia; everything else is within range.",
+    "possible_conditions": [
+        {"name": "Iron deficiency anemia", "likelihood": "possible",
+         "explanation": "Low hemoglobin is often due to low iron.", "cause": "Diet or blood loss"},
+    ],
+    "recommendation": "Discuss iron studies with your doctor.",
+}
+
+
+class StubStream:
+    """Iterable of reply chunks paced over `delay` seconds, like a streamed response."""
+    CHUNK_CHARS = 24
+    FIRST_CHUNK_SHARE = 0.25
+
+    def __init__(self, text, delay, usage, candidates):
+        self.text = text
+        self.usage_metadata = usage
+        self.candidates = candidates
+        self._delay = delay
+
+    def __iter__(self):
+        pieces = [self.text[i:i + self.CHUNK_CHARS] for i in range(0, len(self.text), self.CHUNK_CHARS)]
+        time.sleep(self._delay * self.FIRST_CHUNK_SHARE)
+        step = self._delay * (1 - self.FIRST_CHUNK_SHARE) / max(1, len(pieces) - 1)
+        for n, piece in enumerate(pieces):
+            if n:
+                time.sleep(step)
+            yield SimpleNamespace(text=piece)
+
+
+class StubModel:
+    def __init__(self, config):
+        self.latency = float(config.get('LATENCY', 0.8))
+        self.jitter = float(config.get('JITTER', 0.2))
+        self.failure_rate = float(config.get('FAILURE_RATE', 0.0))
+        self._rng = random.Random(config.get('SEED'))
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, request_options=None, stream=False, generation_config=None, **kwargs):
+        timeout = (request_options or {}).get('timeout')
+        with self._lock:
+            delay = max(0.0, self._rng.gauss(self.latency, self.jitter))
+            fail = self._rng.random() < self.failure_rate
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise api_exceptions.DeadlineExceeded('stub: deadline exceeded')
+        if fail:
+            time.sleep(delay * StubStream.FIRST_CHUNK_SHARE if stream else delay)
+            raise api_exceptions.ServiceUnavailable('stub: injected failure')
+
+        config = generation_config or {}
+        prompt = contents[0] if isinstance(contents, list) else contents
+        reply = self.reply(prompt, isinstance(contents, list))
+        if config.get('response_mime_type') == 'application/json':
+            text = json.dumps(reply, ensure_ascii=False, separators=(',', ':'))
+        else:
+            text = '```json\n' + json.dumps(reply, ensure_ascii=False, indent=2) + '\n```'
+        finish = 'STOP'
+        budget = config.get('max_output_tokens')
+        if budget and len(text) // 4 > budget:
+            text, finish = text[:budget * 4], 'MAX_TOKENS'
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+        candidates = [SimpleNamespace(finish_reason=SimpleNamespace(name=finish))]
+        if stream:
+            return StubStream(text, delay, usage, candidates)
+        time.sleep(delay)
+        return SimpleNamespace(text=text, usage_metadata=usage, candidates=candidates)
+
+    def reply(self, prompt, multimodal):
+        if multimodal:
+            reply = json.loads(json.dumps(LAB_REPLY))
+            if '"translations"' in prompt:
+                source = lab_translation_source({**reply, 'disclaimer': LAB_DISCLAIMER})
+                reply['translations'] = [f'[t] {text}' for text in source.values()]
+            return reply
+        if LAB_VALUES_MARKER in prompt:
+            rows = [line for line in prompt.split(LAB_VALUES_MARKER, 1)[1].splitlines()
+                    if line[:1].isdigit() and '. ' in line]
+            return {
+                "explanations": [f"Explanation of {row.split('. ', 1)[1].split(':', 1)[0]}." for row in rows],
+                "overall_summary": LAB_REPLY["overall_summary"],
+                "possible_conditions": LAB_REPLY["possible_conditions"],
+                "recommendation": LAB_REPLY["recommendation"],
+            }
+        if TRANSLATION_SOURCE_MARKER in prompt:
+            source = json.loads(prompt.split(TRANSLATION_SOURCE_MARKER, 1)[1])
+            return [f'[t] {text}' for text in source]
+        return TRIAGE_REPLY
+
+
+class StubGeminiClient(GeminiClient):
+    """GeminiClient whose models are StubModels; no API key or network needed."""
+
+    def __init__(self, config, model_name=None):
+        self.model_name = model_name or DEFAULT_MODEL
+        self._models = {}
+        self._lock = threading.Lock()
+        self.warmed_up = True
+        self._breakers = {}
+        self._stub = StubModel(config)
+
+    def model(self, name=None, **kwargs):
+        return self._stub
+
+    def warm_up(self):
+        return True
+
+    def health(self):
+        return {'ok': True, 'model': f'{self.model_name} (stub)', 'latency_ms': 0.0, 'error': None,
+                'breakers': self.breaker_snapshots()}
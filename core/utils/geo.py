@@ -0,0 +1,98 @@
+"""
+In-memory spatial index for nearest-hospital lookups.
+
+Hospitals are bucketed into a lat/lng grid of `SPATIAL_INDEX_CELL_DEG` degrees.
+A query only visits the cells that can intersect its radius and ranks the
+candidates by great-circle distance, so cost tracks local density rather than
+catalogue size. The index is built lazily per process and rebuilt after
+Hospital.save/delete or once `SPATIAL_INDEX_TTL` seconds have passed.
+"""
+import heapq
+import math
+import threading
+import time
+
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 111.32
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """Grid-bucketed points: {(row, col): [(lat, lng, id, specialities), ...]}."""
+
+    def __init__(self, points, cell_deg=0.25):
+        self.cell_deg = cell_deg
+        self.size = 0
+        self.buckets = {}
+        for lat, lng, pk, specialities in points:
+            self.buckets.setdefault(self._cell(lat, lng), []).append(
+                (lat, lng, pk, frozenset(specialities or ()))
+            )
+            self.size += 1
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg))
+
+    def _candidate_cells(self, lat, lng, radius_km):
+        row, col = self._cell(lat, lng)
+        d_rows = math.ceil(radius_km / (KM_PER_DEG_LAT * self.cell_deg))
+        # Longitude degrees shrink towards the poles; clamp so the span stays finite
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + d_rows * self.cell_deg, 89.0))), 0.01)
+        d_cols = math.ceil(radius_km / (KM_PER_DEG_LAT * cos_lat * self.cell_deg))
+
+        # A wide radius over a sparse grid is cheaper to answer by walking buckets
+        if (2 * d_rows + 1) * (2 * d_cols + 1) >= len(self.buckets):
+            return list(self.buckets.keys())
+        return [
+            (r, c)
+            for r in range(row - d_rows, row + d_rows + 1)
+            for c in range(col - d_cols, col + d_cols + 1)
+            if (r, c) in self.buckets
+        ]
+
+    def nearest(self, lat, lng, k=10, radius_km=25.0, speciality=None):
+        """Return up to k (distance_km, id) pairs within radius_km, closest first."""
+        results = []
+        for cell in self._candidate_cells(lat, lng, radius_km):
+            for p_lat, p_lng, pk, specialities in self.buckets[cell]:
+                if speciality and speciality not in specialities:
+                    continue
+                distance = haversine_km(lat, lng, p_lat, p_lng)
+                if distance <= radius_km:
+                    results.append((distance, pk))
+        return heapq.nsmallest(k, results)
+
+
+_index = None
+_built_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_spatial_index():
+    """Process-wide index, rebuilt after invalidation or once its TTL expires."""
+    global _index, _built_at
+    ttl = getattr(settings, 'SPATIAL_INDEX_TTL', 600)
+    if _index is None or time.monotonic() - _built_at > ttl:
+        with _index_lock:
+            if _index is None or time.monotonic() - _built_at > ttl:
+                from core.models import Hospital
+                points = Hospital.objects.values_list('lat', 'lng', 'id', 'specialities').iterator()
+                _index = SpatialIndex(points, getattr(settings, 'SPATIAL_INDEX_CELL_DEG', 0.25))
+                _built_at = time.monotonic()
+    return _index
+
+
+def invalidate_spatial_index():
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,26 @@
+"""
+Cached dropdown facets (distinct cities / pincodes) for the hospital listing.
+
+Hospital.save/delete bump the cache so edits show up immediately; bulk writes
+that bypass the model are covered by `HOSPITAL_FACETS_TTL`.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+FACETS_CACHE_KEY = 'core:hospital_facets'
+
+
+def get_filter_facets():
+    facets = cache.get(FACETS_CACHE_KEY)
+    if facets is None:
+        from core.models import Hospital
+        facets = {
+            'cities': list(Hospital.objects.values_list('city', flat=True).distinct().order_by('city')),
+            'pincodes': list(Hospital.objects.values_list('pincode', flat=True).distinct().order_by('pincode')),
+        }
+        cache.set(FACETS_CACHE_KEY, facets, getattr(settings, 'HOSPITAL_FACETS_TTL', 300))
+    return facets
+
+
+def invalidate_filter_facets():
+    cache.delete(FACETS_CACHE_KEY)
@@ -0,0 +1,109 @@
+"""
+Incremental parser for a JSON object that arrives in pieces (streamed model
+output).
+
+Feed text chunks as they come; each call returns the members completed by
+that chunk, so a caller can act on "urgency": "high" long before the closing
+brace arrives. Elements of a top-level array are reported one by one as well.
+Anything before the opening brace (a ```json fence, say) is skipped.
+
+    parser = JsonObjectStream()
+    for chunk in chunks:
+        for kind, key, value in parser.feed(chunk):
+            ...   # ('item', 'possible_diseases', {...}) or ('field', 'urgency', 'high')
+    parser.done, parser.fields   # True and the whole object once it closed
+
+A malformed member raises ValueError (json.JSONDecodeError).
+"""
+import json
+
+
+class JsonObjectStream:
+    def __init__(self):
+        self.fields = {}
+        self.done = False
+        self._buffer = ''
+        self._pos = 0            # next character to scan
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._key = None
+        self._key_start = None   # opening quote of the current top-level key
+        self._value_start = None
+        self._is_array = False   # the current top-level value is an array
+        self._item_start = None  # first character of the current array element
+
+    def feed(self, text):
+        """Consume `text`; returns a list of ('field'|'item', key, value) events."""
+        self._buffer += text
+        events = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer) and not self.done:
+            c = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._value_start is None:
+                        self._key = json.loads(buffer[self._key_start:i + 1])
+            elif not self._started:
+                if c == '{':
+                    self._started = True
+                    self._depth = 1
+            elif c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._value_start is None:
+                    self._key_start = i
+                else:
+                    self._mark_item(i)
+            elif c == ':' and self._depth == 1 and self._value_start is None:
+                self._value_start = i + 1
+            elif c in '{[':
+                if self._depth == 1 and c == '[' and not buffer[self._value_start:i].strip():
+                    self._is_array = True
+                else:
+                    self._mark_item(i)
+                self._depth += 1
+            elif c in '}]':
+                self._depth -= 1
+                if self._depth == 2 and self._item_start is not None:
+                    # An object or array element of a top-level array closed
+                    events.append(self._end_item(i + 1))
+                elif self._depth == 1 and self._is_array and self._item_start is not None:
+                    events.append(self._end_item(i))
+                elif self._depth == 0:
+                    if self._value_start is not None:
+                        events.append(self._end_field(i))
+                    self.done = True
+            elif c == ',':
+                if self._depth == 1 and self._value_start is not None:
+                    events.append(self._end_field(i))
+                elif self._depth == 2 and self._item_start is not None:
+                    events.append(self._end_item(i))
+            elif not c.isspace():
+                self._mark_item(i)
+            i += 1
+        self._pos = i
+        return events
+
+    def _mark_item(self, i):
+        if self._depth == 2 and self._is_array and self._item_start is None:
+            self._item_start = i
+
+    def _end_item(self, end):
+        value = json.loads(self._buffer[self._item_start:end])
+        self._item_start = None
+        return 'item', self._key, value
+
+    def _end_field(self, end):
+        value = json.loads(self._buffer[self._value_start:end])
+        self.fields[self._key] = value
+        key = self._key
+        self._key = self._value_start = None
+        self._is_array = False
+        return 'field', key, value
@@ -0,0 +1,242 @@
+"""
+Lab report uploads: size limits and shrinking before the multimodal call.
+
+LabUpload reads the upload in chunks to hash it and enforce
+LAB_UPLOAD_MAX_BYTES; the file itself stays where Django's upload handler put
+it (in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE, a temporary file beyond), so
+the raw upload is never copied into one bytes object. prepare() builds what is
+sent to Gemini, only when a call is actually needed:
+
+- images (Pillow): EXIF rotation applied, grayscale, longer side at most
+  LAB_IMAGE_MAX_SIDE, re-encoded as JPEG at LAB_IMAGE_QUALITY. Gemini bills
+  images in 768 px tiles, so the side limit also caps the image tokens.
+- PDFs (pypdf): blank pages (nothing drawn, or one empty scan) and pages
+  identical to an earlier page are dropped; more than LAB_PDF_MAX_PAGES
+  remaining pages are refused.
+
+Whichever is smaller, the original or the shrunk file, is sent. Pillow and
+pypdf are in requirements.txt; where they are missing the upload goes out as
+it came in. The
+content hash is always taken of the original bytes, so re-uploads still match
+LabReportHistory.
+"""
+import hashlib
+import io
+import time
+
+from django.conf import settings
+
+from core.utils import metrics
+
+try:
+    from PIL import Image, ImageOps, ImageStat
+except ImportError:  # optional: images are sent as uploaded
+    Image = None
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # optional: PDFs are sent as uploaded
+    PdfReader = None
+
+DEFAULT_MAX_BYTES = 15 * 1024 * 1024
+DEFAULT_IMAGE_MAX_SIDE = 1536
+DEFAULT_IMAGE_QUALITY = 80
+DEFAULT_PDF_MAX_PAGES = 20
+
+# A scanned page whose pixels all sit within this many grey levels is blank
+BLANK_PAGE_SPREAD = 12
+# Content stream operators of a page that only places a scanned image
+IMAGE_OPERATORS = {b'q', b'Q', b'cm', b'Do', b'gs'}
+
+
+class UploadRejected(ValueError):
+    """An upload refused before analysis; the message is shown to the user."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def max_upload_bytes():
+    return getattr(settings, 'LAB_UPLOAD_MAX_BYTES', DEFAULT_MAX_BYTES)
+
+
+class LabUpload:
+    """An uploaded lab report, hashed and size-checked; prepare() gives the bytes to send."""
+
+    def __init__(self, file_obj, mime_type):
+        limit = max_upload_bytes()
+        too_large = UploadRejected(f'File is too large. Please upload a report under {limit // (1024 * 1024)} MB.',
+                                   status=413)
+        if file_obj.size is not None and file_obj.size > limit:
+            raise too_large
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in file_obj.chunks():
+            size += len(chunk)
+            if size > limit:
+                raise too_large
+            digest.update(chunk)
+        self.file = file_obj
+        self.name = file_obj.name
+        self.mime_type = mime_type
+        self.size = size
+        self.content_hash = digest.hexdigest()
+        self._prepared = None
+
+    def read_original(self):
+        self.file.seek(0)
+        return self.file.read()
+
+    def prepare(self):
+        """(file_bytes, mime_type) for Gemini; raises UploadRejected for files that cannot be sent."""
+        if self._prepared is None:
+            start = time.perf_counter()
+            kind = 'pdf' if self.mime_type == 'application/pdf' else 'image'
+            shrink = shrink_pdf if kind == 'pdf' else shrink_image
+            self.file.seek(0)
+            try:
+                shrunk = shrink(self.file)
+            except UploadRejected:
+                metrics.LAB_UPLOADS.inc(kind=kind, outcome='rejected')
+                raise
+            if shrunk is None:
+                outcome = 'unsupported' if (Image if kind == 'image' else PdfReader) is None else 'unreadable'
+                self._prepared = (self.read_original(), self.mime_type, [])
+            elif shrunk[0] is not None and len(shrunk[0]) < self.size:
+                outcome = 'shrunk'
+                self._prepared = shrunk
+            else:
+                outcome = 'unchanged'
+                self._prepared = (self.read_original(), self.mime_type, shrunk[2])
+            metrics.LAB_UPLOADS.inc(kind=kind, outcome=outcome)
+            metrics.LAB_UPLOAD_BYTES.observe(self.size, kind=kind, stage='uploaded')
+            metrics.LAB_UPLOAD_BYTES.observe(len(self._prepared[0]), kind=kind, stage='sent')
+            steps = ', '.join(self._prepared[2]) or outcome
+            print(f"Lab upload {self.name!r}: {self.size} -> {len(self._prepared[0])} bytes "
+                  f"({self.size - len(self._prepared[0])} saved; {steps}) in {time.perf_counter() - start:.2f}s")
+        return self._prepared[0], self._prepared[1]
+
+
+# ─── Images ───────────────────────────────────────────────────────────────────
+
+def shrink_image(fileobj, max_side=None, quality=None):
+    """(jpeg_bytes, 'image/jpeg', steps), or None without Pillow or for an unreadable image."""
+    if Image is None:
+        return None
+    max_side = max_side or getattr(settings, 'LAB_IMAGE_MAX_SIDE', DEFAULT_IMAGE_MAX_SIDE)
+    quality = quality or getattr(settings, 'LAB_IMAGE_QUALITY', DEFAULT_IMAGE_QUALITY)
+    try:
+        image = Image.open(fileobj)
+        width, height = image.size
+        # JPEG can decode straight to a smaller grayscale image
+        image.draft('L', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        steps = ['grayscale']
+        image = image.convert('L')
+        if max(width, height) > max_side:
+            steps.append(f'{width}x{height} downscaled')
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, 'JPEG', quality=quality, optimize=True)
+    except Image.DecompressionBombError:
+        raise UploadRejected('Image resolution is too large. Please upload a smaller photo or scan.')
+    except (OSError, ValueError, SyntaxError) as e:
+        print(f"Lab upload image preprocessing skipped: {e}")
+        return None
+    steps.append(f'jpeg q{quality}')
+    return out.getvalue(), 'image/jpeg', steps
+
+
+# ─── PDFs ─────────────────────────────────────────────────────────────────────
+
+def _page_images(page):
+    """Image XObjects drawn directly by a page."""
+    resources = page.get('/Resources')
+    xobjects = resources.get_object().get('/XObject') if resources else None
+    if not xobjects:
+        return []
+    xobjects = xobjects.get_object()
+    return [xobjects[name].get_object() for name in xobjects
+            if xobjects[name].get_object().get('/Subtype') == '/Image']
+
+
+def _operators(page):
+    """The set of operators in a page's content stream (empty when it has none)."""
+    contents = page.get_contents()
+    if contents is None:
+        return set()
+    return {operator for _, operator in contents.operations}
+
+
+def _is_blank(page, images):
+    if page.extract_text().strip():
+        return False
+    operators = _operators(page)
+    if not images:
+        # Nothing drawn at all; vector-only pages (charts, graphs) are kept
+        return not operators
+    if Image is None or len(images) > 1 or operators - IMAGE_OPERATORS:
+        return False
+    # A scan of an empty sheet: one image with (almost) no contrast
+    try:
+        scan = page.images[0].image.convert('L')
+    except Exception:
+        return False
+    scan.thumbnail((128, 128))
+    low, high = ImageStat.Stat(scan).extrema[0]
+    return high - low <= BLANK_PAGE_SPREAD
+
+
+def _fingerprint(page, images):
+    digest = hashlib.sha256()
+    contents = page.get_contents()
+    digest.update(contents.get_data() if contents is not None else b'')
+    for image in images:
+        digest.update(image.get_data())
+    return digest.digest()
+
+
+def shrink_pdf(fileobj, max_pages=None):
+    """
+    (pdf_bytes, 'application/pdf', steps), with pdf_bytes None when no page was
+    dropped; None without pypdf or for an unreadable or encrypted PDF.
+    """
+    if PdfReader is None:
+        return None
+    max_pages = max_pages or getattr(settings, 'LAB_PDF_MAX_PAGES', DEFAULT_PDF_MAX_PAGES)
+    try:
+        reader = PdfReader(fileobj)
+        if reader.is_encrypted:
+            return None
+        writer = PdfWriter()
+        seen = set()
+        blank = duplicate = 0
+        for page in reader.pages:
+            images = _page_images(page)
+            if _is_blank(page, images):
+                blank += 1
+                continue
+            fingerprint = _fingerprint(page, images)
+            if fingerprint in seen:
+                duplicate += 1
+                continue
+            seen.add(fingerprint)
+            writer.add_page(page)
+        if not seen:
+            return None  # nothing recognisable left; let Gemini look at the original
+        if len(seen) > max_pages:
+            raise UploadRejected(f'The report has {len(seen)} pages. Please upload at most {max_pages}.')
+        steps = [f'{len(reader.pages)} pages']
+        if not blank and not duplicate:
+            return None, 'application/pdf', steps  # nothing to drop: the original goes out
+        steps += [f'{blank} blank dropped', f'{duplicate} duplicate dropped']
+        writer.compress_identical_objects()
+        out = io.BytesIO()
+        writer.write(out)
+    except UploadRejected:
+        raise
+    except Exception as e:  # pypdf raises a range of errors on damaged files
+        print(f"Lab upload PDF preprocessing skipped: {e}")
+        return None
+    return out.getvalue(), 'application/pdf', steps
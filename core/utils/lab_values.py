@@ -0,0 +1,364 @@
+"""
+Local lab value extraction: reads machine-generated PDF reports without
+Gemini Vision.
+
+The PDF's text layer (pypdf, optional) is split into lines and each line is
+matched against one trie regex of analyte names for the common panels (CBC,
+lipid, thyroid, liver and kidney function). A recognised row is parsed into
+value, unit and printed reference range, and its status is decided here:
+
+    printed range on the row   -> compared in the row's own units
+    otherwise                  -> REFERENCE_RANGES below, after converting
+                                  the value to the table's unit
+
+so the same report always gets the same statuses. read_lab_values() returns
+a partial analysis ({report_type, parameters}) for gemini.explain_lab_values,
+which only asks the model for the plain-language text. Scanned PDFs, images,
+reports with fewer than LAB_LOCAL_MIN_PARAMETERS recognised rows and reports
+with any result-shaped row (name, value, range) that is not read here return
+None and go to the vision call as before, so no result is silently dropped.
+"""
+import io
+import re
+
+from django.conf import settings
+
+from core.utils import metrics
+from core.utils.gemini_schemas import LAB_DISCLAIMER
+from core.utils.speciality_mapper import compile_matcher
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # optional: every report goes to Gemini Vision
+    PdfReader = None
+
+DEFAULT_MIN_PARAMETERS = 3
+MAX_TEXT_PAGES = 20
+
+PANELS = {
+    'cbc': 'Complete Blood Count',
+    'lipid': 'Lipid Profile',
+    'thyroid': 'Thyroid Profile',
+    'lft': 'Liver Function Test',
+    'kft': 'Kidney Function Test',
+}
+
+# Unit spellings (normalised by unit_key) -> factor to the table's unit
+COUNT_THOUSANDS = {'10^3/ul': 1, '10^3/cumm': 1, 'thou/ul': 1, 'thou/cumm': 1, 'k/ul': 1, '10^9/l': 1,
+                   '/cumm': 0.001, 'cells/cumm': 0.001, '/ul': 0.001, 'cells/ul': 0.001}
+MILLIONS = {'million/ul': 1, 'mill/cumm': 1, 'million/cumm': 1, 'millions/cumm': 1, '10^6/ul': 1, '10^12/l': 1}
+PERCENT = {'%': 1}
+G_DL = {'g/dl': 1, 'gm/dl': 1, 'g%': 1, 'gm%': 1, 'g/l': 0.1}
+MG_DL = {'mg/dl': 1, 'mg%': 1}
+U_L = {'u/l': 1, 'iu/l': 1}
+MMOL_L = {'mmol/l': 1, 'meq/l': 1}
+
+# name: (panel, aliases, unit, (low, high), units); None is an open end of the range
+REFERENCE_RANGES = {
+    'Hemoglobin': ('cbc', ['hemoglobin', 'haemoglobin', 'hb', 'hgb'], 'g/dL', (12.0, 17.0), G_DL),
+    'RBC Count': ('cbc', ['rbc count', 'total rbc count', 'rbc', 'red blood cell count', 'erythrocyte count'],
+                  'million/uL', (4.0, 5.9), MILLIONS),
+    'WBC Count': ('cbc', ['wbc count', 'total wbc count', 'wbc', 'total leucocyte count', 'total leukocyte count',
+                          'tlc', 'white blood cell count'], '10^3/uL', (4.0, 11.0), COUNT_THOUSANDS),
+    'Platelet Count': ('cbc', ['platelet count', 'platelets', 'plt'], '10^3/uL', (150, 450),
+                       {**COUNT_THOUSANDS, 'lakh/cumm': 100, 'lakhs/cumm': 100, 'lakh/ul': 100, 'lakhs/ul': 100}),
+    'Hematocrit (PCV)': ('cbc', ['hematocrit', 'haematocrit', 'hct', 'pcv', 'packed cell volume'], '%',
+                         (36, 50), PERCENT),
+    'MCV': ('cbc', ['mcv', 'mean corpuscular volume'], 'fL', (80, 100), {'fl': 1, 'cu.micron': 1}),
+    'MCH': ('cbc', ['mch', 'mean corpuscular hemoglobin', 'mean corpuscular haemoglobin'], 'pg', (27, 33),
+            {'pg': 1}),
+    'MCHC': ('cbc', ['mchc', 'mean corpuscular hemoglobin concentration',
+                     'mean corpuscular haemoglobin concentration'], 'g/dL', (32, 36), {**G_DL, '%': 1}),
+    'RDW': ('cbc', ['rdw', 'rdw-cv', 'red cell distribution width'], '%', (11.5, 14.5), PERCENT),
+    'Neutrophils': ('cbc', ['neutrophils', 'neutrophil', 'polymorphs'], '%', (40, 75), PERCENT),
+    'Lymphocytes': ('cbc', ['lymphocytes', 'lymphocyte'], '%', (20, 40), PERCENT),
+    'Monocytes': ('cbc', ['monocytes', 'monocyte'], '%', (2, 10), PERCENT),
+    'Eosinophils': ('cbc', ['eosinophils', 'eosinophil'], '%', (1, 6), PERCENT),
+    'Basophils': ('cbc', ['basophils', 'basophil'], '%', (0, 2), PERCENT),
+    'ESR': ('cbc', ['esr', 'erythrocyte sedimentation rate'], 'mm/hr', (0, 20), {'mm/hr': 1, 'mm/1sthr': 1}),
+
+    'Total Cholesterol': ('lipid', ['total cholesterol', 'cholesterol total', 'cholesterol', 'serum cholesterol'],
+                          'mg/dL', (None, 200), {**MG_DL, 'mmol/l': 38.67}),
+    'Triglycerides': ('lipid', ['triglycerides', 'triglyceride', 'tg', 'serum triglycerides'], 'mg/dL',
+                      (None, 150), {**MG_DL, 'mmol/l': 88.57}),
+    'HDL Cholesterol': ('lipid', ['hdl cholesterol', 'hdl', 'hdl-c', 'hdl cholesterol direct'], 'mg/dL',
+                        (40, None), {**MG_DL, 'mmol/l': 38.67}),
+    'LDL Cholesterol': ('lipid', ['ldl cholesterol', 'ldl', 'ldl-c', 'ldl cholesterol direct'], 'mg/dL',
+                        (None, 100), {**MG_DL, 'mmol/l': 38.67}),
+    'VLDL Cholesterol': ('lipid', ['vldl cholesterol', 'vldl'], 'mg/dL', (None, 30), MG_DL),
+    # Listed so "Total Cholesterol/HDL Ratio" is not read as a cholesterol value
+    'Cholesterol/HDL Ratio': ('lipid', ['total cholesterol/hdl ratio', 'cholesterol/hdl ratio', 'tc/hdl ratio',
+                                        'chol/hdl ratio'], '', (None, 5.0), {}),
+    'LDL/HDL Ratio': ('lipid', ['ldl/hdl ratio'], '', (None, 3.5), {}),
+
+    'TSH': ('thyroid', ['tsh', 'thyroid stimulating hormone', 'tsh ultrasensitive'], 'uIU/mL', (0.4, 4.5),
+            {'uiu/ml': 1, 'miu/l': 1, 'uu/ml': 1}),
+    'Free T3': ('thyroid', ['free t3', 'ft3', 'free triiodothyronine'], 'pg/mL', (2.0, 4.4), {'pg/ml': 1}),
+    'Free T4': ('thyroid', ['free t4', 'ft4', 'free thyroxine'], 'ng/dL', (0.8, 1.8), {'ng/dl': 1}),
+    'Total T3': ('thyroid', ['total t3', 't3 total', 't3', 'triiodothyronine'], 'ng/dL', (80, 200),
+                 {'ng/dl': 1, 'ng/ml': 100}),
+    'Total T4': ('thyroid', ['total t4', 't4 total', 't4', 'thyroxine'], 'ug/dL', (5.0, 12.0), {'ug/dl': 1}),
+
+    'Total Bilirubin': ('lft', ['total bilirubin', 'bilirubin total', 'bilirubin (total)', 'serum bilirubin total',
+                                'serum bilirubin'], 'mg/dL', (0.2, 1.2), {**MG_DL, 'umol/l': 0.0585}),
+    'Direct Bilirubin': ('lft', ['direct bilirubin', 'bilirubin direct', 'bilirubin (direct)',
+                                 'conjugated bilirubin'], 'mg/dL', (0, 0.3), {**MG_DL, 'umol/l': 0.0585}),
+    'Indirect Bilirubin': ('lft', ['indirect bilirubin', 'bilirubin indirect', 'bilirubin (indirect)',
+                                   'unconjugated bilirubin'], 'mg/dL', (0.1, 1.0), {**MG_DL, 'umol/l': 0.0585}),
+    'SGOT (AST)': ('lft', ['sgot', 'ast', 'sgot (ast)', 'ast (sgot)', 'aspartate aminotransferase'], 'U/L',
+                   (None, 40), U_L),
+    'SGPT (ALT)': ('lft', ['sgpt', 'alt', 'sgpt (alt)', 'alt (sgpt)', 'alanine aminotransferase'], 'U/L',
+                   (None, 40), U_L),
+    'Alkaline Phosphatase': ('lft', ['alkaline phosphatase', 'alp', 'serum alkaline phosphatase'], 'U/L',
+                             (44, 147), U_L),
+    'GGT': ('lft', ['ggt', 'gamma gt', 'ggtp', 'gamma glutamyl transferase'], 'U/L', (None, 60), U_L),
+    'Total Protein': ('lft', ['total protein', 'total proteins', 'protein total', 'serum protein'], 'g/dL',
+                      (6.0, 8.3), G_DL),
+    'Albumin': ('lft', ['albumin', 'serum albumin'], 'g/dL', (3.5, 5.0), G_DL),
+    'Globulin': ('lft', ['globulin', 'serum globulin'], 'g/dL', (2.0, 3.5), G_DL),
+    'A/G Ratio': ('lft', ['a/g ratio', 'albumin/globulin ratio', 'a:g ratio'], '', (1.0, 2.2), {}),
+
+    'Urea': ('kft', ['urea', 'blood urea', 'serum urea'], 'mg/dL', (15, 40), {**MG_DL, 'mmol/l': 6.0}),
+    'Blood Urea Nitrogen': ('kft', ['bun', 'blood urea nitrogen', 'urea nitrogen'], 'mg/dL', (7, 20),
+                            {**MG_DL, 'mmol/l': 2.8}),
+    'Creatinine': ('kft', ['creatinine', 'serum creatinine', 's. creatinine', 's.creatinine'], 'mg/dL', (0.6, 1.3),
+                   {**MG_DL, 'umol/l': 1 / 88.4}),
+    'Uric Acid': ('kft', ['uric acid', 'serum uric acid'], 'mg/dL', (3.5, 7.2), {**MG_DL, 'umol/l': 1 / 59.48}),
+    'eGFR': ('kft', ['egfr', 'estimated gfr'], 'mL/min/1.73m2', (60, None),
+             {'ml/min/1.73m2': 1, 'ml/min/1.73m^2': 1, 'ml/min': 1}),
+    'Sodium': ('kft', ['sodium', 'serum sodium', 'na', 'na+'], 'mmol/L', (135, 145), MMOL_L),
+    'Potassium': ('kft', ['potassium', 'serum potassium', 'k', 'k+'], 'mmol/L', (3.5, 5.1), MMOL_L),
+    'Chloride': ('kft', ['chloride', 'serum chloride', 'cl', 'cl-'], 'mmol/L', (98, 107), MMOL_L),
+    'Calcium': ('kft', ['calcium', 'serum calcium', 'total calcium'], 'mg/dL', (8.5, 10.5),
+                {**MG_DL, 'mmol/l': 4.008}),
+}
+
+ALIASES = {alias: name for name, (_, aliases, *_rest) in REFERENCE_RANGES.items() for alias in aliases}
+ANALYTE_PATTERN = compile_matcher(ALIASES)
+
+NUMBER = r'\d[\d,]*(?:\.\d+)?|\.\d+'
+# Serial numbers and bullets in front of the test name
+ROW_PREFIX_RE = re.compile(r'^(?:\d{1,3}[.)]|[•*\-])\s*')
+SLASH_RE = re.compile(r'\s*/\s*')
+# A method or sample note right after the name: "Hemoglobin (Photometry)"
+NOTE_RE = re.compile(r'^[\s:\-–]*(?:\([^)]*\)[\s:\-–]*)*')
+VALUE_RE = re.compile(rf'^(?P<cmp>[<>]=?)?\s*(?P<num>{NUMBER})(?![\d^])')
+RANGE_RE = re.compile(
+    rf'(?P<low>{NUMBER})\s*(?:-|–|—|to)\s*(?P<high>{NUMBER})'
+    rf'|(?P<op><=?|≤|>=?|≥|up\s*to|upto|less\s+than|more\s+than|greater\s+than)\s*(?P<bound>{NUMBER})',
+    re.IGNORECASE,
+)
+# Ranges printed per sex ("Male: 13-17 Female: 12-15.5", "M: ... F: ...")
+SEX_LABEL_RE = re.compile(r'\b(?:fe)?males?\b|\b(?:wo)?men\b|\b[mf]\s*:', re.IGNORECASE)
+# Abnormal-value markers some labs print next to the result; '*' does not say which way
+FLAGS = {'h': 'high', 'hh': 'high', 'high': 'high', '↑': 'high',
+         'l': 'low', 'll': 'low', 'low': 'low', '↓': 'low', '*': None}
+# A line shaped like a result: a name, then a value (a reference range must follow)
+RESULT_LINE_RE = re.compile(rf'^[^\W\d][^:]*?\s*:?\s*(?:[<>]=?\s*)?(?:{NUMBER})\b')
+DATE_RE = re.compile(r'\b\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}\b')
+
+
+def unit_key(text):
+    """Normalise a printed unit for lookup: 'x10³/µL' -> '10^3/ul', 'cu mm' -> 'cumm'."""
+    key = text.lower().replace('µ', 'u').replace('μ', 'u').replace('³', '^3').replace('⁶', '^6')
+    key = key.replace(' ', '').replace('cu.mm', 'cumm').replace('mm^3', 'cumm').replace('mm3', 'cumm')
+    return key.lstrip('x×*').rstrip('.,;:')
+
+
+def _number(text):
+    return float(text.replace(',', ''))
+
+
+def _format_bound(value):
+    return f"{float(f'{value:.3g}'):g}"  # three significant digits, no exponent
+
+
+def classify(value, low, high):
+    if low is not None and value < low:
+        return 'low'
+    if high is not None and value > high:
+        return 'high'
+    return 'normal'
+
+
+def _find_unit(text, units):
+    for token in text.split():
+        key = unit_key(token)
+        if key in units:
+            return token, key
+    return None, None
+
+
+def parse_row(line):
+    """One report line -> parameter dict with status, or None when it is not a recognised result row."""
+    prefix = ROW_PREFIX_RE.match(line)
+    line = line[prefix.end():] if prefix else line
+    line = SLASH_RE.sub('/', line)  # 'Cholesterol / HDL Ratio', 'mg / dL'
+    lowered = line.lower()
+    match = ANALYTE_PATTERN.match(lowered)
+    if not match:
+        return None
+    alias = match.group(1)  # whole words only: 'hb' does not match 'hba1c'
+    name = ALIASES[alias]
+    panel, _, table_unit, (table_low, table_high), units = REFERENCE_RANGES[name]
+
+    rest = line[len(alias):]
+    rest = rest[NOTE_RE.match(rest).end():]
+    value_match = VALUE_RE.match(rest)
+    if not value_match:
+        return None
+    after = rest[value_match.end():]
+    if re.match(r'\s*(?:-|–|to\b)\s*\d', after):
+        return None  # a range with no result in front of it
+    value = _number(value_match.group('num'))
+
+    ranges = list(RANGE_RE.finditer(after))
+    if len(ranges) > 1 or SEX_LABEL_RE.search(after):
+        return None  # which range applies is not on the row: leave it to the vision call
+    range_match = ranges[0] if ranges else None
+    between = after[:range_match.start()] if range_match else after
+    unit_text, key = _find_unit(between, units)
+    if unit_text is None and range_match:
+        unit_text, key = _find_unit(after[range_match.end():], units)
+
+    if range_match and range_match.group('low') is not None:
+        low, high = _number(range_match.group('low')), _number(range_match.group('high'))
+        printed = f"{range_match.group('low')}-{range_match.group('high')}"
+    elif range_match:
+        op = range_match.group('op').lower()
+        bound = _number(range_match.group('bound'))
+        upper = op.startswith(('<', '≤', 'up', 'less'))
+        low, high = (None, bound) if upper else (bound, None)
+        printed = f"{'<' if upper else '>'} {range_match.group('bound')}"
+    else:
+        low = high = printed = None
+
+    if printed is not None:
+        status = classify(value, low, high)
+        normal_range = f'{printed} {unit_text}'.strip() if unit_text else printed
+    else:
+        # No range on the row: the built-in table, in its own unit
+        if table_unit and key is None:
+            return None
+        factor = units[key] if key else 1
+        status = classify(value * factor, table_low, table_high)
+        # Shown in the units the report uses
+        low, high = (None if b is None else _format_bound(b / factor) for b in (table_low, table_high))
+        unit = unit_text or table_unit
+        if low is None:
+            normal_range = f'< {high} {unit}'
+        elif high is None:
+            normal_range = f'> {low} {unit}'
+        else:
+            normal_range = f'{low}-{high} {unit}'
+        normal_range = normal_range.strip()
+
+    # The lab's own flag must agree with the status worked out here
+    flags = [FLAGS[token.lower()] for token in after.split() if token.lower() in FLAGS]
+    if flags and (status == 'normal' or any(flag not in (None, status) for flag in flags)):
+        return None
+
+    value_text = (value_match.group('cmp') or '') + value_match.group('num')
+    return {
+        'name': name,
+        'value': f'{value_text} {unit_text}' if unit_text else value_text,
+        'normal_range': normal_range,
+        'status': status,
+        'simple_explanation': '',
+        'panel': panel,
+    }
+
+
+def looks_like_result(line):
+    """Whether a line not read by parse_row still has a result's shape: name, value and range."""
+    prefix = ROW_PREFIX_RE.match(line)
+    line = line[prefix.end():] if prefix else line
+    if DATE_RE.search(line):
+        return False  # 'Collected: 12-05-2024' is not a range
+    match = RESULT_LINE_RE.match(line)
+    return match is not None and RANGE_RE.search(line[match.end():]) is not None
+
+
+def parse_lab_text(text):
+    """
+    {report_type, parameters, unread} for a report's text: the rows recognised
+    (the first row per test wins) and the result-shaped lines that were not.
+    """
+    parameters, unread = {}, []
+    for line in text.splitlines():
+        line = line.strip()
+        row = parse_row(line)
+        if row is None:
+            if looks_like_result(line):
+                unread.append(line)
+        elif row['name'] not in parameters:
+            parameters[row['name']] = row
+    panels = list(dict.fromkeys(row.pop('panel') for row in parameters.values()))
+    return {
+        'report_type': ', '.join(PANELS[panel] for panel in panels),
+        'parameters': list(parameters.values()),
+        'unread': unread,
+    }
+
+
+def extract_pdf_text(file_bytes):
+    """The text layer of a PDF ('' for a scan), or None without pypdf or for an unreadable file."""
+    if PdfReader is None:
+        return None
+    try:
+        reader = PdfReader(io.BytesIO(file_bytes))
+        if reader.is_encrypted:
+            return None
+        pages = []
+        for page in reader.pages[:MAX_TEXT_PAGES]:
+            try:
+                # Layout mode keeps each table row on one line
+                pages.append(page.extract_text(extraction_mode='layout'))
+            except TypeError:  # pypdf before 4.0
+                pages.append(page.extract_text())
+        return '\n'.join(pages)
+    except Exception as e:  # pypdf raises a range of errors on damaged files
+        print(f"Lab report text extraction failed: {e}")
+        return None
+
+
+def read_lab_values(file_bytes, mime_type):
+    """Partial analysis {report_type, parameters} read locally, or None when Gemini Vision is needed."""
+    if mime_type != 'application/pdf' or not getattr(settings, 'LAB_LOCAL_EXTRACTION', True):
+        return None
+    text = extract_pdf_text(file_bytes)
+    if text is None:
+        metrics.LAB_LOCAL_READS.inc(outcome='unsupported')
+        return None
+    if not text.strip():
+        metrics.LAB_LOCAL_READS.inc(outcome='no_text')
+        return None
+    result = parse_lab_text(text)
+    if result.pop('unread'):
+        # A result not read here would be missing from the analysis
+        metrics.LAB_LOCAL_READS.inc(outcome='unrecognised')
+        return None
+    if len(result['parameters']) < getattr(settings, 'LAB_LOCAL_MIN_PARAMETERS', DEFAULT_MIN_PARAMETERS):
+        metrics.LAB_LOCAL_READS.inc(outcome='too_few')
+        return None
+    metrics.LAB_LOCAL_READS.inc(outcome='used')
+    return result
+
+
+def local_summary(result):
+    """Complete a partial analysis without the model: a factual summary and no conditions."""
+    outside = [p for p in result['parameters'] if p['status'] != 'normal']
+    if outside:
+        listed = ', '.join(f"{p['name']} ({p['status']})" for p in outside)
+        summary = f"{len(outside)} of {len(result['parameters'])} results are outside the reference range: {listed}."
+        recommendation = 'Discuss the results outside the reference range with your doctor.'
+    else:
+        summary = f"All {len(result['parameters'])} results are within the reference range."
+        recommendation = 'No values need attention; keep your regular check-ups.'
+    return {
+        **result,
+        'overall_summary': summary,
+        'possible_conditions': [],
+        'recommendation': recommendation,
+        'disclaimer': LAB_DISCLAIMER,
+    }
@@ -0,0 +1,92 @@
+"""
+Bounded thread pool for running the blocking Gemini SDK from async views.
+
+`settings.GEMINI_MAX_CONCURRENCY` caps how many upstream calls run at once
+(extra callers queue without holding a worker), and `settings.GEMINI_TIMEOUT`
+is the per-call deadline in seconds.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'GEMINI_MAX_CONCURRENCY', 32),
+                    thread_name_prefix='gemini',
+                )
+    return _executor
+
+
+async def run_blocking(func, *args, timeout=None, **kwargs):
+    """
+    Run `func(*args, **kwargs)` on the Gemini pool and await its result.
+    Raises asyncio.TimeoutError once `timeout` (default GEMINI_TIMEOUT) elapses;
+    the SDK call itself is also given that deadline so the thread is released.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'GEMINI_TIMEOUT', 30)
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+    return await asyncio.wait_for(future, timeout)
+
+
+_END = object()
+
+
+async def iterate_blocking(func, *args, timeout=None, **kwargs):
+    """
+    Async iterator over the blocking generator `func(*args, **kwargs)`. The
+    generator runs on the Gemini pool (one worker for the whole stream) and
+    each item is handed over as soon as it is produced. Raises
+    asyncio.TimeoutError once the stream as a whole exceeds `timeout`
+    (default GEMINI_TIMEOUT); leaving early closes the generator.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'GEMINI_TIMEOUT', 30)
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def put(entry):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, entry)
+        except RuntimeError:  # the event loop is gone; nobody is listening
+            stop.set()
+
+    def produce():
+        generator = func(*args, **kwargs)
+        try:
+            for item in generator:
+                if stop.is_set():
+                    break
+                put((item, None))
+        except BaseException as e:
+            put((_END, e))
+            return
+        finally:
+            generator.close()
+        put((_END, None))
+
+    loop.run_in_executor(get_executor(), produce)
+    deadline = loop.time() + timeout
+    try:
+        while True:
+            item, error = await asyncio.wait_for(queue.get(), max(0.0, deadline - loop.time()))
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
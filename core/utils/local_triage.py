@@ -0,0 +1,313 @@
+"""
+Local triage engine: answers simple symptom descriptions without the LLM.
+
+Every known phrase (symptom concepts below, the SPECIALITY_MAP / multilingual
+alias table and cost.SYMPTOM_TO_DISEASE) is compiled into one trie regex and
+looked up in an inverted index of weighted signals:
+
+    concept      -> drives the disease rules (fever + body pain -> Dengue, ...)
+    speciality   -> a weighted vote for a speciality
+    red flag     -> emergency sign; forces urgency "high"
+
+`triage()` returns the usual analysis dict plus a confidence built from how
+strongly and how unanimously the matched phrases point at one speciality,
+scaled by how much of the text the index covers. Red flags, negations
+("no fever") and long free-text descriptions keep the confidence low so
+those cases still go to Gemini.
+"""
+import re
+
+from django.conf import settings
+
+from core.utils.cost import SYMPTOM_TO_DISEASE
+from core.utils.speciality_mapper import ALIAS_TABLE, compile_matcher
+
+CONCEPT_WEIGHT = 1.5
+ALIAS_WEIGHT = 1.0
+# Words in a description beyond which the LLM is trusted over keyword matching
+BRIEF_WORDS = 12
+# Cap on the confidence when the LLM must see the case (red flags, negations)
+UNSURE_CONFIDENCE = 0.3
+
+# --------------------
+# Symptom concepts: English + the seven other supported languages
+# --------------------
+CONCEPTS = {
+  'fever': ('General Medicine', [
+    'fever', 'high temperature', 'bukhar', 'बुखार', 'ताप', 'તાવ', 'ਬੁਖਾਰ', 'জ্বর', 'காய்ச்சல்', 'జ్వరం',
+  ]),
+  'cough': ('General Medicine', [
+    'cough', 'khansi', 'खांसी', 'खोकला', 'ઉધરસ', 'ਖੰਘ', 'কাশি', 'இருமல்', 'దగ్గు',
+  ]),
+  'cold': ('General Medicine', [
+    'cold', 'runny nose', 'sneezing', 'sardi', 'सर्दी', 'जुकाम', 'શરદી', 'ਜ਼ੁਕਾਮ', 'সর্দি', 'சளி', 'జలుబు',
+  ]),
+  'body_pain': ('General Medicine', [
+    'body pain', 'body ache', 'joint pain', 'muscle pain', 'बदन दर्द', 'जोड़ों का दर्द', 'सांधेदुखी',
+    'સાંધાનો દુખાવો', 'ਜੋੜਾਂ ਦਾ ਦਰਦ', 'গাঁটে ব্যথা', 'மூட்டு வலி', 'కీళ్ల నొప్పులు',
+  ]),
+  'headache': ('Neurology', [
+    'headache', 'migraine', 'सिरदर्द', 'सिर दर्द', 'डोकेदुखी', 'માથાનો દુખાવો', 'ਸਿਰਦਰਦ', 'মাথাব্যথা',
+    'தலைவலி', 'తలనొప్పి',
+  ]),
+  'chest_pain': ('Cardiology', [
+    'chest pain', 'chest tightness', 'सीने में दर्द', 'छातीत दुखणे', 'છાતીમાં દુખાવો', 'ਛਾਤੀ ਵਿੱਚ ਦਰਦ',
+    'বুকে ব্যথা', 'நெஞ்சு வலி', 'ఛాతీ నొప్పి',
+  ]),
+  'stomach': ('Gastroenterology', [
+    'stomach pain', 'stomach ache', 'abdominal pain', 'loose motion', 'diarrhea', 'पेट दर्द', 'पोटदुखी',
+    'પેટમાં દુખાવો', 'ਪੇਟ ਦਰਦ', 'পেটে ব্যথা', 'வயிற்று வலி', 'కడుపు నొప్పి',
+  ]),
+  'vomiting': ('Gastroenterology', [
+    'vomiting', 'vomit', 'nausea', 'उल्टी', 'उलटी', 'ઉલટી', 'ਉਲਟੀ', 'বমি', 'வாந்தி', 'వాంతులు',
+  ]),
+  'sore_throat': ('ENT', [
+    'sore throat', 'throat pain', 'गले में दर्द', 'गले में खराश', 'ગળામાં દુખાવો', 'ਗਲੇ ਵਿੱਚ ਦਰਦ',
+    'গলা ব্যথা', 'தொண்டை வலி', 'గొంతు నొప్పి',
+  ]),
+  'rash': ('Dermatology', [
+    'rash', 'itching', 'skin allergy', 'खुजली', 'ખંજવાળ', 'ਖੁਜਲੀ', 'চুলকানি', 'அரிப்பு', 'దురద',
+  ]),
+  'urine': ('Urology', [
+    'burning urination', 'painful urination', 'urine infection', 'पेशाब में जलन', 'પેશાબમાં બળતરા',
+    'ਪਿਸ਼ਾਬ ਵਿੱਚ ਜਲਣ', 'প্রস্রাবে জ্বালা', 'சிறுநீர் எரிச்சல்', 'మూత్రంలో మంట',
+  ]),
+}
+
+# --------------------
+# Emergency signs
+# --------------------
+RED_FLAGS = {
+  'breathless': [
+    'shortness of breath', 'breathlessness', 'difficulty breathing', "can't breathe", 'सांस लेने में तकलीफ',
+    'श्वास घेण्यास त्रास', 'શ્વાસ લેવામાં તકલીફ', 'ਸਾਹ ਲੈਣ ਵਿੱਚ ਤਕਲੀਫ', 'শ্বাসকষ্ট', 'மூச்சுத் திணறல்',
+    'శ్వాస ఆడకపోవడం',
+  ],
+  'bleeding': [
+    'bleeding', 'vomiting blood', 'coughing blood', 'रक्तस्राव', 'खून बहना', 'રક્તસ્ત્રાવ', 'ਖੂਨ ਵਗਣਾ',
+    'রক্তপাত', 'இரத்தப்போக்கு', 'రక్తస్రావం',
+  ],
+  'unconscious': [
+    'unconscious', 'fainting', 'fainted', 'collapsed', 'बेहोश', 'बेशुद्ध', 'બેભાન', 'ਬੇਹੋਸ਼', 'অজ্ঞান',
+    'மயக்கம்', 'స్పృహ కోల్పోవడం',
+  ],
+  'sweating': [
+    'sweating', 'पसीना', 'घाम', 'પરસેવો', 'ਪਸੀਨਾ', 'ঘাম', 'வியர்வை', 'చెమట',
+  ],
+  'seizure': [
+    'seizure', 'convulsion', 'fits', 'दौरा', 'આંચકી', 'ਦੌਰਾ', 'খিঁচুনি', 'வலிப்பு', 'మూర్ఛ',
+  ],
+  'stroke': [
+    'stroke', 'paralysis', 'slurred speech', 'लकवा', 'पक्षाघात', 'લકવો', 'ਅਧਰੰਗ', 'পক্ষাঘাত', 'பக்கவாதம்',
+    'పక్షవాతం',
+  ],
+  'infant': [
+    'infant', 'newborn', 'baby', 'month old', 'months old', 'month-old', 'months-old', 'शिशु', 'नवजात',
+    'બાળક', 'ਨਵਜੰਮਿਆ', 'শিশু', 'குழந்தை', 'శిశువు',
+  ],
+  'stiff_neck': [
+    'stiff neck', 'neck stiffness', 'गर्दन में अकड़न', 'गर्दन अकड़', 'मान आखडणे', 'ગરદન જકડાઈ',
+    'ਗਰਦਨ ਅਕੜ', 'ঘাড় শক্ত', 'கழுத்து விறைப்பு', 'మెడ బిగుసుకుపోవడం',
+  ],
+  'worst_headache': [
+    'worst headache', 'worst of my life', 'thunderclap headache', 'sudden severe headache',
+  ],
+}
+
+# Words that deny a symptom ("no fever", "I don't have cough"): keyword
+# matching cannot tell which symptom they apply to
+NEGATIONS = [
+  'no', 'not', 'never', 'without', "don't", 'dont', "doesn't", 'doesnt', "didn't", 'didnt', "haven't",
+  "hasn't", "isn't", "aren't", 'nahi', 'nahin', 'नहीं', 'नही', 'नाही', 'बिना', 'નથી', 'ਨਹੀਂ', 'না', 'নেই',
+  'இல்லை', 'లేదు',
+]
+NEGATION_PATTERN = compile_matcher(NEGATIONS)
+
+# Words that carry no symptom; they do not count against the index coverage
+FILLER_WORDS = {
+  'i', 'im', "i'm", 'me', 'my', 'a', 'an', 'the', 'and', 'or', 'with', 'have', 'has', 'having', 'had', 'is',
+  'am', 'are', 'was', 'of', 'in', 'on', 'for', 'since', 'from', 'also', 'some', 'mild', 'slight',
+  'day', 'days', 'week', 'weeks', 'today', 'yesterday', 'last', 'night', 'mujhe', 'hai', 'aur',
+  'मुझे', 'है', 'हैं', 'और', 'मेरा', 'मेरी', 'से', 'दिन',
+}
+WORD_RE = re.compile(r"[^\s,.;:!?()\[\]\"]+")
+
+# Speciality for each disease in cost.SYMPTOM_TO_DISEASE
+DISEASE_SPECIALITY = {
+  'Cold': 'General Medicine',
+  'Fever': 'General Medicine',
+  'Cough': 'General Medicine',
+  'Viral Infection': 'General Medicine',
+  'Body Pain': 'General Medicine',
+  'Headache': 'Neurology',
+  'Sore Throat': 'ENT',
+  'Food Poisoning': 'Gastroenterology',
+  'Stomach Pain': 'Gastroenterology',
+  'Skin Allergy': 'Dermatology',
+  'UTI': 'Urology',
+  'Minor Injury': 'Emergency Care',
+}
+
+# --------------------
+# Disease rules: first rule whose concepts are all present wins.
+# (required concepts, diseases, speciality, urgency, rule confidence)
+# --------------------
+DISEASE_RULES = [
+  ({'chest_pain'}, [
+    {"name": "Angina", "probability": 0.5, "notes": "Chest pain, needs evaluation"},
+    {"name": "Gastritis", "probability": 0.3, "notes": "Acid reflux related"},
+  ], 'Cardiology', 'high', 0.5),
+  ({'fever', 'body_pain'}, [
+    {"name": "Dengue Fever", "probability": 0.6, "notes": "Fever with joint/muscle pain"},
+    {"name": "Viral Infection", "probability": 0.3, "notes": "Common viral symptoms"},
+  ], 'General Medicine', 'medium', 0.8),
+  ({'fever'}, [
+    {"name": "Viral Fever", "probability": 0.7, "notes": "Common fever symptoms"},
+    {"name": "Flu", "probability": 0.2, "notes": "Influenza-like illness"},
+  ], 'General Medicine', 'low', 0.9),
+  ({'headache'}, [
+    {"name": "Tension Headache", "probability": 0.6, "notes": "Common headache"},
+    {"name": "Migraine", "probability": 0.3, "notes": "Severe headache"},
+  ], 'Neurology', 'low', 0.85),
+  ({'stomach'}, [
+    {"name": "Gastroenteritis", "probability": 0.6, "notes": "Stomach infection"},
+    {"name": "Food Poisoning", "probability": 0.3, "notes": "Food-related illness"},
+  ], 'Gastroenterology', 'low', 0.85),
+  ({'vomiting'}, [
+    {"name": "Gastroenteritis", "probability": 0.6, "notes": "Stomach infection"},
+    {"name": "Food Poisoning", "probability": 0.3, "notes": "Food-related illness"},
+  ], 'Gastroenterology', 'low', 0.85),
+  ({'cough'}, [
+    {"name": "Upper Respiratory Infection", "probability": 0.7, "notes": "Common cold"},
+    {"name": "Bronchitis", "probability": 0.2, "notes": "Chest infection"},
+  ], 'General Medicine', 'low', 0.9),
+  ({'cold'}, [
+    {"name": "Upper Respiratory Infection", "probability": 0.7, "notes": "Common cold"},
+    {"name": "Allergic Rhinitis", "probability": 0.2, "notes": "Allergy-related cold"},
+  ], 'General Medicine', 'low', 0.9),
+  ({'sore_throat'}, [
+    {"name": "Pharyngitis", "probability": 0.6, "notes": "Throat infection"},
+    {"name": "Tonsillitis", "probability": 0.3, "notes": "Inflamed tonsils"},
+  ], 'ENT', 'low', 0.85),
+  ({'rash'}, [
+    {"name": "Skin Allergy", "probability": 0.6, "notes": "Allergic skin reaction"},
+    {"name": "Dermatitis", "probability": 0.3, "notes": "Skin inflammation"},
+  ], 'Dermatology', 'low', 0.85),
+  ({'urine'}, [
+    {"name": "Urinary Tract Infection", "probability": 0.7, "notes": "Burning or painful urination"},
+    {"name": "Kidney Stone", "probability": 0.2, "notes": "Needs evaluation if pain persists"},
+  ], 'Urology', 'low', 0.85),
+]
+
+DEFAULT_DISEASES = [
+  {"name": "General Checkup Recommended", "probability": 0.5, "notes": "Consult a doctor"},
+]
+
+
+def build_index():
+    """Inverted index {phrase: [(kind, value, weight), ...]} over every known phrase."""
+    index = {}
+
+    def add(term, signal):
+        index.setdefault(term.lower(), []).append(signal)
+
+    for concept, (speciality, terms) in CONCEPTS.items():
+        for term in terms:
+            add(term, ('concept', concept, 0.0))
+            add(term, ('speciality', speciality, CONCEPT_WEIGHT))
+    for flag, terms in RED_FLAGS.items():
+        for term in terms:
+            add(term, ('red_flag', flag, 0.0))
+    for alias, speciality in ALIAS_TABLE.items():
+        add(alias, ('speciality', speciality, ALIAS_WEIGHT))
+    for symptom, disease in SYMPTOM_TO_DISEASE.items():
+        add(symptom, ('speciality', DISEASE_SPECIALITY.get(disease, 'General Medicine'), ALIAS_WEIGHT))
+    return index
+
+
+TRIAGE_INDEX = build_index()
+TRIAGE_PATTERN = compile_matcher(TRIAGE_INDEX)
+
+
+def index_coverage(text, spans):
+    """
+    Share of the words in `text` (fillers aside) that fall inside a matched
+    phrase `spans`: words the index does not know may change the picture.
+    """
+    known = unknown = 0
+    for word in WORD_RE.finditer(text):
+        if word.group().isdigit() or word.group() in FILLER_WORDS:
+            continue
+        if any(start <= word.start() and word.end() <= end for start, end in spans):
+            known += 1
+        else:
+            unknown += 1
+    return known / (known + unknown) if known + unknown else 0.0
+
+
+def triage(symptoms_text):
+    """
+    Score `symptoms_text` against the local index. Returns the analysis dict
+    ({possible_diseases, speciality, urgency, confidence}) plus 'source': 'local'.
+    """
+    text = (symptoms_text or '').lower()
+
+    concepts, red_flags, votes, covered = set(), set(), {}, []
+    for match in TRIAGE_PATTERN.finditer(text):
+        covered.append(match.span(1))
+        for kind, value, weight in TRIAGE_INDEX[match.group(1)]:
+            if kind == 'concept':
+                concepts.add(value)
+            elif kind == 'red_flag':
+                red_flags.add(value)
+            else:
+                votes[value] = votes.get(value, 0.0) + weight
+
+    diseases, speciality, urgency, rule_confidence = DEFAULT_DISEASES, None, 'low', 0.3
+    for required, rule_diseases, rule_speciality, rule_urgency, confidence in DISEASE_RULES:
+        if required <= concepts:
+            diseases, speciality, urgency, rule_confidence = rule_diseases, rule_speciality, rule_urgency, confidence
+            break
+
+    # A matched disease rule decides the speciality; the word votes only when
+    # no rule matched (they still lower the confidence when they disagree)
+    total = sum(votes.values())
+    if speciality is None:
+        speciality = max(votes, key=votes.get) if votes else 'General Medicine'
+    agreement = votes.get(speciality, 0.0) / total if total else 0.0
+    strength = min(1.0, votes.get(speciality, 0.0) / CONCEPT_WEIGHT)
+    words = len(text.split())
+    brevity = 1.0 if words <= BRIEF_WORDS else BRIEF_WORDS / words
+    coverage = index_coverage(text, covered)
+
+    confidence = rule_confidence * agreement * strength * brevity * coverage
+    if red_flags:
+        # Emergency signs: flag them, but always let the LLM look at the case
+        urgency = 'high'
+        confidence = min(confidence, UNSURE_CONFIDENCE)
+    if NEGATION_PATTERN.search(text):
+        confidence = min(confidence, UNSURE_CONFIDENCE)
+
+    return {
+        "possible_diseases": [dict(d) for d in diseases],
+        "speciality": speciality,
+        "urgency": urgency,
+        "confidence": round(max(confidence, 0.1), 2),
+        "source": "local",
+    }
+
+
+def answer_locally(symptoms_text, response_language='English'):
+    """
+    The local tier of /api/analyze: the triage result when it is confident
+    enough (LOCAL_TRIAGE_THRESHOLD) and may be served in `response_language`
+    (LOCAL_TRIAGE_LANGUAGES; the local answers are written in English), else None.
+    """
+    if not getattr(settings, 'LOCAL_TRIAGE_ENABLED', True):
+        return None
+    if response_language not in getattr(settings, 'LOCAL_TRIAGE_LANGUAGES', ['English']):
+        return None
+    result = triage(symptoms_text)
+    if result['confidence'] >= getattr(settings, 'LOCAL_TRIAGE_THRESHOLD', 0.8):
+        return result
+    return None
@@ -0,0 +1,300 @@
+"""
+In-process metrics registry rendered in the Prometheus text exposition format.
+
+Counters and histograms are plain dicts keyed by label values behind one lock
+per metric, so recording is a dict lookup plus a bisect. Nothing is exported
+until /metrics is scraped; each process (worker) exposes its own numbers.
+
+Request metrics are recorded by core.middleware.MetricsMiddleware per URL name
+from core/urls.py. SQL executed while a request is being handled is counted by
+a database execute wrapper installed on every connection (see `install`).
+Gemini calls are recorded by GeminiClient.generate_content and the helpers in
+core/utils/gemini.py.
+"""
+import bisect
+import contextvars
+import threading
+import time
+
+from django.db.backends.signals import connection_created
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+UPLOAD_SIZE_BUCKETS = (16384, 65536, 262144, 1048576, 2097152, 4194304, 8388608, 16777216)
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+_metrics = []
+_collectors = []
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, '') for name in self.labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labels, key), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}   # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-1] += value
+
+    def count(self, **labels):
+        row = self._values.get(tuple(labels.get(name, '') for name in self.labels))
+        return sum(row[:-1]) if row else 0
+
+    def total(self, **labels):
+        row = self._values.get(tuple(labels.get(name, '') for name in self.labels))
+        return row[-1] if row else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(row)) for key, row in self._values.items())
+        names = self.labels + ('le',)
+        for key, row in items:
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (float('inf'),), row[:-1]):
+                cumulative += hits
+                yield self.name + '_bucket', _format_labels(names, key + (_format_value(bound),)), cumulative
+            yield self.name + '_count', _format_labels(self.labels, key), cumulative
+            yield self.name + '_sum', _format_labels(self.labels, key), row[-1]
+
+
+def register_collector(func):
+    """
+    Register `func() -> [(name, kind, documentation, [(labels_dict, value), ...])]`
+    for values read at scrape time (cache hit counts, breaker state, ...).
+    """
+    _collectors.append(func)
+    return func
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _metrics:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{labels} {_format_value(value)}')
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            print(f"Metrics collector error: {e}")
+            continue
+        for name, kind, documentation, samples in families:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# ─── Request metrics ──────────────────────────────────────────────────────────
+
+REQUEST_LATENCY = Histogram(
+    'carenav_http_request_duration_seconds', 'Time to produce a response, by URL name.',
+    ('view', 'method'))
+REQUESTS = Counter(
+    'carenav_http_requests_total', 'Responses by URL name and status code.',
+    ('view', 'method', 'status'))
+REQUEST_DB_QUERIES = Histogram(
+    'carenav_http_request_db_queries', 'SQL queries executed per request, by URL name.',
+    ('view',), QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram(
+    'carenav_http_request_db_duration_seconds', 'Time spent in SQL per request, by URL name.',
+    ('view',))
+RESPONSE_SIZE = Histogram(
+    'carenav_http_response_size_bytes', 'Response body size (non-streaming responses), by URL name.',
+    ('view',), SIZE_BUCKETS)
+
+# ─── Gemini metrics ───────────────────────────────────────────────────────────
+
+GEMINI_LATENCY = Histogram(
+    'carenav_gemini_call_duration_seconds', 'Gemini generate_content latency (all retries included).',
+    ('operation', 'outcome'))
+GEMINI_FIRST_CHUNK = Histogram(
+    'carenav_gemini_first_chunk_seconds', 'Time from a streaming Gemini call to its first reply chunk.',
+    ('operation',))
+GEMINI_TOKENS = Counter(
+    'carenav_gemini_tokens_total', 'Tokens reported by Gemini usage metadata.',
+    ('operation', 'kind'))
+GEMINI_OUTPUT_TOKENS = Histogram(
+    'carenav_gemini_output_tokens', 'Output tokens per successful Gemini reply, by output format (schema|json|text).',
+    ('operation', 'format'), TOKEN_BUCKETS)
+GEMINI_PARSE_FAILURES = Counter(
+    'carenav_gemini_parse_failures_total',
+    'Unusable Gemini replies, by reason: truncated (hit max_output_tokens), json (not JSON) or schema.',
+    ('operation', 'reason'))
+GEMINI_FALLBACKS = Counter(
+    'carenav_gemini_fallbacks_total', 'Requests answered by a local fallback instead of Gemini.',
+    ('operation', 'reason'))
+GEMINI_REQUESTS = Counter(
+    'carenav_gemini_requests_total', 'Requests that needed a Gemini answer (denominator of the fallback rate).',
+    ('operation',))
+LAB_LOCAL_READS = Counter(
+    'carenav_lab_local_reads_total',
+    'PDF lab reports by local value extraction outcome: used, unrecognised, too_few, no_text (scan) or unsupported.',
+    ('outcome',))
+LAB_UPLOADS = Counter(
+    'carenav_lab_uploads_total',
+    'Lab report uploads by preprocessing outcome: shrunk, unchanged, unsupported, unreadable or rejected.',
+    ('kind', 'outcome'))
+LAB_UPLOAD_BYTES = Histogram(
+    'carenav_lab_upload_bytes', 'Lab report size as uploaded and as sent to Gemini (stage).',
+    ('kind', 'stage'), UPLOAD_SIZE_BUCKETS)
+TRIAGE_SPECULATION = Counter(
+    'carenav_triage_speculation_total',
+    '/api/triage speculative hospital searches: hit (reused), miss (searched again) or local (no Gemini call).',
+    ('outcome',))
+
+
+def record_gemini_call(operation, outcome, seconds, response=None, output_format='text'):
+    GEMINI_LATENCY.observe(seconds, operation=operation, outcome=outcome)
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        output_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+        GEMINI_TOKENS.inc(getattr(usage, 'prompt_token_count', 0) or 0, operation=operation, kind='prompt')
+        GEMINI_TOKENS.inc(output_tokens, operation=operation, kind='output')
+        GEMINI_OUTPUT_TOKENS.observe(output_tokens, operation=operation, format=output_format)
+
+
+# ─── SQL accounting ───────────────────────────────────────────────────────────
+
+# [query_count, seconds] for the request being handled in this context. The
+# list is shared by reference, so queries run by sync_to_async threads count too.
+_request_db = contextvars.ContextVar('carenav_request_db', default=None)
+
+
+def _db_execute_wrapper(execute, sql, params, many, context):
+    stats = _request_db.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - start
+
+
+def _install_wrapper(sender, connection, **kwargs):
+    if _db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_execute_wrapper)
+
+
+def install():
+    """
+    Count SQL on every database connection and register the scrape-time
+    collectors; called from CoreConfig.ready().
+    """
+    connection_created.connect(_install_wrapper, dispatch_uid='carenav_metrics_db')
+    if not _collectors:
+        register_collector(_collect_response_cache)
+        register_collector(_collect_singleflight)
+        register_collector(_collect_breaker)
+
+
+# ─── Scrape-time collectors ───────────────────────────────────────────────────
+
+def _collect_response_cache():
+    from core.utils.response_cache import get_cache
+    stats = get_cache().stats()
+    labels = {'backend': stats['backend']}
+    return [
+        ('carenav_response_cache_hits_total', 'counter', 'Gemini response cache hits.', [(labels, stats['hits'])]),
+        ('carenav_response_cache_misses_total', 'counter', 'Gemini response cache misses.', [(labels, stats['misses'])]),
+    ]
+
+
+def _collect_singleflight():
+    from core.utils import singleflight
+    groups = singleflight.stats()
+    return [
+        ('carenav_singleflight_upstream_calls_total', 'counter', 'Calls made by single-flight leaders.',
+         [({'group': g['name']}, g['upstream_calls']) for g in groups]),
+        ('carenav_singleflight_coalesced_total', 'counter', 'Callers that shared an in-flight call.',
+         [({'group': g['name']}, g['coalesced']) for g in groups]),
+    ]
+
+
+def _collect_breaker():
+    from core.utils.gemini_client import get_client
+    client = get_client()
+    if client is None:
+        return []
+    snaps = client.breaker_snapshots()
+    return [
+        ('carenav_circuit_open', 'gauge', '1 while the circuit breaker rejects calls.',
+         [({'name': s['name']}, 0 if s['state'] == 'closed' else 1) for s in snaps]),
+        ('carenav_circuit_trips_total', 'counter', 'Times the circuit breaker opened.',
+         [({'name': s['name']}, s['trips']) for s in snaps]),
+        ('carenav_circuit_rejections_total', 'counter', 'Calls rejected while open.',
+         [({'name': s['name']}, s['rejections']) for s in snaps]),
+    ]
+
+
+def start_request_db():
+    """Begin counting SQL for the current request; returns (stats, reset token)."""
+    stats = [0, 0.0]
+    return stats, _request_db.set(stats)
+
+
+def end_request_db(token):
+    _request_db.reset(token)
@@ -0,0 +1,70 @@
+"""
+Keyset (cursor) pagination over the hospital ordering: rating desc, id desc.
+
+The cursor is an opaque url-safe token holding the (rating, id) of the last
+row served, so each page is a single indexed range scan no matter how deep
+the client has paged, and rows inserted meanwhile never shift a page.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+
+KEYSET_ORDERING = ('-rating', '-id')
+
+
+def encode_cursor(rating, pk):
+    raw = json.dumps([rating, pk], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (rating, id) from a cursor token, or None if it is missing/invalid."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        rating, pk = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return float(rating), int(pk)
+    except (ValueError, TypeError, UnicodeError):
+        return None
+
+
+def get_page_size(raw, default=None):
+    """Clamp a user-supplied page size to 1..HOSPITALS_MAX_PAGE_SIZE."""
+    default = default or getattr(settings, 'HOSPITALS_PAGE_SIZE', 24)
+    maximum = getattr(settings, 'HOSPITALS_MAX_PAGE_SIZE', 100)
+    try:
+        size = int(raw) if raw else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def _row_key(row):
+    if isinstance(row, dict):
+        return row['rating'], row['id']
+    return row.rating, row.pk
+
+
+def paginate_keyset(queryset, cursor=None, page_size=None):
+    """
+    Return (rows, next_cursor) for the page after `cursor`.
+    `queryset` may be a model or values() queryset; it must expose rating and id.
+    """
+    page_size = page_size or get_page_size(None)
+    queryset = queryset.order_by(*KEYSET_ORDERING)
+
+    position = decode_cursor(cursor)
+    if position is not None:
+        rating, pk = position
+        queryset = queryset.filter(Q(rating__lt=rating) | Q(rating=rating, id__lt=pk))
+
+    # Fetch one extra row to learn whether another page exists
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(*_row_key(rows[-1]))
+    return rows, next_cursor
@@ -0,0 +1,128 @@
+"""
+On-demand request profiling (core.middleware.ProfilerMiddleware).
+
+A profiled request runs under cProfile with its SQL captured. The result is
+stored as a RequestProfile row, viewable in the admin, and only the newest
+PROFILER_KEEP rows are kept. Requests that are not profiled pay one
+query-string/header check, plus one random() call when sampling is on.
+
+Settings:
+    PROFILER_ENABLED      master switch
+    PROFILER_QUERY_PARAM  query flag a staff user adds to profile a request ('_profile')
+    PROFILER_HEADER       request header with the same effect ('X-Profile')
+    PROFILER_SAMPLE_RATE  share of all requests profiled automatically (0 = off)
+    PROFILER_KEEP         stored profiles to keep
+    PROFILER_TOP_N        functions listed in each stored report
+"""
+import contextvars
+import cProfile
+import io
+import pstats
+import random
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+SQL_LOG_LIMIT = 500
+
+# [(sql, seconds), ...] for the request being profiled in this context
+_sql_log = contextvars.ContextVar('carenav_profiler_sql', default=None)
+
+
+def _capture_sql(execute, sql, params, many, context):
+    log = _sql_log.get()
+    if log is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if len(log) < SQL_LOG_LIMIT:
+            log.append((sql, time.perf_counter() - start))
+
+
+def _install_wrapper(sender, connection, **kwargs):
+    if _capture_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_capture_sql)
+
+
+def install():
+    """Capture SQL for profiled requests on every connection; called from CoreConfig.ready()."""
+    connection_created.connect(_install_wrapper, dispatch_uid='carenav_profiler_sql')
+
+
+def profile_trigger(request):
+    """
+    'flag', 'sample' or None: whether (and why) `request` should be profiled.
+    'flag' requests still need is_staff() to pass; this check stays off the
+    session/user lookup so unprofiled requests never pay for it.
+    """
+    if not getattr(settings, 'PROFILER_ENABLED', True):
+        return None
+    param = getattr(settings, 'PROFILER_QUERY_PARAM', '_profile')
+    header = 'HTTP_' + getattr(settings, 'PROFILER_HEADER', 'X-Profile').upper().replace('-', '_')
+    if request.META.get(header) or (param in request.META.get('QUERY_STRING', '') and param in request.GET):
+        return 'flag'
+    rate = getattr(settings, 'PROFILER_SAMPLE_RATE', 0.0)
+    if rate and random.random() < rate:
+        return 'sample'
+    return None
+
+
+def is_staff(request):
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+
+class RequestProfiler:
+    """Profile one request: start(), stop(), then save() the RequestProfile."""
+
+    def __init__(self, trigger):
+        self.trigger = trigger
+        self.profile = cProfile.Profile()
+        self.sql = []
+
+    def start(self):
+        self._token = _sql_log.set(self.sql)
+        self._start = time.perf_counter()
+        try:
+            self.profile.enable()
+        except ValueError:
+            # Another profile is already running on this thread (concurrent async requests)
+            self.profile = None
+
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+        self.duration = time.perf_counter() - self._start
+        _sql_log.reset(self._token)
+
+    def report(self):
+        if self.profile is None:
+            return 'cProfile was busy with another request on this thread; SQL log only.'
+        out = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=out)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(getattr(settings, 'PROFILER_TOP_N', 40))
+        return out.getvalue()
+
+    def save(self, request, response):
+        from core.models import RequestProfile
+
+        match = getattr(request, 'resolver_match', None)
+        RequestProfile.objects.create(
+            path=request.get_full_path()[:500],
+            view_name=(match.url_name or match.view_name or '')[:100] if match else '',
+            method=request.method,
+            status_code=getattr(response, 'status_code', None),
+            trigger=self.trigger,
+            duration_ms=round(self.duration * 1000, 2),
+            sql_count=len(self.sql),
+            sql_ms=round(sum(took for _, took in self.sql) * 1000, 2),
+            sql_log=[{'sql': sql, 'ms': round(took * 1000, 3)} for sql, took in self.sql],
+            profile=self.report(),
+        )
+        keep = getattr(settings, 'PROFILER_KEEP', 50)
+        stale = list(RequestProfile.objects.values_list('id', flat=True)[keep:])
+        if stale:
+            RequestProfile.objects.filter(id__in=stale).delete()
@@ -0,0 +1,162 @@
+"""
+Circuit breaker and deadline-bounded retries for upstream (Gemini) calls.
+
+The breaker keeps a rolling window of recent call outcomes. It opens when,
+over at least MIN_CALLS calls, the error rate or the share of calls slower than
+SLOW_CALL_SECONDS reaches its threshold. While open every call is rejected
+immediately with CircuitOpenError, so callers serve their local fallback
+instead of queueing behind a degraded upstream. After COOLDOWN seconds one
+probe call is let through (half-open); its outcome closes or re-opens the
+breaker.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_BREAKER_CONFIG = {
+    'WINDOW': 20,
+    'MIN_CALLS': 5,
+    'ERROR_RATE': 0.5,
+    'SLOW_CALL_SECONDS': 10.0,
+    'SLOW_CALL_RATE': 0.5,
+    'COOLDOWN': 30.0,
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the breaker is open."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when no time is left in the call's deadline for another attempt."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, config=None):
+        conf = dict(DEFAULT_BREAKER_CONFIG)
+        conf.update(config or {})
+        self.name = name
+        self.window = conf['WINDOW']
+        self.min_calls = conf['MIN_CALLS']
+        self.error_rate = conf['ERROR_RATE']
+        self.slow_call_seconds = conf['SLOW_CALL_SECONDS']
+        self.slow_call_rate = conf['SLOW_CALL_RATE']
+        self.cooldown = conf['COOLDOWN']
+
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=self.window)   # (ok, latency_seconds)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.calls = 0
+        self.failures = 0
+        self.rejections = 0
+        self.trips = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go upstream now."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejections += 1
+        raise CircuitOpenError(f"{self.name} circuit is {state}")
+
+    def record(self, ok, latency):
+        with self._lock:
+            self.calls += 1
+            if not ok:
+                self.failures += 1
+            self._outcomes.append((ok, latency))
+
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok and latency < self.slow_call_seconds:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._trip()
+                return
+
+            if self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+                total = len(self._outcomes)
+                errors = sum(1 for success, _ in self._outcomes if not success)
+                slow = sum(1 for _, took in self._outcomes if took >= self.slow_call_seconds)
+                if errors / total >= self.error_rate or slow / total >= self.slow_call_rate:
+                    self._trip()
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.trips += 1
+
+    def snapshot(self):
+        """JSON-serialisable view of the breaker for health checks and metrics."""
+        with self._lock:
+            state = self._current_state()
+            latencies = sorted(took for _, took in self._outcomes)
+            total = len(self._outcomes)
+            errors = sum(1 for ok, _ in self._outcomes if not ok)
+            return {
+                'name': self.name,
+                'state': state,
+                'window_calls': total,
+                'window_error_rate': round(errors / total, 3) if total else 0.0,
+                'window_p50_ms': _percentile_ms(latencies, 0.50),
+                'window_p95_ms': _percentile_ms(latencies, 0.95),
+                'calls': self.calls,
+                'failures': self.failures,
+                'rejections': self.rejections,
+                'trips': self.trips,
+                'open_for_s': round(time.monotonic() - self._opened_at, 1) if state != CLOSED else 0.0,
+            }
+
+
+def _percentile_ms(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return round(sorted_values[index] * 1000, 1)
+
+
+def call_with_retries(func, deadline, retries=2, base_delay=0.25, retry_on=(Exception,)):
+    """
+    Call `func(timeout)` until it succeeds, retrying errors in `retry_on` up to
+    `retries` times with full-jitter exponential backoff. `deadline` is an
+    absolute time.monotonic() value: each attempt receives the time remaining
+    as its timeout, and no attempt or backoff sleep runs past it.
+    """
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded('deadline exceeded before the call could be made')
+        try:
+            return func(remaining)
+        except retry_on:
+            attempt += 1
+            if attempt > retries:
+                raise
+            delay = random.uniform(0, base_delay * (2 ** (attempt - 1)))
+            if time.monotonic() + delay >= deadline:
+                raise
+            time.sleep(delay)
@@ -0,0 +1,225 @@
+"""
+Pluggable response cache for Gemini calls.
+
+The backend is picked from ``settings.GEMINI_CACHE``:
+
+    GEMINI_CACHE = {
+        'BACKEND': 'memory',    # 'memory' | 'django' | 'file' | 'none'
+        'TTL': 6 * 60 * 60,     # seconds
+        'MAX_ENTRIES': 2048,    # memory backend only
+        'PATH': BASE_DIR / '.gemini_cache',   # file backend only
+        'ALIAS': 'default',     # django backend only
+    }
+"""
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+DEFAULT_CONFIG = {
+    'BACKEND': 'memory',
+    'TTL': 6 * 60 * 60,
+    'MAX_ENTRIES': 2048,
+    'PATH': None,
+    'ALIAS': 'default',
+}
+
+_WS_RE = re.compile(r'\s+')
+_EDGE_PUNCT_RE = re.compile(r'^[\s.,;:!?]+|[\s.,;:!?]+$')
+
+
+def normalize_text(value):
+    """Lower-case, trim edge punctuation and collapse whitespace so trivially
+    different phrasings of the same input share a cache entry."""
+    if not value:
+        return ''
+    value = _WS_RE.sub(' ', str(value).lower())
+    return _EDGE_PUNCT_RE.sub('', value)
+
+
+def make_key(namespace, *parts):
+    """Stable hashed key for a namespace and a sequence of normalised parts."""
+    raw = json.dumps([normalize_text(p) for p in parts], ensure_ascii=False)
+    digest = hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+# ─── Backends ─────────────────────────────────────────────────────────────────
+
+class MemoryBackend:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return copy.deepcopy(value)
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, copy.deepcopy(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    """Delegates to one of the caches configured in ``settings.CACHES``."""
+
+    def __init__(self, alias='default'):
+        from django.core.cache import caches
+        self._cache = caches[alias]
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class FileBackend:
+    """One JSON file per key; survives restarts and is shared between workers."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, key.replace(':', '_') + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._file(key), encoding='utf-8') as fh:
+                item = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if item.get('expires_at', 0) < time.time():
+            return None
+        return item.get('value')
+
+    def set(self, key, value, ttl):
+        target = self._file(key)
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump({'expires_at': time.time() + ttl, 'value': value}, fh, ensure_ascii=False)
+        os.replace(tmp, target)
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.path, name))
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def clear(self):
+        pass
+
+
+# ─── Cache front-end ──────────────────────────────────────────────────────────
+
+class ResponseCache:
+    """Wraps a backend with TTL handling and hit/miss counters."""
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Response cache read error: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            print(f"Response cache write error: {e}")
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def build_cache(config=None):
+    conf = dict(DEFAULT_CONFIG)
+    conf.update(config if config is not None else getattr(settings, 'GEMINI_CACHE', {}))
+
+    backend_name = conf['BACKEND']
+    if backend_name == 'memory':
+        backend = MemoryBackend(conf['MAX_ENTRIES'])
+    elif backend_name == 'django':
+        backend = DjangoCacheBackend(conf['ALIAS'])
+    elif backend_name == 'file':
+        backend = FileBackend(conf['PATH'] or os.path.join(settings.BASE_DIR, '.gemini_cache'))
+    elif backend_name == 'none':
+        backend = NullBackend()
+    else:
+        raise ValueError(f"Unknown GEMINI_CACHE backend: {backend_name!r}")
+    return ResponseCache(backend, conf['TTL'])
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache instance, built lazily from settings."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = build_cache()
+    return _cache
@@ -0,0 +1,97 @@
+"""
+Single-flight coalescing of identical in-flight upstream calls.
+
+During bursts of identical requests (the same triage text, the same report
+being translated) only the first caller, the leader, runs the call; callers
+that arrive with the same key while it is in flight wait for the leader's
+result instead of issuing their own. Once the call finishes the key is
+released, so later callers are served by the response cache instead.
+
+The shared result lives in a concurrent.futures.Future, so threaded callers
+block on it (`do`) and async views await it without holding a pool thread
+(`do_async`), including across the per-request event loops Django uses for
+async views under WSGI. Followers get a deep copy of the result, and a
+leader's exception is raised to every caller.
+"""
+import asyncio
+import copy
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from core.utils.llm_executor import get_executor
+
+_groups = []
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}    # key -> Future
+        self.leaders = 0
+        self.coalesced = 0
+        _groups.append(self)
+
+    def _claim(self, key):
+        """(future, is_leader) for `key`, registering a new flight if none is running."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.leaders += 1
+            return future, True
+
+    def _run(self, key, future, func, args, kwargs):
+        try:
+            result, error = func(*args, **kwargs), None
+        except BaseException as e:
+            result, error = None, e
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, func, *args, **kwargs):
+        """Blocking: run `func(*args, **kwargs)` once per in-flight `key`."""
+        future, leader = self._claim(key)
+        if leader:
+            self._run(key, future, func, args, kwargs)
+            return future.result()
+        return copy.deepcopy(future.result())
+
+    async def do_async(self, key, func, *args, timeout=None, **kwargs):
+        """
+        Async: the leader runs `func` on the Gemini pool; everyone awaits the
+        shared future. Raises asyncio.TimeoutError after `timeout` (default
+        GEMINI_TIMEOUT) without cancelling the call for the other waiters.
+        """
+        if timeout is None:
+            timeout = getattr(settings, 'GEMINI_TIMEOUT', 30)
+        future, leader = self._claim(key)
+        if leader:
+            get_executor().submit(self._run, key, future, func, args, kwargs)
+        result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        return result if leader else copy.deepcopy(result)
+
+    def stats(self):
+        with self._lock:
+            total = self.leaders + self.coalesced
+            return {
+                'name': self.name,
+                'upstream_calls': self.leaders,
+                'coalesced': self.coalesced,
+                'coalesced_rate': round(self.coalesced / total, 4) if total else 0.0,
+                'in_flight': len(self._calls),
+            }
+
+
+def stats():
+    """Counters for every single-flight group in the process."""
+    return [group.stats() for group in _groups]
@@ -1,8 +1,11 @@
+import re
+
 
 SPECIALITY_MAP = {
   # --------------------
   # General Medicine
   # --------------------
+  'general': 'General Medicine',
   'general physician': 'General Medicine',
   'general doctor': 'General Medicine',
   'general practice': 'General Medicine',
@@ -177,20 +180,223 @@ SPECIALITY_MAP = {
   'sugar problem': 'Endocrinology'
 }
 
-def normalize_speciality(speciality):
+# --------------------
+# Multilingual aliases, keyed by the codes in settings.LANGUAGES
+# --------------------
+SPECIALITY_ALIASES_I18N = {
+  'hi': {
+    'सामान्य चिकित्सक': 'General Medicine',
+    'सामान्य चिकित्सा': 'General Medicine',
+    'बुखार': 'General Medicine',
+    'खांसी': 'General Medicine',
+    'सर्दी': 'General Medicine',
+    'हृदय': 'Cardiology',
+    'दिल': 'Cardiology',
+    'सीने में दर्द': 'Cardiology',
+    'सिरदर्द': 'Neurology',
+    'त्वचा': 'Dermatology',
+    'बच्चों': 'Pediatrics',
+    'हड्डी': 'Orthopedics',
+    'जोड़ों का दर्द': 'Orthopedics',
+    'आंख': 'Ophthalmology',
+    'पेट दर्द': 'Gastroenterology',
+    'उल्टी': 'Gastroenterology',
+    'गर्भावस्था': 'Gynecology',
+    'स्त्री रोग': 'Gynecology',
+    'किडनी': 'Nephrology',
+    'सांस': 'Pulmonology',
+    'दमा': 'Pulmonology',
+    'मधुमेह': 'Endocrinology',
+    'थायराइड': 'Endocrinology',
+    'आपातकाल': 'Emergency Care',
+    'चिंता': 'Psychiatry',
+    'कान': 'ENT',
+  },
+  'mr': {
+    'ताप': 'General Medicine',
+    'खोकला': 'General Medicine',
+    'छातीत दुखणे': 'Cardiology',
+    'डोकेदुखी': 'Neurology',
+    'लहान मुले': 'Pediatrics',
+    'हाड': 'Orthopedics',
+    'सांधेदुखी': 'Orthopedics',
+    'डोळे': 'Ophthalmology',
+    'पोटदुखी': 'Gastroenterology',
+    'उलटी': 'Gastroenterology',
+    'गर्भधारणा': 'Gynecology',
+    'मूत्रपिंड': 'Nephrology',
+  },
+  'gu': {
+    'તાવ': 'General Medicine',
+    'ઉધરસ': 'General Medicine',
+    'શરદી': 'General Medicine',
+    'હૃદય': 'Cardiology',
+    'છાતીમાં દુખાવો': 'Cardiology',
+    'માથાનો દુખાવો': 'Neurology',
+    'ચામડી': 'Dermatology',
+    'બાળક': 'Pediatrics',
+    'હાડકા': 'Orthopedics',
+    'સાંધાનો દુખાવો': 'Orthopedics',
+    'આંખ': 'Ophthalmology',
+    'પેટમાં દુખાવો': 'Gastroenterology',
+    'ઉલટી': 'Gastroenterology',
+    'ગર્ભાવસ્થા': 'Gynecology',
+    'કિડની': 'Nephrology',
+    'ડાયાબિટીસ': 'Endocrinology',
+    'કાન': 'ENT',
+  },
+  'pa': {
+    'ਬੁਖਾਰ': 'General Medicine',
+    'ਖੰਘ': 'General Medicine',
+    'ਦਿਲ': 'Cardiology',
+    'ਛਾਤੀ ਵਿੱਚ ਦਰਦ': 'Cardiology',
+    'ਸਿਰਦਰਦ': 'Neurology',
+    'ਚਮੜੀ': 'Dermatology',
+    'ਬੱਚੇ': 'Pediatrics',
+    'ਹੱਡੀ': 'Orthopedics',
+    'ਅੱਖ': 'Ophthalmology',
+    'ਪੇਟ ਦਰਦ': 'Gastroenterology',
+    'ਉਲਟੀ': 'Gastroenterology',
+    'ਗਰਭ': 'Gynecology',
+    'ਗੁਰਦੇ': 'Nephrology',
+    'ਦਮਾ': 'Pulmonology',
+    'ਸ਼ੂਗਰ': 'Endocrinology',
+    'ਕੰਨ': 'ENT',
+  },
+  'bn': {
+    'জ্বর': 'General Medicine',
+    'কাশি': 'General Medicine',
+    'সর্দি': 'General Medicine',
+    'হৃদরোগ': 'Cardiology',
+    'বুকে ব্যথা': 'Cardiology',
+    'মাথাব্যথা': 'Neurology',
+    'ত্বক': 'Dermatology',
+    'শিশু': 'Pediatrics',
+    'হাড়': 'Orthopedics',
+    'চোখ': 'Ophthalmology',
+    'পেটে ব্যথা': 'Gastroenterology',
+    'বমি': 'Gastroenterology',
+    'গর্ভাবস্থা': 'Gynecology',
+    'কিডনি': 'Nephrology',
+    'হাঁপানি': 'Pulmonology',
+    'ডায়াবেটিস': 'Endocrinology',
+    'কান': 'ENT',
+  },
+  'ta': {
+    'காய்ச்சல்': 'General Medicine',
+    'இருமல்': 'General Medicine',
+    'சளி': 'General Medicine',
+    'இதயம்': 'Cardiology',
+    'நெஞ்சு வலி': 'Cardiology',
+    'தலைவலி': 'Neurology',
+    'தோல்': 'Dermatology',
+    'குழந்தை': 'Pediatrics',
+    'எலும்பு': 'Orthopedics',
+    'கண்': 'Ophthalmology',
+    'வயிற்று வலி': 'Gastroenterology',
+    'வாந்தி': 'Gastroenterology',
+    'கர்ப்பம்': 'Gynecology',
+    'சிறுநீரகம்': 'Nephrology',
+    'ஆஸ்துமா': 'Pulmonology',
+    'சர்க்கரை நோய்': 'Endocrinology',
+    'காது': 'ENT',
+  },
+  'te': {
+    'జ్వరం': 'General Medicine',
+    'దగ్గు': 'General Medicine',
+    'జలుబు': 'General Medicine',
+    'గుండె': 'Cardiology',
+    'ఛాతీ నొప్పి': 'Cardiology',
+    'తలనొప్పి': 'Neurology',
+    'చర్మం': 'Dermatology',
+    'పిల్లల': 'Pediatrics',
+    'ఎముక': 'Orthopedics',
+    'కన్ను': 'Ophthalmology',
+    'కడుపు నొప్పి': 'Gastroenterology',
+    'వాంతులు': 'Gastroenterology',
+    'గర్భం': 'Gynecology',
+    'మూత్రపిండాలు': 'Nephrology',
+    'ఆస్తమా': 'Pulmonology',
+    'మధుమేహం': 'Endocrinology',
+    'చెవి': 'ENT',
+  },
+}
+
+
+def build_alias_table():
+    """
+    Flatten SPECIALITY_MAP, the canonical speciality names themselves and every
+    language's aliases into one {alias: speciality} table.
+    """
+    table = {value.lower(): value for value in SPECIALITY_MAP.values()}
+    table.update(SPECIALITY_MAP)
+    for lang, aliases in SPECIALITY_ALIASES_I18N.items():
+        for alias, value in aliases.items():
+            alias = alias.lower()
+            if table.get(alias, value) != value:
+                raise ValueError(f"Conflicting speciality alias {alias!r} ({lang})")
+            table[alias] = value
+    return table
+
+
+def _trie_pattern(node):
+    """Render a character trie as a regex; '' marks the end of an alias."""
+    terminal = '' in node
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if terminal:
+        # Greedy optional: try the longer alias first, fall back to this one
+        body = ('(?:' + body + ')?') if len(branches) == 1 else body + '?'
+    return body
+
+
+def compile_matcher(aliases):
+    """
+    Compile every alias into one trie-shaped regex, so each start position
+    costs a single branch per character instead of one attempt per alias,
+    and the longest alias at a position wins. Wrapping it in a lookahead makes
+    finditer report a match at every start position (overlapping aliases are
+    all seen); each alias must start and end on a word boundary, so 'ear'
+    does not match inside 'earlier' (a longer alias ending mid-word gives way
+    to a shorter one that ends cleanly).
+    """
+    trie = {}
+    for alias in aliases:
+        node = trie
+        for ch in alias:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+    return re.compile(rf'(?<!\w)(?=({_trie_pattern(trie)})(?!\w))')
+
+
+ALIAS_TABLE = build_alias_table()
+ALIAS_PATTERN = compile_matcher(ALIAS_TABLE)
+
+
+def match_speciality(speciality):
+    """The canonical speciality named in `speciality`, or None when no alias matches."""
     if not speciality:
-        return 'General Medicine'
+        return None
 
     normalized = speciality.lower().strip()
 
     # 1. Exact match
-    if normalized in SPECIALITY_MAP:
-        return SPECIALITY_MAP[normalized]
+    if normalized in ALIAS_TABLE:
+        return ALIAS_TABLE[normalized]
+
+    # 2. Longest alias found anywhere in the text wins; ties go to the earliest
+    best = None
+    for match in ALIAS_PATTERN.finditer(normalized):
+        alias = match.group(1)
+        if best is None or len(alias) > len(best):
+            best = alias
+    if best is not None:
+        return ALIAS_TABLE[best]
+    return None
 
-    # 2. Partial match
-    for key, val in SPECIALITY_MAP.items():
-        if key in normalized:
-            return val
 
-    # 3. Final fallback
-    return 'General Medicine'
+def normalize_speciality(speciality):
+    # Final fallback for text no alias matches
+    return match_speciality(speciality) or 'General Medicine'
@@ -0,0 +1,158 @@
+"""
+Synthetic hospital/doctor catalogue for benchmarks and scale testing.
+
+Hospitals are spread over real Indian cities with a long-tailed size
+distribution, and scattered a few kilometres around each city centre.
+Specialities come from the canonical names in SPECIALITY_MAP, and facilities
+and beds follow the per-type ranges used by populate_facilities_doctors.
+Output is deterministic for a given seed.
+"""
+import random
+import uuid
+
+from django.db import transaction
+
+from core.utils.speciality_mapper import SPECIALITY_MAP
+
+# (city, lat, lng, pincode prefix, relative weight)
+CITIES = [
+    ('Mumbai', 19.0760, 72.8777, '400', 18), ('Delhi', 28.6139, 77.2090, '110', 17),
+    ('Bengaluru', 12.9716, 77.5946, '560', 12), ('Hyderabad', 17.3850, 78.4867, '500', 10),
+    ('Ahmedabad', 23.0225, 72.5714, '380', 9), ('Chennai', 13.0827, 80.2707, '600', 9),
+    ('Kolkata', 22.5726, 88.3639, '700', 9), ('Pune', 18.5204, 73.8567, '411', 7),
+    ('Jaipur', 26.9124, 75.7873, '302', 5), ('Surat', 21.1702, 72.8311, '395', 5),
+    ('Lucknow', 26.8467, 80.9462, '226', 4), ('Nagpur', 21.1458, 79.0882, '440', 3),
+    ('Indore', 22.7196, 75.8577, '452', 3), ('Vadodara', 22.3072, 73.1812, '390', 3),
+    ('Rajkot', 22.3039, 70.8022, '360', 2), ('Chandigarh', 30.7333, 76.7794, '160', 2),
+    ('Coimbatore', 11.0168, 76.9558, '641', 2), ('Gandhinagar', 23.2156, 72.6369, '382', 1),
+]
+
+SPECIALITIES = sorted(set(SPECIALITY_MAP.values()))
+CORE_SPECIALITIES = ['General Medicine', 'Emergency Care', 'Pediatrics', 'Gynecology', 'Orthopedics']
+
+HOSPITAL_TYPES = [('private', 50), ('government', 20), ('trust', 15), ('premium', 10), ('unknown', 5)]
+COST_FACTOR = {'government': (0.7, 0.9), 'trust': (0.85, 1.0), 'private': (1.0, 1.25),
+               'premium': (1.25, 1.5), 'unknown': (0.9, 1.2)}
+BEDS = {'government': (200, 500), 'premium': (100, 300), 'private': (50, 200),
+        'trust': (80, 250), 'unknown': (20, 100)}
+
+NAME_PREFIXES = ['City', 'Sunrise', 'Lifeline', 'Apex', 'Shree', 'Sanjeevani', 'Global', 'Care', 'Metro',
+                 'Arogya', 'Prime', 'Unity', 'Green Valley', 'Sahyadri', 'Navjeevan', 'Medicity']
+NAME_SUFFIXES = ['Hospital', 'Multispeciality Hospital', 'Medical Centre', 'Clinic & Nursing Home',
+                 'Institute of Medical Sciences', 'Health Care', 'Super Speciality Hospital']
+AREAS = ['Station Road', 'MG Road', 'Ring Road', 'Civil Lines', 'Sector 12', 'Nehru Nagar', 'Market Yard',
+         'Old City', 'University Road', 'Industrial Area', 'Lake View', 'Gandhi Chowk']
+SCHEMES = ['Ayushman Bharat PM-JAY', 'CGHS', 'ESIC', 'Private Insurance', 'Corporate Tie-ups',
+           'Mukhyamantri Amrutum Yojana']
+
+FIRST_NAMES = ['Amit', 'Priya', 'Rahul', 'Sneha', 'Vikram', 'Anjali', 'Rohan', 'Kavita', 'Arjun', 'Meera',
+               'Sanjay', 'Pooja', 'Nikhil', 'Divya', 'Karan', 'Neha', 'Suresh', 'Lakshmi', 'Imran', 'Fatima']
+LAST_NAMES = ['Shah', 'Patel', 'Sharma', 'Iyer', 'Reddy', 'Mehta', 'Gupta', 'Nair', 'Desai', 'Kulkarni',
+              'Banerjee', 'Singh', 'Khan', 'Joshi', 'Rao', 'Chatterjee']
+QUALIFICATIONS = ['MBBS', 'MBBS, MD', 'MBBS, MS', 'MBBS, DNB', 'MBBS, MD, DM', 'MBBS, MS, MCh']
+CONSULTATION_DAYS = ['Mon-Sat', 'Mon-Fri', 'Mon, Wed, Fri', 'Tue, Thu, Sat', 'All days']
+
+
+def generate_hospitals(count, rng):
+    """Yield `count` unsaved Hospital instances."""
+    from core.models import Hospital
+
+    cities = [c[:4] for c in CITIES]
+    city_weights = [c[4] for c in CITIES]
+    types = [t for t, _ in HOSPITAL_TYPES]
+    type_weights = [w for _, w in HOSPITAL_TYPES]
+
+    for i in range(count):
+        city, lat, lng, pin_prefix = rng.choices(cities, city_weights)[0]
+        hospital_type = rng.choices(types, type_weights)[0]
+        low, high = COST_FACTOR[hospital_type]
+        beds = rng.randint(*BEDS[hospital_type])
+        n_specialities = rng.randint(2, 4) if hospital_type == 'unknown' else rng.randint(3, 10)
+        specialities = rng.sample(CORE_SPECIALITIES, 1) + rng.sample(SPECIALITIES, n_specialities)
+
+        yield Hospital(
+            name=f"{rng.choice(NAME_PREFIXES)} {rng.choice(NAME_SUFFIXES)} #{i + 1}",
+            address=f"{rng.randint(1, 400)}, {rng.choice(AREAS)}",
+            city=city,
+            pincode=f"{pin_prefix}{rng.randint(0, 999):03d}",
+            lat=round(lat + rng.gauss(0, 0.08), 5),
+            lng=round(lng + rng.gauss(0, 0.08), 5),
+            contact=f"0{rng.randint(20, 99)}-{rng.randint(20000000, 99999999)}",
+            ambulance_contact='108' if hospital_type == 'government' else f"+91 {rng.randint(7000000000, 9999999999)}",
+            specialities=list(dict.fromkeys(specialities)),
+            hospital_type=hospital_type,
+            rating=round(min(5.0, max(2.5, rng.gauss(4.0, 0.45))), 1),
+            acceptedSchemes=[
+                {'schemeName': name, 'schemeId': str(uuid.UUID(int=rng.getrandbits(128)))}
+                for name in rng.sample(SCHEMES, rng.randint(1, 3))
+            ],
+            base_cost_factor=round(rng.uniform(low, high), 2),
+            total_beds=beds,
+            icu_beds=beds // rng.randint(8, 15),
+            emergency_beds=beds // rng.randint(5, 10),
+            facilities={
+                'xray': True,
+                'mri': hospital_type in ('government', 'premium') or rng.random() < 0.5,
+                'ct_scan': hospital_type in ('government', 'premium') or rng.random() < 0.6,
+                'ultrasound': True,
+                'blood_bank': hospital_type != 'unknown' or rng.random() < 0.3,
+                'laboratory': True,
+                'pharmacy': True,
+                'ambulance': hospital_type != 'unknown' or rng.random() < 0.5,
+                'operation_theaters': rng.randint(1, 15),
+            },
+        )
+
+
+def generate_doctors(hospital, count, rng):
+    """Yield `count` unsaved Doctor instances for a saved `hospital`."""
+    from core.models import Doctor
+
+    for i in range(count):
+        speciality = rng.choice(hospital.specialities) if hospital.specialities else 'General Medicine'
+        yield Doctor(
+            hospital=hospital,
+            name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            qualification=f"{rng.choice(QUALIFICATIONS)} ({speciality})",
+            specialization=speciality,
+            experience_years=rng.randint(2, 35),
+            is_head_doctor=i == 0,
+            consultation_days=rng.choice(CONSULTATION_DAYS),
+        )
+
+
+def load_catalogue(hospitals, doctors, seed=42, batch_size=2000, progress=None):
+    """
+    Bulk-insert `hospitals` hospitals and about `doctors` doctors spread
+    over them, including the HospitalSpeciality index rows. `progress(done)`
+    is called after each hospital batch. Returns the (hospitals, doctors)
+    counts created.
+    """
+    from core.models import Doctor, Hospital
+    from core.utils.geo import invalidate_spatial_index
+    from core.utils.hospital_facets import invalidate_filter_facets
+
+    rng = random.Random(seed)
+    per_hospital = doctors / hospitals if hospitals else 0
+    created_hospitals = created_doctors = 0
+    generator = generate_hospitals(hospitals, rng)
+
+    while created_hospitals < hospitals:
+        batch = [h for _, h in zip(range(batch_size), generator)]
+        with transaction.atomic():
+            Hospital.objects.bulk_create(batch)
+            Hospital.bulk_sync_speciality_index(batch, batch_size=batch_size)
+            staff = []
+            for h in batch:
+                # Spread the remainder so the total lands on `doctors`
+                target = int(per_hospital * (created_hospitals + 1)) - int(per_hospital * created_hospitals)
+                staff.extend(generate_doctors(h, target, rng))
+                created_hospitals += 1
+            Doctor.objects.bulk_create(staff, batch_size=batch_size * 5)
+            created_doctors += len(staff)
+        if progress:
+            progress(created_hospitals)
+
+    invalidate_filter_facets()
+    invalidate_spatial_index()
+    return created_hospitals, created_doctors
@@ -1,13 +1,33 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from core.models import Hospital, LabReportHistory
 from core.utils.gemini import analyze_symptoms as gemini_analyze, analyze_lab_report as gemini_analyze_lab, translate_lab_result
-from core.utils.cost import compute_cost_range, format_cost_text
+from core.utils.gemini import analyze_lab_report_localized as gemini_analyze_lab_localized
+from core.utils.gemini import get_default_response, get_default_lab_response, stream_symptoms_analysis
+from core.utils.lab_upload import LabUpload, UploadRejected, max_upload_bytes
+from core.utils.llm_executor import iterate_blocking, run_blocking
+from core.utils.local_triage import answer_locally
+from core.utils.response_cache import make_key
+from core.utils.singleflight import SingleFlight
+from core.utils import metrics, profiler, singleflight
+from core.utils import gemini_client
+from core.utils.cost import budget_filter_q, compute_cost_ranges, format_cost_text
 from core.utils.speciality_mapper import normalize_speciality
+from core.utils.hospital_facets import get_filter_facets
+from core.utils.pagination import get_page_size, paginate_keyset
+from core.utils.geo import get_spatial_index
 from django.utils.translation import get_language
+from django.db.models import Case, CharField, Count, F, Value, When
+from django.db.models.functions import Lower
+import asyncio
 import json
+import math
+import queue
 import re
+import threading
 from django.utils import timezone
 from datetime import timedelta
 
@@ -23,11 +43,41 @@ LANG_NAMES = {
     'te': 'Telugu',
 }
 
+# Columns /api/hospitals needs (skips the JSON blobs it never reads)
+SEARCH_FIELDS = (
+    'id', 'name', 'address', 'city', 'rating', 'hospital_type', 'lat', 'lng', 'base_cost_factor',
+)
+
+# Upper bounds for /api/hospitals/nearby
+MAX_NEARBY_RADIUS_KM = 500
+MAX_NEARBY_RESULTS = 50
+
+# Room for the multipart boundaries and headers around an uploaded lab report
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Columns the /hospitals/ listing cards actually render
+LISTING_FIELDS = (
+    'id', 'name', 'address', 'city', 'pincode', 'rating', 'hospital_type',
+    'lat', 'lng', 'specialities', 'total_beds', 'facilities', 'ambulance_contact',
+)
+
+# Concurrent identical /api/analyze requests share one Gemini call
+analyze_flights = SingleFlight('analyze')
+
+def async_csrf_exempt(view_func):
+    """csrf_exempt for coroutine views; Django 4.2's decorator wraps them in a sync function."""
+    view_func.csrf_exempt = True
+    return view_func
+
 def index(request):
     return render(request, 'core/index.html')
 
-@csrf_exempt
-def analyze_symptoms(request):
+async def local_analysis_event(analysis, lang_name):
+    yield {'event': 'analysis', 'analysis': analysis, 'response_language': lang_name}
+
+
+@async_csrf_exempt
+async def analyze_symptoms(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
@@ -41,55 +91,354 @@ def analyze_symptoms(request):
             lang_code = get_language() or 'en'
             lang_name = LANG_NAMES.get(lang_code, 'English')
                 
-            analysis = gemini_analyze(symptoms_text, location, response_language=lang_name)
+            # Local tier: confident keyword matches are answered without Gemini
+            analysis = answer_locally(symptoms_text, lang_name)
+            stream = request.GET.get('stream') == '1'
+            if analysis is not None:
+                if stream:
+                    return sse_response(request, local_analysis_event(analysis, lang_name))
+                return JsonResponse({'analysis': analysis, 'response_language': lang_name})
+
+            # With ?stream=1 the fields are sent as Server-Sent Events while Gemini writes them
+            events = triage_analysis_events(symptoms_text, location, lang_name, stream_tokens=stream)
+            if stream:
+                return sse_response(request, events)
+            async for event in events:
+                analysis = event['analysis']
             return JsonResponse({'analysis': analysis, 'response_language': lang_name})
         except Exception as e:
             print(f"Analyze error: {e}")
             return JsonResponse({'error': 'analysis failed'}, status=500)
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
+def parse_budget(value):
+    """A budget parameter as a float, None when it is absent; raises ValueError unless finite and >= 0."""
+    if value in (None, ''):
+        return None
+    try:
+        budget = float(value)
+    except TypeError:
+        raise ValueError(f'budget is not a number: {value!r}')
+    if not math.isfinite(budget) or budget < 0:
+        raise ValueError(f'budget out of range: {value!r}')
+    return budget
+
+
+def find_hospitals(speciality, city, disease=None, budget=None, cursor=None, page_size=None):
+    """One page of hospitals offering `speciality` in `city`: (rows, next_cursor)."""
+    normalized_speciality = normalize_speciality(speciality)
+
+    # Single indexed query: LOWER(city) expression index + HospitalSpeciality lookup
+    filtered_hospitals = Hospital.objects.alias(
+        city_key=Lower('city')
+    ).filter(
+        city_key=city.lower(),
+        speciality_index__name=normalized_speciality,
+    ).only(*SEARCH_FIELDS)
+
+    # Budget filter runs in SQL so every page is full of affordable hospitals
+    if budget:
+        filtered_hospitals = filtered_hospitals.filter(budget_filter_q(disease or "Dengue", city, float(budget)))
+
+    return paginate_keyset(filtered_hospitals, cursor, page_size)
+
+
+def enrich_hospitals(hospitals, disease, city):
+    """Result cards for `hospitals` rows, with cost estimates for `disease` (no queries)."""
+    # One pass over the page: disease/severity/city resolved once for all rows
+    costs = compute_cost_ranges(disease or "Dengue", city, hospitals)
+
+    enriched_hospitals = []
+    for h, low, high in zip(hospitals, costs['low'], costs['high']):
+        enriched = {
+            'name': h.name,
+            'id': h.id,
+            'address': h.address,
+            'city': h.city,
+            'rating': h.rating,
+            'hospital_type': h.hospital_type,
+            'lat': h.lat,
+            'lng': h.lng,
+            'map_url': f"https://www.google.com/maps?q={h.lat},{h.lng}" if h.lat and h.lng else None,
+            'computed_cost': { 'low': low, 'high': high },
+            'cost_text': format_cost_text(low, high)
+        }
+        enriched_hospitals.append(enriched)
+    return enriched_hospitals
+
+
 def search_hospitals(request):
     try:
         speciality = request.GET.get('speciality')
         city = request.GET.get('city')
         disease = request.GET.get('disease')
-        budget = request.GET.get('budget')
+        cursor = request.GET.get('cursor')
+        page_size = get_page_size(request.GET.get('page_size'))
         
         if not speciality or not city:
             return JsonResponse({'error': 'speciality and city are required'}, status=400)
+        try:
+            budget = parse_budget(request.GET.get('budget'))
+        except ValueError:
+            return JsonResponse({'error': 'budget must be a non-negative number'}, status=400)
 
-        normalized_speciality = normalize_speciality(speciality)
-        
-        # Case-insensitive substring match for city to match original logic regex `^${city}$` 'i'
-        # Actually original was exact match case-insensitive
-        hospitals = Hospital.objects.filter(
-            city__iexact=city,
-            specialities__contains=[normalized_speciality] # For JSONField list containment
-        ).all()
-            
-        # If JSONField containment query isn't standard in SQLite/Django for simple lists without specific DB drivers,
-        # we might need to filter in python or use specific lookups.
-        # SQLite JSON support is decent in modern Django.
-        # Let's try standard filter first. If it fails, we fetch all by city and filter in python.
-        
-        # Fallback if specific DB backend issues:
-        # hospitals = Hospital.objects.filter(city__iexact=city)
-        # hospitals = [h for h in hospitals if normalized_speciality in h.specialities]
-        
-        # Since we want to reproduce specific features, relying on DB JSON lookup might be risky if not configured.
-        # Let's implement Python filtering for safety on SQLite
-        candidates = Hospital.objects.filter(city__iexact=city)
-        filtered_hospitals = []
-        for h in candidates:
-            if normalized_speciality in h.specialities:
-                filtered_hospitals.append(h)
-                
-        enriched_hospitals = []
-        for h in filtered_hospitals:
-            used_disease = disease if disease else "Dengue"
-            cost_data = compute_cost_range(used_disease, city, h)
-            
-            enriched = {
+        hospitals, next_cursor = find_hospitals(speciality, city, disease, budget, cursor, page_size)
+        return JsonResponse({'hospitals': enrich_hospitals(hospitals, disease, city), 'next': next_cursor})
+
+    except Exception as e:
+        print(f"Hospital search error: {e}")
+        return JsonResponse({'error': 'Failed to fetch hospitals'}, status=500)
+
+
+# ─── Combined triage + hospital search ───────────────────────────────────────
+
+def top_disease(analysis):
+    """The disease the results page prices hospitals for (first candidate)."""
+    diseases = analysis.get('possible_diseases') or []
+    return (diseases[0].get('name') if diseases and isinstance(diseases[0], dict) else None) or 'General'
+
+
+async def triage_analysis_events(symptoms_text, city, lang_name, stream_tokens=False):
+    """
+    Gemini triage as events, ending with {'event': 'analysis', ...}. With
+    stream_tokens the reply is streamed and 'field' (urgency, speciality,
+    confidence) and 'disease' events arrive while Gemini is still writing;
+    otherwise identical concurrent requests share one call.
+    """
+    try:
+        if stream_tokens:
+            async for event in iterate_blocking(stream_symptoms_analysis, symptoms_text, city, lang_name):
+                if event['event'] == 'result':
+                    yield {'event': 'analysis', 'analysis': event['analysis'], 'response_language': lang_name}
+                    return
+                yield event
+        # Identical concurrent requests await one shared call without holding a pool thread
+        analysis = await analyze_flights.do_async(
+            make_key('triage', symptoms_text, city, lang_name),
+            gemini_analyze, symptoms_text, city, response_language=lang_name,
+        )
+    except asyncio.TimeoutError:
+        print("Triage timeout: serving local fallback")
+        metrics.GEMINI_FALLBACKS.inc(operation='triage', reason='timeout')
+        analysis = get_default_response(symptoms_text)
+    yield {'event': 'analysis', 'analysis': analysis, 'response_language': lang_name}
+
+
+async def triage_events(symptoms_text, city, lang_name, budget=None, stream_tokens=False):
+    """
+    Triage `symptoms_text` and find hospitals for it, yielding events as dicts:
+    {'event': 'hospitals'|'analysis'|'field'|'disease', ...}. The hospital
+    search for the locally predicted speciality starts before Gemini is
+    called; when Gemini agrees on the speciality (and on the disease, if a
+    budget filter depends on it) that page is reused, otherwise hospitals are
+    looked up again. A 'hospitals' event with final=False may arrive before
+    the analysis; the last event is always the final hospital list.
+    """
+    local = answer_locally(symptoms_text, lang_name)
+    guess = local or get_default_response(symptoms_text)
+    guess_speciality = normalize_speciality(guess['speciality'])
+    search = asyncio.ensure_future(sync_to_async(find_hospitals)(guess_speciality, city, top_disease(guess), budget))
+
+    if local is not None:
+        rows, next_cursor = await search
+        metrics.TRIAGE_SPECULATION.inc(outcome='local')
+        yield {'event': 'analysis', 'analysis': local, 'response_language': lang_name}
+        yield {'event': 'hospitals', 'hospitals': enrich_hospitals(rows, top_disease(local), city),
+               'next': next_cursor, 'speciality': guess_speciality, 'final': True}
+        return
+
+    # Relay Gemini's events, slipping the speculative page in as soon as it is ready
+    gemini = triage_analysis_events(symptoms_text, city, lang_name, stream_tokens)
+    pending = None
+    try:
+        pending = asyncio.ensure_future(anext(gemini))
+        shown = False
+        while True:
+            await asyncio.wait({pending} if shown else {pending, search}, return_when=asyncio.FIRST_COMPLETED)
+            if not shown and search.done():
+                shown = True
+                analysis_ready = pending.done() and pending.result()['event'] == 'analysis'
+                if not analysis_ready and not search.exception():
+                    rows, next_cursor = search.result()
+                    yield {'event': 'hospitals', 'hospitals': enrich_hospitals(rows, top_disease(guess), city),
+                           'next': next_cursor, 'speciality': guess_speciality, 'final': False}
+            if not pending.done():
+                continue
+            event = pending.result()
+            yield event
+            if event['event'] == 'analysis':
+                analysis = event['analysis']
+                break
+            pending = asyncio.ensure_future(anext(gemini))
+
+        speciality = normalize_speciality(analysis.get('speciality') or 'General Medicine')
+        disease = top_disease(analysis)
+        speculative = None
+        if speciality == guess_speciality and (not budget or disease == top_disease(guess)):
+            try:
+                speculative = await search
+            except Exception as e:
+                print(f"Speculative hospital search error: {e}")
+        if speculative is not None:
+            metrics.TRIAGE_SPECULATION.inc(outcome='hit')
+            rows, next_cursor = speculative
+        else:
+            metrics.TRIAGE_SPECULATION.inc(outcome='miss')
+            search.cancel()
+            rows, next_cursor = await sync_to_async(find_hospitals)(speciality, city, disease, budget)
+        yield {'event': 'hospitals', 'hospitals': enrich_hospitals(rows, disease, city),
+               'next': next_cursor, 'speciality': speciality, 'final': True}
+    finally:
+        # Also reached when the client disconnects and the response closes the generator
+        search.cancel()
+        if pending is not None and not pending.done():
+            pending.cancel()
+            await asyncio.wait({pending})
+        await gemini.aclose()
+
+
+async def _sse_stream(events):
+    try:
+        async for event in events:
+            data = {key: value for key, value in event.items() if key != 'event'}
+            yield f"event: {event['event']}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    except Exception as e:
+        print(f"Triage stream error: {e}")
+        yield 'event: error\ndata: {"error": "analysis failed"}\n\n'
+
+
+_STREAM_END = object()
+
+
+def _sync_stream(chunks):
+    """
+    Serve the async generator `chunks` as a plain generator. It runs on its
+    own event loop in a thread and every chunk is handed over as soon as it
+    is produced; closing this generator (the client went away) cancels and
+    closes `chunks`.
+    """
+    handoff = queue.Queue()
+    loop = asyncio.new_event_loop()
+
+    async def pump():
+        try:
+            async for chunk in chunks:
+                handoff.put(chunk)
+        finally:
+            await chunks.aclose()
+            handoff.put(_STREAM_END)
+
+    task = loop.create_task(pump())
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+
+    thread = threading.Thread(target=run, name='stream', daemon=True)
+    thread.start()
+    try:
+        while (chunk := handoff.get()) is not _STREAM_END:
+            yield chunk
+    finally:
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join()
+        loop.close()
+
+
+def stream_response(request, chunks, content_type):
+    """
+    StreamingHttpResponse over the async generator `chunks` that reaches the
+    client chunk by chunk under both servers: Django buffers a whole async
+    iterator under WSGI (and a sync one under ASGI), so WSGI requests get
+    the _sync_stream bridge.
+    """
+    if not isinstance(request, ASGIRequest):
+        chunks = _sync_stream(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def sse_response(request, events):
+    """Stream event dicts ({'event': name, ...}) to the browser as Server-Sent Events."""
+    return stream_response(request, _sse_stream(events), 'text/event-stream')
+
+
+@async_csrf_exempt
+async def triage_view(request):
+    """
+    POST endpoint: symptoms triage and matching hospitals in one round trip.
+    With ?stream=1 the events are sent as Server-Sent Events: the hospital
+    list and the triage fields (urgency first) are painted while Gemini is
+    still writing.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    try:
+        data = json.loads(request.body)
+        symptoms_text = data.get('symptoms_text')
+        city = data.get('location')
+        if not symptoms_text or not city:
+            return JsonResponse({'error': 'symptoms_text and location are required'}, status=400)
+        try:
+            budget = parse_budget(data.get('budget'))
+        except ValueError:
+            return JsonResponse({'error': 'budget must be a non-negative number'}, status=400)
+
+        lang_code = get_language() or 'en'
+        lang_name = LANG_NAMES.get(lang_code, 'English')
+        if request.GET.get('stream') == '1':
+            return sse_response(request, triage_events(symptoms_text, city, lang_name, budget, stream_tokens=True))
+
+        events = triage_events(symptoms_text, city, lang_name, budget)
+
+        result = {'response_language': lang_name}
+        async for event in events:
+            if event['event'] == 'analysis':
+                result['analysis'] = event['analysis']
+            elif event['final']:
+                result.update(hospitals=event['hospitals'], next=event['next'])
+        return JsonResponse(result)
+    except Exception as e:
+        print(f"Triage error: {e}")
+        return JsonResponse({'error': 'analysis failed'}, status=500)
+
+def nearby_hospitals(request):
+    """k-nearest hospitals around a point, optionally restricted to a speciality."""
+    try:
+        lat = float(request.GET.get('lat', ''))
+        lng = float(request.GET.get('lng', ''))
+    except ValueError:
+        return JsonResponse({'error': 'lat and lng are required'}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return JsonResponse({'error': 'lat/lng out of range'}, status=400)
+
+    try:
+        radius = float(request.GET.get('radius') or 25)
+        limit = int(request.GET.get('limit') or 10)
+    except ValueError:
+        return JsonResponse({'error': 'radius and limit must be numbers'}, status=400)
+    radius = max(0.1, min(radius, MAX_NEARBY_RADIUS_KM))
+    limit = max(1, min(limit, MAX_NEARBY_RESULTS))
+
+    speciality = request.GET.get('speciality')
+    normalized_speciality = normalize_speciality(speciality) if speciality else None
+
+    try:
+        matches = get_spatial_index().nearest(lat, lng, k=limit, radius_km=radius, speciality=normalized_speciality)
+        by_id = Hospital.objects.in_bulk([pk for _, pk in matches])
+
+        results = []
+        for distance, pk in matches:
+            h = by_id.get(pk)
+            if h is None:  # deleted since the index was built
+                continue
+            results.append({
                 'name': h.name,
                 'id': h.id,
                 'address': h.address,
@@ -98,22 +447,14 @@ def search_hospitals(request):
                 'hospital_type': h.hospital_type,
                 'lat': h.lat,
                 'lng': h.lng,
+                'distance_km': round(distance, 2),
+                'ambulance_contact': h.ambulance_contact,
                 'map_url': f"https://www.google.com/maps?q={h.lat},{h.lng}" if h.lat and h.lng else None,
-                'computed_cost': { 'low': cost_data['low'], 'high': cost_data['high'] },
-                'cost_text': format_cost_text(cost_data['low'], cost_data['high'])
-            }
-            enriched_hospitals.append(enriched)
-            
-        # Budget filter
-        if budget:
-            budget_val = float(budget)
-            enriched_hospitals = [h for h in enriched_hospitals if h['computed_cost']['low'] <= budget_val]
-            
-        return JsonResponse({'hospitals': enriched_hospitals})
-        
+            })
+        return JsonResponse({'hospitals': results, 'speciality': normalized_speciality, 'radius_km': radius})
 
     except Exception as e:
-        print(f"Hospital search error: {e}")
+        print(f"Nearby hospital search error: {e}")
         return JsonResponse({'error': 'Failed to fetch hospitals'}, status=500)
 
 def all_hospitals(request):
@@ -126,7 +467,7 @@ def all_hospitals(request):
     hospitals = Hospital.objects.all()
 
     if city_filter:
-        hospitals = hospitals.filter(city__iexact=city_filter)
+        hospitals = hospitals.alias(city_key=Lower('city')).filter(city_key=city_filter.lower())
     
     if type_filter:
         hospitals = hospitals.filter(hospital_type__iexact=type_filter)
@@ -141,51 +482,40 @@ def all_hospitals(request):
     if pincode_filter:
         hospitals = hospitals.filter(pincode__exact=pincode_filter)
 
-    # Get unique values for filters
-    cities = Hospital.objects.values_list('city', flat=True).distinct().order_by('city')
-    pincodes = Hospital.objects.values_list('pincode', flat=True).distinct().order_by('pincode')
-    types = Hospital.HOSPITAL_TYPES
+    # One annotated, values-only query; per-card display bits are template filters
+    hospitals = hospitals.annotate(
+        doctor_count=Count('doctors'),
+        hospital_type_label=Case(
+            *[When(hospital_type=code, then=Value(label)) for code, label in Hospital.HOSPITAL_TYPES],
+            default=F('hospital_type'),
+            output_field=CharField(),
+        ),
+    ).values(*LISTING_FIELDS, 'doctor_count', 'hospital_type_label')
 
-    # Enrich hospitals for template
-    enriched_hospitals = []
-    for h in hospitals:
-        # Get facility highlights
-        facilities = h.facilities or {}
-        key_equipment = []
-        if facilities.get('xray'):
-            key_equipment.append('X-Ray')
-        if facilities.get('mri'):
-            key_equipment.append('MRI')
-        if facilities.get('ct_scan'):
-            key_equipment.append('CT Scan')
-        
-        enriched_hospitals.append({
-            'id': h.id,
-            'name': h.name,
-            'address': h.address,
-            'city': h.city,
-            'pincode': h.pincode,
-            'rating': h.rating,
-            'rating_range': range(int(h.rating)) if h.rating else [], # For star loop
-            'hospital_type': h.get_hospital_type_display(),
-            'type_code': h.hospital_type,
-            'lat': h.lat,
-            'lng': h.lng,
-            'map_url': f"https://www.google.com/maps?q={h.lat},{h.lng}" if h.lat and h.lng else None,
-            'specialities': h.specialities[:3], # Show first 3
-            'more_specialities_count': len(h.specialities) - 3 if len(h.specialities) > 3 else 0,
-            'total_beds': h.total_beds,
-            'key_equipment': key_equipment,
-            'doctor_count': h.doctors.count(),
-            'has_ambulance': facilities.get('ambulance', False),
-            'ambulance_contact': h.ambulance_contact
-        })
+    page_size = get_page_size(request.GET.get('page_size'))
+    hospitals, next_cursor = paginate_keyset(hospitals, request.GET.get('cursor'), page_size)
+
+    facets = get_filter_facets()
+
+    # Page links keep the active filters and only swap the cursor
+    next_page_query = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_page_query = params.urlencode()
+    first_page_query = None
+    if request.GET.get('cursor'):
+        params = request.GET.copy()
+        params.pop('cursor')
+        first_page_query = params.urlencode()
 
     context = {
-        'hospitals': enriched_hospitals,
-        'cities': cities,
-        'pincodes': pincodes,
-        'hospital_type_choices': types,
+        'hospitals': hospitals,
+        'cities': facets['cities'],
+        'pincodes': facets['pincodes'],
+        'hospital_type_choices': Hospital.HOSPITAL_TYPES,
+        'next_page_query': next_page_query,
+        'first_page_query': first_page_query,
         'current_filters': {
             'city': city_filter,
             'type': type_filter,
@@ -213,21 +543,189 @@ def hospital_detail(request, pk):
     return render(request, 'core/hospital_detail.html', context)
 
 
+def metrics_view(request):
+    """Prometheus scrape endpoint (text exposition format 0.0.4)."""
+    if not getattr(settings, 'METRICS_ENABLED', True):
+        return JsonResponse({'error': 'Not found'}, status=404)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def gemini_health(request):
+    """
+    Health probe for the shared Gemini client (model metadata round trip).
+    Staff only, like the profiler, unless GEMINI_HEALTH_PUBLIC is set.
+    """
+    if not (getattr(settings, 'GEMINI_HEALTH_PUBLIC', False) or profiler.is_staff(request)):
+        return JsonResponse({'error': 'Not found'}, status=404)
+    status = gemini_client.health()
+    status['coalescing'] = singleflight.stats()
+    return JsonResponse(status, status=200 if status['ok'] else 503)
+
+
 # ─── Lab Report Analyser ─────────────────────────────────────────────────────
 
+def lab_history_entries(before=None, page_size=None):
+    """
+    One page of the history sidebar, newest first: (entries, next_before).
+    Only the summary columns are read; `before` is the id of the last entry
+    already shown (ids follow created_at, which is set on insert).
+    """
+    page_size = page_size or getattr(settings, 'LAB_HISTORY_PAGE_SIZE', 20)
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'LAB_HISTORY_DAYS', 90))
+    entries = LabReportHistory.objects.filter(created_at__gte=cutoff)
+    if before is not None:
+        entries = entries.filter(id__lt=before)
+    entries = list(entries.order_by('-id').values(*LabReportHistory.SUMMARY_FIELDS)[:page_size + 1])
+    next_before = None
+    if len(entries) > page_size:
+        entries = entries[:page_size]
+        next_before = entries[-1]['id']
+    return entries, next_before
+
+
 def lab_report_page(request):
-    """Render the lab report upload page with the last 3 months of history."""
-    cutoff = timezone.now() - timedelta(days=90)
-    history = LabReportHistory.objects.filter(created_at__gte=cutoff)
-    return render(request, 'core/lab_report.html', {'history': history})
+    """Render the lab report upload page with the first page of recent history."""
+    history, next_before = lab_history_entries()
+    return render(request, 'core/lab_report.html', {
+        'history': history, 'history_next': next_before, 'max_upload_bytes': max_upload_bytes(),
+    })
+
+
+def lab_history_view(request):
+    """GET endpoint: the next page of history summaries (?before=<id>) for the sidebar."""
+    try:
+        before = int(request.GET['before']) if request.GET.get('before') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    page_size = get_page_size(request.GET.get('page_size'), getattr(settings, 'LAB_HISTORY_PAGE_SIZE', 20))
+    entries, next_before = lab_history_entries(before, page_size)
+    for entry in entries:
+        entry['created_at'] = entry['created_at'].isoformat()
+    return JsonResponse({'entries': entries, 'next': next_before})
+
+
+def lab_history_entry(request, pk):
+    """GET endpoint: the full stored analysis of one history entry."""
+    entry = LabReportHistory.objects.filter(pk=pk).values('id', 'filename', 'analysis', 'language', 'created_at').first()
+    if entry is None:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    entry['created_at'] = entry['created_at'].isoformat()
+    return JsonResponse(entry)
+
+
+async def find_stored_lab_analysis(content_hash, lang_name):
+    """
+    Look up a previous analysis of the same file: (analysis, language) in the
+    requested language if there is one, else the English one, else (None, None).
+    """
+    if not content_hash:
+        return None, None
+    stored = {}
+    rows = LabReportHistory.objects.filter(
+        content_hash=content_hash, language__in={lang_name, 'English'}
+    ).order_by('-created_at').values_list('language', 'analysis')
+    async for language, analysis in rows:
+        stored.setdefault(language, analysis)
+    for language in (lang_name, 'English'):
+        if language in stored:
+            return stored[language], language
+    return None, None
+
+
+async def lab_report_events(upload, lang_name):
+    """
+    Run the lab report pipeline for a LabUpload, yielding progress events as
+    dicts: {'event': 'status'|'partial'|'result', ...}. 'partial' carries the
+    English analysis while a fallback translation is still running; 'result'
+    is final. Re-uploads of a file analysed before are served from
+    LabReportHistory without preprocessing the file.
+    """
+    filename = upload.name
+    stored, stored_language = await find_stored_lab_analysis(upload.content_hash, lang_name)
+    if stored_language == lang_name:
+        yield {'event': 'result', 'analysis': stored, 'response_language': lang_name, 'cached': True}
+        return
 
+    yield {'event': 'status', 'stage': 'analyzing'}
 
-@csrf_exempt
-def analyze_lab_report_view(request):
-    """POST endpoint: receive a lab report file, analyse with Gemini, save to history."""
+    # Preferred path: one Gemini call returns the analysis already translated
+    translated = lang_name == 'English'
+    if stored is not None:
+        # Same file already analysed in English: only the translation is needed
+        result = stored
+    else:
+        try:
+            # Shrinking the file is CPU-bound (Pillow/pypdf): off the event loop
+            file_bytes, mime_type = await sync_to_async(upload.prepare, thread_sensitive=False)()
+        except UploadRejected as e:
+            yield {'event': 'result', 'analysis': {'error': str(e)}, 'response_language': lang_name, 'history_id': None}
+            return
+        try:
+            if translated or not getattr(settings, 'LAB_REPORT_SINGLE_CALL', True):
+                timeout = gemini_client.operation_timeout('lab_report')
+                result = await run_blocking(gemini_analyze_lab, file_bytes, mime_type, filename, timeout=timeout)
+            else:
+                timeout = gemini_client.operation_timeout('lab_report_localized')
+                result, translated = await run_blocking(gemini_analyze_lab_localized, file_bytes, mime_type, filename,
+                                                        lang_name, timeout=timeout)
+        except asyncio.TimeoutError:
+            print("Lab report analysis timeout")
+            metrics.GEMINI_FALLBACKS.inc(operation='lab_report', reason='timeout')
+            result = get_default_lab_response()
+
+    # Fallback: translate the English analysis in a second call
+    if not translated and 'error' not in result:
+        yield {'event': 'partial', 'analysis': result, 'response_language': 'English'}
+        yield {'event': 'status', 'stage': 'translating'}
+        try:
+            english = result
+            result = await run_blocking(translate_lab_result, result, lang_name,
+                                        timeout=gemini_client.operation_timeout('translate'))
+            translated = result is not english  # translate_lab_result hands back its input on failure
+        except asyncio.TimeoutError:
+            print("Lab report translation timeout: returning English result")
+            metrics.GEMINI_FALLBACKS.inc(operation='translate', reason='timeout')
+
+    # Save to history (English or translated — save whatever the user sees);
+    # a stored English analysis whose translation failed is already there
+    history_id = None
+    if 'error' not in result and (stored is None or translated):
+        entry = await LabReportHistory.objects.acreate(
+            filename=filename,
+            analysis=result,
+            content_hash=upload.content_hash,
+            language=lang_name if translated else 'English',
+        )
+        history_id = entry.id
+
+    yield {'event': 'result', 'analysis': result, 'response_language': lang_name, 'history_id': history_id}
+
+
+async def _ndjson_stream(events):
+    try:
+        async for event in events:
+            yield json.dumps(event, ensure_ascii=False) + '\n'
+    except Exception as e:
+        print(f"Lab report stream error: {e}")
+        yield json.dumps({'event': 'error', 'error': 'Analysis failed. Please try again.'}) + '\n'
+
+
+@async_csrf_exempt
+async def analyze_lab_report_view(request):
+    """
+    POST endpoint: receive a lab report file, analyse with Gemini, save to history.
+    With ?stream=1 the progress events are streamed as newline-delimited JSON.
+    """
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
+    # Refuse an oversized body from its Content-Length, before the multipart upload is parsed
+    limit = max_upload_bytes()
+    if int(request.META.get('CONTENT_LENGTH') or 0) > limit + MULTIPART_OVERHEAD_BYTES:
+        return JsonResponse(
+            {'error': f'File is too large. Please upload a report under {limit // (1024 * 1024)} MB.'}, status=413
+        )
+
     ALLOWED_MIME = {
         'image/jpeg': 'image/jpeg',
         'image/jpg':  'image/jpeg',
@@ -247,27 +745,26 @@ def analyze_lab_report_view(request):
         )
 
     try:
-        file_bytes = file_obj.read()
+        # Hashes the upload in chunks and enforces LAB_UPLOAD_MAX_BYTES
+        upload = await sync_to_async(LabUpload, thread_sensitive=False)(file_obj, ALLOWED_MIME[mime_type])
+    except UploadRejected as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
 
+    try:
         # Detect active language for translation
         lang_code = get_language() or 'en'
         lang_name = LANG_NAMES.get(lang_code, 'English')
 
-        # Step 1: Analyze the report in English (reliable medical JSON)
-        result = gemini_analyze_lab(file_bytes, ALLOWED_MIME[mime_type], file_obj.name)
-
-        # Step 2: If a non-English language is active, translate all text fields
-        if lang_name != 'English' and 'error' not in result:
-            result = translate_lab_result(result, lang_name)
+        events = lab_report_events(upload, lang_name)
 
-        # Save to history (English or translated — save whatever the user sees)
-        if 'error' not in result:
-            LabReportHistory.objects.create(
-                filename=file_obj.name,
-                analysis=result
-            )
+        if request.GET.get('stream') == '1':
+            return stream_response(request, _ndjson_stream(events), 'application/x-ndjson')
 
-        return JsonResponse({'analysis': result, 'response_language': lang_name})
+        final = None
+        async for event in events:
+            if event['event'] == 'result':
+                final = event
+        return JsonResponse({'analysis': final['analysis'], 'response_language': final['response_language']})
 
     except Exception as e:
         print(f"Lab report view error: {e}")
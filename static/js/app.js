@@ -187,37 +187,55 @@ document.addEventListener('DOMContentLoaded', () => {
     hideError();
 
     try {
-      // 1. Analyze symptoms
-      const analyzeRes = await fetch('/api/analyze', {
+      // 1. Triage + hospital search in one request. Streamed as Server-Sent
+      //    Events: the server searches hospitals for a locally predicted
+      //    speciality while Gemini runs, and forwards urgency, speciality and
+      //    each disease as soon as Gemini has written them.
+      const res = await fetch('/api/triage?stream=1', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ symptoms_text: symptoms, location: city })
       });
-      const analyzeData = await analyzeRes.json();
-      if (analyzeData.error) throw new Error(analyzeData.error);
+      if (!res.ok || !(res.headers.get('Content-Type') || '').includes('text/event-stream')) {
+        const data = await res.json();
+        throw new Error(data.error || 'triage failed');
+      }
 
-      currentAnalysis = analyzeData.analysis;
+      currentAnalysis = null;
       currentSymptoms = symptoms;
       currentCity = city;
-
-      // 2. Search hospitals
-      const speciality = currentAnalysis?.speciality || 'General Physician';
-      const disease = currentAnalysis?.possible_diseases?.[0]?.name || 'General';
-      const params = new URLSearchParams({ speciality, city, disease });
-
-      const hospitalsRes = await fetch(`/api/hospitals?${params.toString()}`);
-      const hospitalsData = await hospitalsRes.json();
-      if (hospitalsData.error) throw new Error(hospitalsData.error);
-
-      currentHospitals = hospitalsData.hospitals;
-      activeSection = 'results';
       currentDetailHospital = null;
+      let finalHospitals = false;
+      let analysisDone = false;
+
+      // 2. Render each piece as it arrives
+      await readEvents(res, (name, data) => {
+        if (name === 'error') throw new Error(data.error);
+        if (name === 'field' || name === 'disease') {
+          // Partial analysis while Gemini is still writing
+          currentAnalysis = currentAnalysis || { possible_diseases: [] };
+          if (name === 'field') currentAnalysis[data.name] = data.value;
+          else currentAnalysis.possible_diseases.push(data.value);
+          renderSummary();
+        } else if (name === 'analysis') {
+          currentAnalysis = data.analysis;
+          analysisDone = true;
+          renderSummary();
+        } else if (name === 'hospitals') {
+          currentHospitals = data.hospitals;
+          finalHospitals = data.final;
+          renderHospitals();
+        }
+        if (activeSection !== 'results') {
+          activeSection = 'results';
+          renderSummary();
+          showSection('results');
+        }
+      });
+      if (!analysisDone || !finalHospitals) throw new Error('incomplete triage response');
 
-      // 3. Persist & Render
+      // 3. Persist
       saveState();
-      renderSummary();
-      renderHospitals();
-      showSection('results');
 
     } catch (err) {
       console.error(err);
@@ -227,12 +245,39 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  // Server-Sent Events over a fetch() response (EventSource cannot POST):
+  // calls onEvent(name, data) for every complete event as it arrives.
+  async function readEvents(res, onEvent) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const blocks = buffer.split('\n\n');
+      buffer = blocks.pop();
+      for (const block of blocks) {
+        let name = 'message';
+        let data = '';
+        block.split('\n').forEach(line => {
+          if (line.startsWith('event:')) name = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        });
+        if (data) onEvent(name, JSON.parse(data));
+      }
+    }
+  }
+
   // ── RENDER SUMMARY SIDEBAR ────────────────────────────────────────────
   function renderSummary() {
     summarySymptoms.textContent = currentSymptoms || '—';
     summaryLocation.textContent = currentCity || '—';
 
-    if (!currentAnalysis) return;
+    if (!currentAnalysis) {
+      aiAnalysisSummary.classList.add('hidden');
+      return;
+    }
 
     aiAnalysisSummary.classList.remove('hidden');
     summarySpeciality.textContent = currentAnalysis.speciality || '—';